@@ -1,7 +1,13 @@
 # 1_🏠_Inicio.py
 
+import os
+
 import streamlit as st
-import pandas as pd
+
+from cartera_compartida import cargar_cartera_compartida, cartera_de_sesion
+from ingesta import vista_legible
+
+DEMO_PATH = "data/COLL_TEC_CONSOLIDADO.txt"
 
 # --- Configuración de la página ---
 st.set_page_config(
@@ -41,8 +47,15 @@ source_option = st.radio(
 uploaded_file = None
 if "Usar datos de demostración" in source_option:
     try:
-        df = pd.read_csv("data/COLL_TEC_CONSOLIDADO.txt", delimiter=",", encoding="latin-1", low_memory=False)
-        st.session_state['df'] = df
+        # Streamlit vuelve a ejecutar el script en cada interacción: el archivo solo
+        # se carga (desde la caché Parquet) cuando cambia respecto al ya cargado.
+        # Las sesiones que cargan el mismo contenido comparten un único DataFrame.
+        estado = os.stat(DEMO_PATH)
+        clave = (DEMO_PATH, estado.st_size, estado.st_mtime_ns)
+        if st.session_state.get('df_origen') != clave or 'df' not in st.session_state:
+            cartera = cargar_cartera_compartida(DEMO_PATH)
+            st.session_state['df'], st.session_state['df_huella'] = cartera.df, cartera.huella
+            st.session_state['df_origen'] = clave
         st.success("Datos de demostración cargados correctamente.")
     except FileNotFoundError:
         st.error(
@@ -61,8 +74,11 @@ else:
     if uploaded_file is not None:
         try:
             # Asumimos delimitador por comas para ambos tipos de archivo, como en el notebook
-            df = pd.read_csv(uploaded_file, delimiter=",", encoding="latin-1", low_memory=False)
-            st.session_state['df'] = df
+            clave = ('upload', uploaded_file.file_id)
+            if st.session_state.get('df_origen') != clave or 'df' not in st.session_state:
+                cartera = cargar_cartera_compartida(uploaded_file)
+                st.session_state['df'], st.session_state['df_huella'] = cartera.df, cartera.huella
+                st.session_state['df_origen'] = clave
             st.success("Archivo cargado exitosamente.")
         except Exception as e:
             st.error(f"No se pudo leer el archivo. Asegúrate de que sea un CSV o TXT válido y delimitado por comas. Error: {e}")
@@ -71,5 +87,15 @@ else:
 # --- Vista Previa de los Datos ---
 if 'df' in st.session_state:
     st.subheader("Vista Previa de los Datos Cargados")
-    st.dataframe(st.session_state.df.head(), use_container_width=True)
+    st.dataframe(vista_legible(st.session_state.df.head()), use_container_width=True)
+
+    # Memoria de la cartera en el servidor, por columna (una sola copia para todas las sesiones)
+    memoria = cartera_de_sesion(st.session_state).memoria()
+    total = memoria['MB'].sum()
+    with st.expander(f"Memoria de la cartera: {total:,.1f} MB"):
+        if 'MB_original' in memoria.columns and total > 0:
+            total_original = memoria['MB_original'].sum()
+            st.write(f"Con los tipos por defecto ocuparía {total_original:,.1f} MB "
+                     f"({total_original / total:.1f}x más).")
+        st.dataframe(memoria, use_container_width=True, hide_index=True)
     st.info("Datos listos. Explora las páginas de 'Análisis de Cartera' y 'Análisis de Riesgo' en la barra lateral.")
\ No newline at end of file
@@ -0,0 +1,389 @@
+# actualizacion_incremental.py
+# Actualización mensual que solo vuelve a puntuar a los clientes que cambiaron.
+# Cada fila cruda de la cartera se resume en una huella de 64 bits; la corrida
+# anterior guarda (clave, huella, predicción) en un archivo de estado y la nueva
+# cartera se compara contra él por bloques:
+#   - nuevos y cambiados pasan por pipeline.transform y predict;
+#   - sin cambio conservan su predicción anterior;
+#   - las bajas (claves que ya no vienen en el archivo) se listan en el delta.
+# La clave identifica al cliente entre meses: ID_Cliente si el archivo lo trae o
+# las columnas de --clave. Sin clave estable no hay corrida incremental: el número
+# de fila se corre con cualquier alta o baja y compararía a un cliente contra la
+# huella de otro.
+# Limpieza, Preprocesamiento, PCA y el bosque trabajan fila por fila, así que la
+# predicción de un cliente sin cambios es la misma que daría una corrida completa.
+# Si cambia el modelo, la clave o las columnas del archivo, se vuelve a puntuar todo.
+#
+# Uso:
+#   python actualizacion_incremental.py data/COLL_TEC_CONSOLIDADO.txt \
+#       --clave ORG Socio Producto CP Fecha_aprobacion Fecha_nac --estado data/estado_scores.npz
+#   python actualizacion_incremental.py data/COLL_TEC_CONSOLIDADO.txt --paquete modelo_paquete --workers 0
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch_scoring import leer_por_bloques, memoria_pico_mb
+from ingesta import huella_archivo
+from paquete_modelo import cargar_modelo
+from scoring import MODEL_PATH, PIPELINE_PATH, adivinar_formatos_fechas, fijar_formato_fechas, predecir
+from scoring_paralelo import PuntuadorParalelo
+
+ESTADO_PATH = os.path.join('data', 'estado_scores.npz')
+VERSION_ESTADO = 2
+SEPARADOR_CLAVE = '|'
+
+NUEVO = 'nuevo'
+CAMBIADO = 'cambiado'
+SIN_CAMBIO = 'sin_cambio'
+BAJA = 'baja'
+
+
+def huella_modelo(*rutas):
+    """
+    Fingerprint of the model artifacts (files, or every file of a bundle
+    directory). Scores are only carried forward when it did not change. A
+    missing path raises FileNotFoundError instead of being left out.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for ruta in rutas:
+        if not os.path.exists(ruta):
+            raise FileNotFoundError(f"No existe '{ruta}'; no se puede calcular la huella del modelo.")
+        if os.path.isdir(ruta):
+            for nombre in sorted(os.listdir(ruta)):
+                h.update(nombre.encode())
+                h.update(huella_archivo(os.path.join(ruta, nombre)).encode())
+        else:
+            h.update(huella_archivo(ruta).encode())
+    return h.hexdigest()
+
+
+def columnas_clave(encabezado, clave=None):
+    """
+    Columns identifying a client across monthly files: clave when given,
+    otherwise ID_Cliente. Raises ValueError when there is no stable key.
+    """
+    if clave:
+        faltantes = [c for c in clave if c not in encabezado]
+        if faltantes:
+            raise ValueError(f"Columnas de --clave que no están en el archivo: {', '.join(faltantes)}")
+        return list(clave)
+    if 'ID_Cliente' in encabezado:
+        return ['ID_Cliente']
+    raise ValueError("El archivo no trae ID_Cliente: indica con --clave las columnas que identifican al "
+                     "cliente (p. ej. ORG Socio Producto CP Fecha_aprobacion Fecha_nac).")
+
+
+def nombre_clave(clave):
+    return 'ID_Cliente' if clave == ['ID_Cliente'] else 'Clave'
+
+
+def claves_bloque(bloque, clave):
+    """
+    Key of every chunk row: ID_Cliente as is, or the clave columns joined with
+    SEPARADOR_CLAVE. Numbers go through float64 first, so a value gives the
+    same key whether read_csv inferred its chunk as int or float.
+    """
+    if clave == ['ID_Cliente']:
+        return bloque['ID_Cliente'].to_numpy()
+    partes = []
+    for col in clave:
+        serie = bloque[col]
+        partes.append((serie.astype(np.float64) if serie.dtype.kind in 'biuf' else serie).astype(str))
+    claves = partes[0]
+    for parte in partes[1:]:
+        claves = claves + SEPARADOR_CLAVE + parte
+    return claves.to_numpy(dtype=object)
+
+
+def huellas_filas(bloque, columnas):
+    """
+    64-bit fingerprint of every raw row over columnas. Numbers are hashed as
+    float64 and everything else as text, so a value hashes the same whether
+    read_csv inferred its chunk as int, float or object.
+    """
+    normalizado = {}
+    for col in columnas:
+        serie = bloque[col]
+        normalizado[col] = serie.astype(np.float64) if serie.dtype.kind in 'biuf' else serie.astype(object)
+    return pd.util.hash_pandas_object(pd.DataFrame(normalizado, index=bloque.index), index=False).to_numpy()
+
+
+class EstadoScores:
+    """
+    Scores of one run: client keys, row fingerprints, predictions (-1 when the
+    client was dropped by the cleaning step), the key columns and the
+    model/column fingerprints they are valid for. Stored as a .npz without
+    pickled objects.
+    """
+    def __init__(self, ids, huellas, predicciones, huella_modelo, columnas, clave):
+        self.ids = pd.Index(ids)
+        self.huellas = np.asarray(huellas, dtype=np.uint64)
+        self.predicciones = np.asarray(predicciones, dtype=np.int64)
+        self.huella_modelo = huella_modelo
+        self.columnas = list(columnas)
+        self.clave = list(clave)
+        if not self.ids.is_unique:
+            # IDs repetidos: se conserva la primera aparición de cada uno
+            primera = ~self.ids.duplicated()
+            self.ids = self.ids[primera]
+            self.huellas = self.huellas[primera]
+            self.predicciones = self.predicciones[primera]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def vacio(cls, huella_modelo, columnas, clave):
+        return cls([], [], [], huella_modelo, columnas, clave)
+
+    @classmethod
+    def leer(cls, ruta):
+        with np.load(ruta, allow_pickle=False) as datos:
+            meta = json.loads(str(datos['meta']))
+            if meta.get('version') != VERSION_ESTADO:
+                raise ValueError(f"Versión de estado {meta.get('version')} no soportada en '{ruta}'.")
+            return cls(datos['ids'], datos['huellas'], datos['predicciones'], meta['huella_modelo'],
+                       meta['columnas'], meta['clave'])
+
+    def guardar(self, ruta):
+        """Writes the state next to its final path and renames it (atomic)."""
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        ids = self.ids.to_numpy()
+        if ids.dtype.kind not in 'iu':
+            ids = ids.astype(str)
+        meta = json.dumps({'version': VERSION_ESTADO, 'huella_modelo': self.huella_modelo,
+                           'columnas': self.columnas, 'clave': self.clave})
+        temporal = f'{ruta}.{os.getpid()}.tmp.npz'
+        np.savez(temporal, ids=ids, huellas=self.huellas, predicciones=self.predicciones, meta=np.array(meta))
+        os.replace(temporal, ruta)
+
+
+def cargar_estado_previo(ruta, huella_modelo_actual, columnas, clave):
+    """
+    Previous state when it exists and is still valid for this model, these
+    columns and this key; otherwise an empty state and the reason for the full
+    rescoring.
+    """
+    vacio = EstadoScores.vacio(huella_modelo_actual, columnas, clave)
+    if ruta is None or not os.path.exists(ruta):
+        return vacio, "sin estado previo"
+    try:
+        estado = EstadoScores.leer(ruta)
+    except (OSError, ValueError, KeyError) as e:
+        return vacio, f"estado ilegible ({e})"
+    if estado.huella_modelo != huella_modelo_actual:
+        return vacio, "cambió el modelo"
+    if estado.columnas != list(columnas):
+        return vacio, "cambiaron las columnas del archivo"
+    if estado.clave != list(clave):
+        return vacio, "cambió la clave de cliente"
+    return estado, None
+
+
+def clasificar_bloque(ids, huellas, previo):
+    """
+    Position of each row in the previous state (-1 for new clients) and its
+    status: NUEVO, CAMBIADO or SIN_CAMBIO.
+    """
+    if len(previo) == 0:
+        return np.full(len(ids), -1, dtype=np.int64), np.full(len(ids), NUEVO, dtype=object)
+    posiciones = previo.ids.get_indexer(ids)
+    nuevo = posiciones < 0
+    cambiado = ~nuevo & (previo.huellas[np.where(nuevo, 0, posiciones)] != huellas)
+    estado = np.full(len(ids), SIN_CAMBIO, dtype=object)
+    estado[nuevo] = NUEVO
+    estado[cambiado] = CAMBIADO
+    return posiciones, estado
+
+
+def _con_nulos(predicciones):
+    """Predictions as a nullable Int64 array (-1 becomes <NA>)."""
+    return pd.arrays.IntegerArray(predicciones, predicciones < 0)
+
+
+def actualizar_cartera(ruta, salida, previo, huella_modelo_actual, pipeline=None, model=None,
+                       chunksize=100_000, puntuador=None, proyeccion=None, delta=None, verbose=True):
+    """
+    Incremental scoring of the portfolio against the previous state, matching
+    rows by the key columns of previo.clave. Writes the merged score table to
+    salida (one row per input row, with its status and previous prediction)
+    and, when delta is given, only the new, changed and removed clients.
+    Returns the new EstadoScores and the delta report.
+    """
+    clave = previo.clave
+    columna_clave = nombre_clave(clave)
+    for ruta_salida in (salida, delta):
+        if ruta_salida and os.path.exists(ruta_salida):
+            os.remove(ruta_salida)
+
+    inicio = time.perf_counter()
+    visto = np.zeros(len(previo), dtype=bool)
+    partes_ids, partes_huellas, partes_predicciones = [], [], []
+    conteos = {NUEVO: 0, CAMBIADO: 0, SIN_CAMBIO: 0}
+    reclasificados = 0
+    total = procesadas = 0
+    formatos = {}
+    columnas = None
+
+    for numero, bloque in enumerate(leer_por_bloques(ruta, chunksize)):
+        if columnas is None:
+            columnas = sorted(c for c in bloque.columns if c != 'ID_Cliente')
+        ids = claves_bloque(bloque, clave)
+        huellas = huellas_filas(bloque, columnas)
+        posiciones, estado = clasificar_bloque(ids, huellas, previo)
+        en_previo = posiciones >= 0
+        visto[posiciones[en_previo]] = True
+
+        # Predicciones anteriores (-1: descartado por la limpieza o cliente nuevo)
+        anterior = np.full(len(bloque), -1, dtype=np.int64)
+        anterior[en_previo] = previo.predicciones[posiciones[en_previo]]
+        prediccion = anterior.copy()
+        prediccion[estado == NUEVO] = -1
+
+        puntuar = estado != SIN_CAMBIO
+        # Formatos de fecha tomados del archivo completo, no de las filas cambiadas
+        adivinar_formatos_fechas(bloque, formatos)
+        if puntuar.any():
+            subconjunto = fijar_formato_fechas(bloque[puntuar].copy(), formatos)
+            if puntuador is not None:
+                nuevas = puntuador.predecir(subconjunto)
+            else:
+                nuevas = predecir(pipeline, model, subconjunto, proyeccion)
+            recalculada = np.full(int(puntuar.sum()), -1, dtype=np.int64)
+            recalculada[subconjunto.index.get_indexer(nuevas.index)] = nuevas.to_numpy(dtype=np.int64)
+            prediccion[puntuar] = recalculada
+
+        reclasificados += int(np.count_nonzero((estado == CAMBIADO) & (prediccion != anterior)))
+        for nombre in conteos:
+            conteos[nombre] += int(np.count_nonzero(estado == nombre))
+        total += len(bloque)
+        procesadas += int(np.count_nonzero(prediccion >= 0))
+
+        resultado = pd.DataFrame({
+            'fila': bloque.index,
+            columna_clave: ids,
+            'Prediccion_Modelo': _con_nulos(prediccion),
+            'Procesado': prediccion >= 0,
+            'Estado': estado,
+            'Prediccion_Anterior': _con_nulos(anterior),
+        })
+        resultado.to_csv(salida, mode='a', header=(numero == 0), index=False)
+        if delta:
+            resultado[puntuar].to_csv(delta, mode='a', header=(numero == 0), index=False)
+
+        partes_ids.append(ids)
+        partes_huellas.append(huellas)
+        partes_predicciones.append(prediccion)
+        if verbose:
+            print(f"Bloque {numero}: {int(puntuar.sum()):,} de {len(bloque):,} filas puntuadas "
+                  f"({time.perf_counter() - inicio:.1f} s acumulados)")
+
+    bajas = previo.ids[~visto]
+    if delta and len(bajas):
+        pd.DataFrame({
+            'fila': pd.NA,
+            columna_clave: bajas,
+            'Prediccion_Modelo': pd.NA,
+            'Procesado': False,
+            'Estado': BAJA,
+            'Prediccion_Anterior': _con_nulos(previo.predicciones[~visto]),
+        }).to_csv(delta, mode='a', header=not os.path.exists(delta), index=False)
+
+    todas = pd.Index(np.concatenate(partes_ids) if partes_ids else [])
+    # Una clave que no es única empareja a varios clientes con la misma huella anterior
+    repetidas = int(todas.duplicated().sum())
+    nuevo_estado = EstadoScores(
+        todas,
+        np.concatenate(partes_huellas) if partes_huellas else [],
+        np.concatenate(partes_predicciones) if partes_predicciones else [],
+        huella_modelo_actual, columnas or previo.columnas, clave,
+    )
+    puntuadas = conteos[NUEVO] + conteos[CAMBIADO]
+    reporte = {
+        'clientes': total,
+        'procesados': procesadas,
+        'nuevos': conteos[NUEVO],
+        'cambiados': conteos[CAMBIADO],
+        'sin_cambio': conteos[SIN_CAMBIO],
+        'bajas': int(len(bajas)),
+        'reclasificados': reclasificados,
+        'claves_repetidas': repetidas,
+        'fraccion_puntuada': puntuadas / total if total else 0.0,
+        'segundos': time.perf_counter() - inicio,
+    }
+    return nuevo_estado, reporte
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Actualización incremental de scores de la cartera.")
+    parser.add_argument('entrada', help="Archivo de la cartera del mes (CSV/TXT delimitado por comas).")
+    parser.add_argument('--estado', default=ESTADO_PATH, help="Estado de la corrida anterior (.npz).")
+    parser.add_argument('--salida', default='predicciones.csv', help="Tabla de scores combinada.")
+    parser.add_argument('--delta', default='delta_scores.csv', help="Solo nuevos, cambiados y bajas.")
+    parser.add_argument('--reporte', default=None, help="Reporte del delta en JSON.")
+    parser.add_argument('--clave', nargs='+', default=None,
+                        help="Columnas que identifican al cliente entre meses (por defecto ID_Cliente).")
+    parser.add_argument('--chunksize', type=int, default=100_000, help="Filas por bloque.")
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    parser.add_argument('--paquete', default=None,
+                        help="Paquete de paquete_modelo.py (memory-mapped) en lugar de los .pkl.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Procesos en paralelo por bloque (0 = todos los núcleos).")
+    parser.add_argument('--completa', action='store_true', help="Ignora el estado y puntúa a todos.")
+    args = parser.parse_args()
+
+    if args.paquete:
+        huella_actual = huella_modelo(args.paquete)
+    else:
+        huella_actual = huella_modelo(args.pipeline, args.modelo)
+    encabezado = pd.read_csv(args.entrada, delimiter=",", encoding="latin-1", nrows=0).columns
+    columnas = sorted(c for c in encabezado if c != 'ID_Cliente')
+    try:
+        clave = columnas_clave(encabezado, args.clave)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.completa:
+        previo, motivo = EstadoScores.vacio(huella_actual, columnas, clave), "--completa"
+    else:
+        previo, motivo = cargar_estado_previo(args.estado, huella_actual, columnas, clave)
+    if motivo:
+        print(f"Se puntúa toda la cartera: {motivo}.")
+
+    if args.workers == 1:
+        pipeline, model = cargar_modelo(args.paquete, args.pipeline, args.modelo)
+        estado, reporte = actualizar_cartera(args.entrada, args.salida, previo, huella_actual, pipeline, model,
+                                             args.chunksize, delta=args.delta)
+    else:
+        with PuntuadorParalelo(args.workers or None, args.pipeline, args.modelo,
+                               paquete_path=args.paquete) as puntuador:
+            estado, reporte = actualizar_cartera(args.entrada, args.salida, previo, huella_actual,
+                                                 chunksize=args.chunksize, puntuador=puntuador, delta=args.delta)
+    estado.guardar(args.estado)
+
+    print(f"{reporte['clientes']:,} clientes: {reporte['nuevos']:,} nuevos, {reporte['cambiados']:,} cambiados, "
+          f"{reporte['sin_cambio']:,} sin cambio, {reporte['bajas']:,} bajas")
+    print(f"Puntuados {reporte['fraccion_puntuada']:.1%} de la cartera en {reporte['segundos']:.1f} s; "
+          f"{reporte['reclasificados']:,} clientes cambiados con otra clase. Resultados en {args.salida}, "
+          f"delta en {args.delta}")
+    if reporte['claves_repetidas']:
+        print(f"Aviso: {reporte['claves_repetidas']:,} filas repiten la clave {', '.join(clave)}; "
+              "cada una se compara contra la primera aparición del mes anterior.")
+    pico = memoria_pico_mb()
+    if pico is not None:
+        print(f"Memoria pico: {pico:,.0f} MB")
+    if args.reporte:
+        with open(args.reporte, 'w', encoding='utf-8') as f:
+            json.dump({**reporte, 'motivo_completa': motivo}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# agregados.py
+# Resúmenes de la cartera para los dashboards de Análisis de Cartera y Análisis
+# de Riesgo. Se calculan una vez por cartera compartida (huella de datos) y las
+# páginas grafican desde estas tablas pequeñas: los reruns no recorren las filas
+# y el navegador recibe 50 barras en lugar de un punto por cliente.
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Niveles de riesgo por Score_pago, del más al menos riesgoso
+NIVELES_RIESGO = ['Alto Riesgo', 'Riesgo Medio', 'Bajo Riesgo', 'Sin Información']
+BINS_HISTOGRAMA = 50
+
+ResumenCartera = namedtuple('ResumenCartera', ['total_clientes', 'saldo_total', 'utilizacion_promedio',
+                                               'por_socio', 'histograma_saldo'])
+ResumenRiesgo = namedtuple('ResumenRiesgo', ['conteos', 'por_nivel'])
+
+
+def nivel_de_riesgo(score):
+    """
+    Risk level of every Score_pago value, vectorized: >= 9 low, >= 5 medium,
+    > 0 high, anything else (0, negatives, nulls) without information. Same
+    rules as the row-wise asignar_riesgo of the page, as a Categorical.
+    """
+    score = np.asarray(score, dtype=np.float64)
+    # Las comparaciones con NaN son False: los nulos quedan sin información
+    codigos = np.select([score >= 9, score >= 5, score > 0], [2, 1, 0], default=3).astype(np.int8)
+    return pd.Categorical.from_codes(codigos, categories=NIVELES_RIESGO)
+
+
+def histograma(valores, bins=BINS_HISTOGRAMA):
+    """Pre-binned histogram (equal-width bins over the non-null range) as a small frame."""
+    valores = np.asarray(valores, dtype=np.float64)
+    valores = valores[~np.isnan(valores)]
+    if len(valores) == 0:
+        return pd.DataFrame({'Desde': [], 'Hasta': [], 'Centro': [], 'Clientes': []})
+    conteos, bordes = np.histogram(valores, bins=bins)
+    return pd.DataFrame({
+        'Desde': bordes[:-1],
+        'Hasta': bordes[1:],
+        'Centro': (bordes[:-1] + bordes[1:]) / 2,
+        'Clientes': conteos,
+    })
+
+
+def niveles_riesgo(cartera):
+    """Risk level of every client, kept as a side array of the shared portfolio."""
+    return cartera.derivada('Nivel_de_Riesgo', lambda df: nivel_de_riesgo(df['Score_pago'].to_numpy(
+        dtype=np.float64, na_value=np.nan)))
+
+
+def _resumen_cartera(cartera):
+    # Sumas y promedios en float64 aunque la columna venga compacta (float32)
+    saldo = cartera.df['Saldo_total'].to_numpy(dtype=np.float64, na_value=np.nan)
+    utilizacion = cartera.df['Utilizacion'].to_numpy(dtype=np.float64, na_value=np.nan)
+    por_socio = pd.DataFrame({'Saldo_total': saldo, 'Utilizacion': utilizacion}).groupby(
+        cartera.columna('Socio'), observed=True).agg(
+        Numero_de_Clientes=('Saldo_total', 'size'),
+        Saldo_Total=('Saldo_total', 'sum'),
+        Utilizacion_Promedio=('Utilizacion', 'mean'),
+    ).rename_axis('Socio').sort_values('Numero_de_Clientes', ascending=False).reset_index()
+    return ResumenCartera(
+        total_clientes=len(cartera),
+        saldo_total=float(np.nansum(saldo)),
+        utilizacion_promedio=float(pd.Series(utilizacion).mean()),
+        por_socio=por_socio,
+        histograma_saldo=histograma(saldo),
+    )
+
+
+def resumen_cartera(cartera):
+    """Metrics, per-Socio table and Saldo_total histogram of Análisis de Cartera."""
+    return cartera.agregado('resumen_cartera', _resumen_cartera)
+
+
+def _resumen_riesgo(cartera):
+    nivel = niveles_riesgo(cartera)
+    conteos = pd.Series(nivel).value_counts()
+    conteos = conteos[conteos > 0].rename_axis('Nivel_de_Riesgo').rename('Numero_de_Clientes')
+    por_nivel = cartera.vista(['Saldo_total', 'Utilizacion', 'Socio']).groupby(nivel, observed=True).agg(
+        Saldo_Total_Promedio=('Saldo_total', 'mean'),
+        Utilizacion_Promedio=('Utilizacion', 'mean'),
+        Numero_de_Clientes=('Socio', 'count')
+    ).rename_axis('Nivel_de_Riesgo').reset_index()
+    return ResumenRiesgo(conteos=conteos, por_nivel=por_nivel)
+
+
+def resumen_riesgo(cartera):
+    """Clients per risk level and per-level summary table of Análisis de Riesgo."""
+    return cartera.agregado('resumen_riesgo', _resumen_riesgo)
@@ -0,0 +1,185 @@
+# almacen_scores.py
+# Almacén de scores por cliente. Después de una predicción en lote guarda las
+# features transformadas (PCA_*) y la predicción de cada cliente, con un índice
+# hash por ID_Cliente para consultas O(1). Los clientes que no están en el lote
+# se calculan bajo demanda y se guardan en un LRU acotado. El almacén pertenece
+# a una huella de datos: al cargar otro archivo se crea uno nuevo.
+
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from instrumentacion import etapa
+from scoring import TARGET_COLUMN, transformar_conservando_indice
+
+MAX_LRU = 4_096
+# Filas por bloque de la predicción en lote (una actualización de progreso por bloque)
+FILAS_POR_BLOQUE = 250_000
+# Almacenes vivos por proceso (uno por huella de datos, compartidos entre sesiones)
+MAX_ALMACENES = 2
+
+ResultadoCliente = namedtuple('ResultadoCliente', ['id_cliente', 'procesable', 'prediccion', 'features'])
+
+_almacenes = OrderedDict()
+_candado_almacenes = threading.Lock()
+
+
+def ids_cliente(df):
+    """ID_Cliente column, or the same 1..n ids the pages create when it is missing."""
+    if 'ID_Cliente' in df.columns:
+        return df['ID_Cliente']
+    return pd.RangeIndex(1, len(df) + 1)
+
+
+class AlmacenScores:
+    """
+    Per-client score store for one loaded dataset. Features are kept as float32:
+    the random forest casts its input to float32 anyway, so predicting from the
+    stored features gives the same classes.
+    """
+    def __init__(self, df, huella, max_lru=MAX_LRU, ids=None):
+        self.df = df
+        self.huella = huella
+        self.max_lru = max_lru
+        # pd.Index.get_loc usa una tabla hash: consulta O(1) por ID_Cliente.
+        # Se puede pasar el índice ya construido (p. ej. CarteraCompartida.ids)
+        self.indice = pd.Index(ids_cliente(df)) if ids is None else ids
+        self.pipeline = None
+        self.model = None
+        self.proyeccion = None
+
+        self.columnas = None
+        self.features = None
+        self.predicciones = None
+        # Posición en df de cada fila de features/predicciones
+        self.posiciones = None
+        # Fila en features/predicciones de cada posición de df (-1: sin lote o descartado)
+        self._fila_lote = None
+        self._en_lote = None
+
+        self._lru = OrderedDict()
+        self._candado = threading.Lock()
+
+    def configurar_modelo(self, pipeline, model, proyeccion=None):
+        """Artifacts used for batch runs and on-demand lookups."""
+        self.pipeline = pipeline
+        self.model = model
+        self.proyeccion = proyeccion
+
+    def posicion(self, id_cliente):
+        """Row position of a client in df, or None when the id does not exist."""
+        try:
+            pos = self.indice.get_loc(id_cliente)
+        except KeyError:
+            return None
+        if isinstance(pos, slice):  # IDs repetidos: se usa el primero
+            return pos.start
+        if isinstance(pos, np.ndarray):
+            return int(np.flatnonzero(pos)[0])
+        return pos
+
+    def fila(self, id_cliente):
+        """One-row frame with the raw data of a client (None when the id does not exist)."""
+        pos = self.posicion(id_cliente)
+        return None if pos is None else self.df.iloc[[pos]]
+
+    def puntuar_cartera(self, progreso=None, filas_por_bloque=FILAS_POR_BLOQUE):
+        """
+        Transforms and predicts the whole dataset once and keeps the results.
+        Returns the predictions as a Series indexed by the original index.
+        Rows are processed in blocks (every step works row by row, so the
+        result is the same); progreso(hechos, total) is called after each block
+        and may raise to stop the run before the store is updated.
+        """
+        n = len(self.df)
+        partes_indice, partes_features, partes_predicciones = [], [], []
+        columnas = None
+        for inicio in range(0, max(n, 1), filas_por_bloque):
+            bloque = self.df.iloc[inicio:inicio + filas_por_bloque]
+            transformed = transformar_conservando_indice(self.pipeline, bloque, self.proyeccion)
+            # Un bloque sin filas que pasen la limpieza no trae columnas PCA_*
+            if not transformed.empty:
+                columnas = [c for c in transformed.columns if c != TARGET_COLUMN]
+                with etapa('Prediccion', transformed) as medicion:
+                    predicciones = medicion.salida(np.asarray(self.model.predict(transformed)))
+                partes_indice.append(transformed.index)
+                partes_features.append(transformed[columnas].to_numpy(dtype=np.float32))
+                partes_predicciones.append(predicciones)
+            if progreso is not None:
+                progreso(min(inicio + filas_por_bloque, n), n)
+
+        if not partes_indice:
+            partes_indice = [self.df.index[:0]]
+            partes_features = [np.empty((0, 0), dtype=np.float32)]
+            partes_predicciones = [np.array([], dtype=np.int64)]
+            columnas = []
+        indice = partes_indice[0].append(partes_indice[1:])
+        predicciones = np.concatenate(partes_predicciones)
+        posiciones = self.df.index.get_indexer(indice)
+        fila_lote = np.full(len(self.df), -1, dtype=np.int64)
+        fila_lote[posiciones] = np.arange(len(posiciones))
+        with self._candado:
+            self.columnas = columnas
+            self.features = np.concatenate(partes_features)
+            self.predicciones = predicciones
+            self.posiciones = posiciones
+            self._fila_lote = fila_lote
+            self._en_lote = np.ones(len(self.df), dtype=bool)
+            self._lru.clear()
+        return pd.Series(predicciones, index=indice, name='Prediccion_Modelo')
+
+    def consultar(self, id_cliente):
+        """
+        Score of one client: from the batch results when available, otherwise
+        computed on demand and kept in the LRU. Returns None for unknown ids.
+        """
+        pos = self.posicion(id_cliente)
+        if pos is None:
+            return None
+
+        if self._en_lote is not None and self._en_lote[pos]:
+            fila = self._fila_lote[pos]
+            if fila < 0:
+                return ResultadoCliente(id_cliente, False, None, None)
+            return ResultadoCliente(id_cliente, True, self.predicciones[fila], self.features[fila])
+
+        with self._candado:
+            if id_cliente in self._lru:
+                self._lru.move_to_end(id_cliente)
+                return self._lru[id_cliente]
+
+        resultado = self._calcular(id_cliente, pos)
+        with self._candado:
+            self._lru[id_cliente] = resultado
+            while len(self._lru) > self.max_lru:
+                self._lru.popitem(last=False)
+        return resultado
+
+    def _calcular(self, id_cliente, pos):
+        transformed = transformar_conservando_indice(self.pipeline, self.df.iloc[[pos]], self.proyeccion)
+        if transformed.empty:
+            return ResultadoCliente(id_cliente, False, None, None)
+        columnas = [c for c in transformed.columns if c != TARGET_COLUMN]
+        prediccion = self.model.predict(transformed)[0]
+        return ResultadoCliente(id_cliente, True, prediccion, transformed[columnas].to_numpy(dtype=np.float32)[0])
+
+
+def obtener_almacen(df, huella, ids=None):
+    """
+    Process-wide store for the dataset with this fingerprint. Sessions that load
+    the same file share it; a new fingerprint creates a new store and the oldest
+    ones are dropped, so stale scores are never served.
+    """
+    if huella is None:
+        huella = id(df)
+    with _candado_almacenes:
+        almacen = _almacenes.get(huella)
+        if almacen is None or len(almacen.df) != len(df):
+            almacen = AlmacenScores(df, huella, ids=ids)
+            _almacenes[huella] = almacen
+        _almacenes.move_to_end(huella)
+        while len(_almacenes) > MAX_ALMACENES:
+            _almacenes.popitem(last=False)
+        return almacen
@@ -0,0 +1,307 @@
+# asignacion_cobranza.py
+# Asignación de acciones de cobranza a partir de las predicciones en lote. Cada
+# cliente recibe una acción (SMS, correo, campaña en tienda, llamada, visita o
+# ninguna) respetando la capacidad y el presupuesto de cada canal.
+#
+# Valor esperado de la acción a para el cliente i:
+#   p0        = propensión a pagar sin acción (Score_pago y meses con pago en Canal_Pago_M1-M6)
+#   exposicion = Saldo_total (x peso_al_corriente si Ciclo_atraso_M1 == 0)
+#   afinidad  = fracción de meses en que pagó por un canal afín a la acción
+#   valor     = exposicion * efectividad_a * (1 - p0) * (1 + peso_afinidad * afinidad)
+#               * multiplicador_clase[Prediccion_Modelo][a] - costo_a
+# Todo se calcula como matrices (clientes x acciones) y el solver (aceptación
+# diferida: un canal lleno desplaza a sus clientes de menor valor cuando llega
+# uno mejor) trabaja por rondas vectorizadas, así que millones de clientes se
+# asignan en segundos.
+# Para segmentos chicos hay un modo exacto (programación lineal con HiGHS).
+#
+# Uso:
+#   python batch_scoring.py data/COLL_TEC_CONSOLIDADO.txt --salida predicciones.csv
+#   python asignacion_cobranza.py data/COLL_TEC_CONSOLIDADO.txt --predicciones predicciones.csv
+#   python asignacion_cobranza.py data/COLL_TEC_CONSOLIDADO.txt --predicciones predicciones.csv \
+#       --segmento Socio=BRA --metodo lp --config acciones.json
+
+import argparse
+import copy
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import linprog
+
+SIN_ACCION = 'Sin_accion'
+COLUMNAS_CANAL = [f'Canal_Pago_M{i}' for i in range(1, 7)]
+COLUMNAS_ENTRADA = ['ID_Cliente', 'Socio', 'Producto', 'Saldo_total', 'Score_pago', 'Ciclo_atraso_M1'] + COLUMNAS_CANAL
+SCORE_MAXIMO = 12
+# Más clientes que esto en modo exacto generan un LP demasiado grande
+MAX_CLIENTES_LP = 200_000
+
+CANALES_BANCARIOS = ['BBVA', 'Banamex', 'Santander', 'Prosa / Interbancario']
+CANALES_TIENDA = ['Bodega', 'C&A', 'Chedraui', 'GCC', 'Promoda', 'Shasa', 'Suburbia']
+CANALES_EFECTIVO = ['Diestel', 'Red efectiva']
+
+# Configuración por defecto; se reemplaza con --config (mismo formato en JSON).
+# capacidad: clientes por corrida (None = sin límite); presupuesto: costo máximo del canal
+CONFIGURACION = {
+    'acciones': [
+        {'nombre': 'SMS_recordatorio', 'costo': 0.5, 'capacidad': None, 'presupuesto': None,
+         'efectividad': 0.03, 'canales_afines': CANALES_EFECTIVO},
+        {'nombre': 'Correo_enlace_pago', 'costo': 0.2, 'capacidad': None, 'presupuesto': None,
+         'efectividad': 0.02, 'canales_afines': CANALES_BANCARIOS},
+        {'nombre': 'Campana_en_tienda', 'costo': 3.0, 'capacidad': 200_000, 'presupuesto': None,
+         'efectividad': 0.06, 'canales_afines': CANALES_TIENDA},
+        {'nombre': 'Llamada_agente', 'costo': 25.0, 'capacidad': 50_000, 'presupuesto': 1_000_000,
+         'efectividad': 0.15, 'canales_afines': []},
+        {'nombre': 'Visita_domiciliaria', 'costo': 150.0, 'capacidad': 2_000, 'presupuesto': 250_000,
+         'efectividad': 0.30, 'canales_afines': []},
+    ],
+    'peso_afinidad': 0.5,
+    'peso_al_corriente': 0.2,
+    'peso_historial_pago': 0.4,
+    # {clase: {accion: multiplicador}}; las clases y acciones omitidas valen 1
+    'multiplicador_clase': {},
+}
+
+
+def cargar_configuracion(ruta=None):
+    """Default configuration, updated with the keys of a JSON file when given."""
+    configuracion = copy.deepcopy(CONFIGURACION)
+    if ruta:
+        with open(ruta, encoding='utf-8') as f:
+            configuracion.update(json.load(f))
+    return configuracion
+
+
+def nombres_acciones(configuracion):
+    """Action names; column 0 of every matrix is SIN_ACCION."""
+    return [SIN_ACCION] + [a['nombre'] for a in configuracion['acciones']]
+
+
+def capacidades(configuracion, n):
+    """
+    Clients each action can take: min(capacidad, presupuesto // costo). The
+    cost limit of a channel becomes a count because its unit cost is fixed.
+    """
+    resultado = [n]
+    for accion in configuracion['acciones']:
+        limite = n
+        if accion.get('capacidad') is not None:
+            limite = min(limite, int(accion['capacidad']))
+        if accion.get('presupuesto') is not None and accion['costo'] > 0:
+            limite = min(limite, int(accion['presupuesto'] // accion['costo']))
+        resultado.append(max(limite, 0))
+    return np.array(resultado, dtype=np.int64)
+
+
+def historial_canales(datos, acciones):
+    """
+    Per client: fraction of the months with a payment whose channel is afín to
+    each action (n x acciones) and fraction of months with a payment at all.
+    Channels are factorized per column, so categorical columns cost nothing.
+    """
+    columnas = [c for c in COLUMNAS_CANAL if c in datos.columns]
+    n = len(datos)
+    coincidencias = np.zeros((n, len(acciones) + 1), dtype=np.float32)
+    meses_pago = np.zeros(n, dtype=np.float32)
+    for columna in columnas:
+        codigos, categorias = pd.factorize(datos[columna])
+        valido = codigos >= 0
+        meses_pago += valido
+        categorias = np.asarray(categorias, dtype=object)
+        for j, accion in enumerate(acciones, start=1):
+            if accion.get('canales_afines'):
+                # La posición extra atiende el código -1 de los nulos
+                afin = np.append(np.isin(categorias, accion['canales_afines']), False)
+                coincidencias[:, j] += afin[codigos]
+    afinidad = coincidencias / np.maximum(meses_pago, 1)[:, None]
+    return afinidad, meses_pago / max(len(columnas), 1)
+
+
+def matriz_valor(datos, configuracion):
+    """
+    Expected value (float32, clients x actions) of every action for every
+    client; column 0 (no action) is 0. Needs Saldo_total and Score_pago;
+    Ciclo_atraso_M1, Canal_Pago_M* and Prediccion_Modelo are used when present.
+    """
+    acciones = configuracion['acciones']
+    saldo = np.nan_to_num(datos['Saldo_total'].to_numpy(dtype=np.float64, na_value=np.nan), nan=0.0)
+    score = datos['Score_pago'].to_numpy(dtype=np.float64, na_value=np.nan)
+    score = np.where(np.isnan(score), SCORE_MAXIMO / 2, np.clip(score, 0, SCORE_MAXIMO)) / SCORE_MAXIMO
+    afinidad, frecuencia_pago = historial_canales(datos, acciones)
+
+    peso_historial = configuracion['peso_historial_pago']
+    p0 = (1 - peso_historial) * score + peso_historial * frecuencia_pago
+    if 'Ciclo_atraso_M1' in datos.columns:
+        atraso = np.nan_to_num(datos['Ciclo_atraso_M1'].to_numpy(dtype=np.float64, na_value=np.nan), nan=0.0)
+        exposicion = saldo * np.where(atraso > 0, 1.0, configuracion['peso_al_corriente'])
+    else:
+        exposicion = saldo
+    base = (exposicion * (1 - p0)).astype(np.float32)
+
+    efectividad = np.array([0.0] + [a['efectividad'] for a in acciones], dtype=np.float32)
+    costo = np.array([0.0] + [a['costo'] for a in acciones], dtype=np.float32)
+    factor = 1 + np.float32(configuracion['peso_afinidad']) * afinidad
+    if configuracion['multiplicador_clase'] and 'Prediccion_Modelo' in datos.columns:
+        factor *= multiplicadores_clase(datos['Prediccion_Modelo'], configuracion)
+
+    valor = base[:, None] * efectividad[None, :] * factor - costo[None, :]
+    valor[:, 0] = 0
+    return valor
+
+
+def multiplicadores_clase(prediccion, configuracion):
+    """Per client and action multiplier from the class predicted by the model (1 without prediction)."""
+    nombres = nombres_acciones(configuracion)
+    codigos, clases = pd.factorize(prediccion)
+    tabla = np.ones((len(clases) + 1, len(nombres)), dtype=np.float32)
+    for k, clase in enumerate(clases):
+        por_accion = configuracion['multiplicador_clase'].get(str(clase), {})
+        for j, nombre in enumerate(nombres):
+            tabla[k, j] = por_accion.get(nombre, 1.0)
+    return tabla[codigos]
+
+
+def asignar_voraz(valor, capacidad):
+    """
+    Vectorized deferred acceptance. Every pending client proposes its best
+    remaining action with positive value; an action keeps the highest-valued
+    clients among the ones it already holds and the new proposers, up to its
+    capacity, and bounces the rest. Bounced clients (new or previously held)
+    drop that action and propose again in the next round, so a high-value
+    client rejected from a scarce channel can still displace a lower-value one
+    from the next channel. Each rejection removes one option of one client,
+    so the loop ends. Returns the action index per client.
+    """
+    n, n_acciones = valor.shape
+    disponible = np.where(valor > 0, valor, -np.inf).astype(np.float32)
+    disponible[:, 0] = 0
+    for a in range(1, n_acciones):
+        if capacidad[a] == 0:
+            disponible[:, a] = -np.inf
+    asignacion = np.zeros(n, dtype=np.int16)
+    retenidos = [np.empty(0, dtype=np.int64) for _ in range(n_acciones)]
+
+    pendientes = np.arange(n)
+    while len(pendientes):
+        elegida = disponible[pendientes].argmax(axis=1)
+        rechazados = []
+        for a in range(1, n_acciones):
+            nuevos = pendientes[elegida == a]
+            if not len(nuevos):
+                continue
+            candidatos = np.concatenate([retenidos[a], nuevos])
+            if len(candidatos) > capacidad[a]:
+                orden = np.argpartition(-valor[candidatos, a], capacidad[a] - 1)
+                fuera = candidatos[orden[capacidad[a]:]]
+                candidatos = candidatos[orden[:capacidad[a]]]
+                # Los desplazados ya no pueden volver a proponer esta acción
+                disponible[fuera, a] = -np.inf
+                asignacion[fuera] = 0
+                rechazados.append(fuera)
+            retenidos[a] = candidatos
+            asignacion[candidatos] = a
+        pendientes = np.concatenate(rechazados) if rechazados else pendientes[:0]
+    return asignacion
+
+
+def asignar_lp(valor, capacidad):
+    """
+    Exact assignment as a linear program (HiGHS): one action per client and
+    at most capacidad clients per action. The constraint matrix is totally
+    unimodular (a transportation problem), so the optimum is integral.
+    """
+    n, n_acciones = valor.shape
+    if n > MAX_CLIENTES_LP:
+        raise ValueError(f"El modo exacto admite hasta {MAX_CLIENTES_LP:,} clientes; usa el voraz "
+                         f"o un segmento más chico ({n:,} clientes).")
+    con_limite = [a for a in range(1, n_acciones) if capacidad[a] < n]
+    una_accion = sparse.kron(sparse.identity(n, format='csr'), np.ones((1, n_acciones)), format='csr')
+    limites = sparse.kron(np.ones((1, n)), sparse.identity(n_acciones, format='csr'), format='csr')[con_limite]
+    resultado = linprog(
+        -valor.astype(np.float64).ravel(),
+        A_ub=limites if con_limite else None,
+        b_ub=capacidad[con_limite] if con_limite else None,
+        A_eq=una_accion, b_eq=np.ones(n), bounds=(0, 1), method='highs',
+    )
+    if resultado.status != 0:
+        raise ValueError(f"El programa lineal no se resolvió: {resultado.message}")
+    return resultado.x.reshape(n, n_acciones).argmax(axis=1).astype(np.int16)
+
+
+def asignar_estrategia(datos, configuracion=None, metodo='voraz'):
+    """
+    Action of every client of datos and the per-action summary. Returns
+    (asignacion, resumen, segundos_solver).
+    """
+    configuracion = configuracion or cargar_configuracion()
+    valor = matriz_valor(datos, configuracion)
+    capacidad = capacidades(configuracion, len(datos))
+    inicio = time.perf_counter()
+    asignacion = asignar_lp(valor, capacidad) if metodo == 'lp' else asignar_voraz(valor, capacidad)
+    segundos = time.perf_counter() - inicio
+
+    nombres = nombres_acciones(configuracion)
+    costo = np.array([0.0] + [a['costo'] for a in configuracion['acciones']])
+    valor_asignado = valor[np.arange(len(datos)), asignacion].astype(np.float64)
+    resultado = pd.DataFrame({
+        'Accion': pd.Categorical.from_codes(asignacion, categories=nombres),
+        'Valor_esperado': valor_asignado,
+        'Costo': costo[asignacion],
+    }, index=datos.index)
+    if 'ID_Cliente' in datos.columns:
+        resultado.insert(0, 'ID_Cliente', datos['ID_Cliente'].to_numpy())
+
+    resumen = resultado.groupby('Accion', observed=False).agg(
+        Clientes=('Costo', 'size'), Costo_total=('Costo', 'sum'), Valor_esperado=('Valor_esperado', 'sum'))
+    resumen['Capacidad'] = capacidad
+    return resultado, resumen.reset_index(), segundos
+
+
+def leer_entrada(ruta_cartera, ruta_predicciones=None):
+    """
+    Allocation inputs: the needed portfolio columns and, when given, the
+    predictions of batch_scoring.py joined by row number (column fila).
+    """
+    encabezado = pd.read_csv(ruta_cartera, delimiter=",", encoding="latin-1", nrows=0).columns
+    datos = pd.read_csv(ruta_cartera, delimiter=",", encoding="latin-1", low_memory=False,
+                        usecols=[c for c in COLUMNAS_ENTRADA if c in encabezado],
+                        dtype={c: 'category' for c in COLUMNAS_CANAL + ['Socio', 'Producto']})
+    if 'ID_Cliente' not in datos.columns:
+        # Mismo identificador que crean las páginas de Streamlit
+        datos.insert(0, 'ID_Cliente', datos.index + 1)
+    if ruta_predicciones:
+        predicciones = pd.read_csv(ruta_predicciones, usecols=['fila', 'Prediccion_Modelo'],
+                                   dtype={'Prediccion_Modelo': 'Int64'})
+        datos['Prediccion_Modelo'] = predicciones.set_index('fila')['Prediccion_Modelo'].reindex(datos.index)
+    return datos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Asignación de acciones de cobranza con capacidad por canal.")
+    parser.add_argument('entrada', help="Archivo de la cartera (CSV/TXT delimitado por comas).")
+    parser.add_argument('--predicciones', default=None, help="CSV de batch_scoring.py (columnas fila y Prediccion_Modelo).")
+    parser.add_argument('--salida', default='asignacion_cobranza.csv')
+    parser.add_argument('--config', default=None, help="JSON con acciones, costos, capacidades y pesos.")
+    parser.add_argument('--metodo', choices=['voraz', 'lp'], default='voraz')
+    parser.add_argument('--segmento', action='append', default=[], metavar='COLUMNA=VALOR',
+                        help="Restringe la asignación a un segmento (p. ej. Socio=BRA); se puede repetir.")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    datos = leer_entrada(args.entrada, args.predicciones)
+    for condicion in args.segmento:
+        columna, _, valor = condicion.partition('=')
+        datos = datos[datos[columna].astype(str) == valor]
+    print(f"{len(datos):,} clientes leídos en {time.perf_counter() - inicio:.1f} s")
+
+    asignacion, resumen, segundos = asignar_estrategia(datos, cargar_configuracion(args.config), args.metodo)
+    asignacion.to_csv(args.salida, index=False)
+    print(resumen.to_string(index=False))
+    print(f"Solver {args.metodo}: {segundos:.2f} s. Valor esperado total {resumen['Valor_esperado'].sum():,.0f}, "
+          f"costo {resumen['Costo_total'].sum():,.0f}. Asignación en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
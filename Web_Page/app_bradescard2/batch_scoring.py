@@ -0,0 +1,190 @@
+# batch_scoring.py
+# Predicción en lote de toda la cartera fuera de Streamlit.
+# El archivo se lee por bloques de tamaño fijo, así que la memoria depende del
+# tamaño del bloque y no del tamaño del archivo.
+#
+# Uso:
+#   python batch_scoring.py data/COLL_TEC_CONSOLIDADO.txt --salida predicciones.csv --chunksize 100000
+#   python batch_scoring.py data/COLL_TEC_CONSOLIDADO.txt --workers 0 --chunksize 1000000
+#   python batch_scoring.py data/entrenamiento.csv --crear-referencia-deriva
+#   python batch_scoring.py data/COLL_TEC_CONSOLIDADO.txt --deriva deriva.csv
+
+import argparse
+import gc
+import os
+import time
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+
+from ingesta import COLUMNAS_TEXTO, huella_archivo
+from instrumentacion import configurar_log, perfilar
+from monitor_deriva import (PSI_MODERADA, PSI_SIGNIFICATIVA, MonitorDeriva, ReferenciaDeriva, comparar,
+                            monitorear, ruta_referencia)
+from paquete_modelo import cargar_modelo
+from proyeccion_fusionada import ProyeccionFusionada
+from scoring import MODEL_PATH, PIPELINE_PATH, fijar_formato_fechas, predecir
+from scoring_paralelo import PuntuadorParalelo
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def leer_por_bloques(ruta, chunksize):
+    """Reads the portfolio file in chunks with the same options as Inicio.py."""
+    return pd.read_csv(
+        ruta, delimiter=",", encoding="latin-1", low_memory=False,
+        chunksize=chunksize, dtype={col: str for col in COLUMNAS_TEXTO}
+    )
+
+
+def resultados_bloque(bloque, predicciones):
+    """
+    Builds the output rows for one chunk. Every input row is kept: rows dropped
+    by the cleaning step get an empty prediction and Procesado=False.
+    """
+    resultado = pd.DataFrame({'fila': bloque.index}, index=bloque.index)
+    if 'ID_Cliente' in bloque.columns:
+        resultado['ID_Cliente'] = bloque['ID_Cliente']
+    else:
+        # Mismo identificador que crean las páginas de Streamlit
+        resultado['ID_Cliente'] = bloque.index + 1
+    resultado['Prediccion_Modelo'] = predicciones.reindex(bloque.index).astype('Int64')
+    resultado['Procesado'] = bloque.index.isin(predicciones.index)
+    return resultado
+
+
+def puntuar_cartera(ruta, salida, pipeline, model, chunksize=100_000, verbose=True, puntuador=None,
+                    proyeccion=None, perfil=False, monitor=None):
+    """
+    Scores the whole portfolio chunk by chunk and appends the predictions to
+    the output CSV. Returns the number of rows read and processed. When a
+    PuntuadorParalelo is given, each chunk is split across its worker
+    processes and pipeline/model are not used. proyeccion is an optional
+    ProyeccionFusionada used instead of the Preprocesamiento and PCAConY steps.
+    With perfil=True every chunk is profiled (instrumentacion.py) and the rows
+    dropped by each cleaning filter are printed. With a MonitorDeriva every
+    chunk also updates its sketches (monitor_deriva.py).
+    """
+    if os.path.exists(salida):
+        os.remove(salida)
+
+    total_filas = 0
+    total_procesadas = 0
+    formatos = {}
+    for numero, bloque in enumerate(leer_por_bloques(ruta, chunksize)):
+        inicio = time.perf_counter()
+        bloque = fijar_formato_fechas(bloque, formatos)
+        medicion = perfilar(f'bloque_{numero}') if perfil else nullcontext()
+        deriva = monitorear(monitor) if monitor is not None else nullcontext()
+        with medicion as medido, deriva:
+            if puntuador is not None:
+                predicciones = puntuador.predecir(bloque)
+            else:
+                predicciones = predecir(pipeline, model, bloque, proyeccion)
+        resultado = resultados_bloque(bloque, predicciones)
+        resultado.to_csv(salida, mode='a', header=(numero == 0), index=False)
+
+        total_filas += len(bloque)
+        total_procesadas += len(predicciones)
+        if verbose:
+            print(f"Bloque {numero}: {len(predicciones)} de {len(bloque)} filas procesadas "
+                  f"en {time.perf_counter() - inicio:.1f} s")
+            if medido is not None:
+                descartes = ", ".join(f"{filtro}: {k:,}" for filtro, k in medido.filas_descartadas().items())
+                print(f"  Filas descartadas por filtro: {descartes}")
+
+        del bloque, predicciones, resultado
+        gc.collect()
+
+    return total_filas, total_procesadas
+
+
+def memoria_pico_mb():
+    """Peak resident memory of the process in MB (None when unavailable)."""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predicción en lote de la cartera por bloques.")
+    parser.add_argument('entrada', help="Archivo de la cartera (CSV/TXT delimitado por comas).")
+    parser.add_argument('--salida', default='predicciones.csv', help="CSV de salida.")
+    parser.add_argument('--chunksize', type=int, default=100_000, help="Filas por bloque.")
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    parser.add_argument('--paquete', default=None,
+                        help="Paquete de paquete_modelo.py (memory-mapped) en lugar de los .pkl.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Procesos en paralelo por bloque (0 = todos los núcleos).")
+    parser.add_argument('--fusionado', action='store_true',
+                        help="Usa la proyección fusionada (escalado + PCA en una sola multiplicación).")
+    parser.add_argument('--float32', action='store_true', help="Proyección fusionada en float32.")
+    parser.add_argument('--perfil', nargs='?', const='', default=None, metavar='ARCHIVO',
+                        help="Perfil por etapa (tiempo, memoria, filas) en JSON a stderr o a ARCHIVO.")
+    parser.add_argument('--deriva', nargs='?', const='', default=None, metavar='ARCHIVO',
+                        help="Deriva (PSI/KS) contra la referencia del pipeline; ARCHIVO guarda el reporte en CSV.")
+    parser.add_argument('--crear-referencia-deriva', action='store_true',
+                        help="Guarda la distribución de este archivo como referencia de deriva del pipeline.")
+    parser.add_argument('--referencia', default=None,
+                        help="Archivo de referencia de deriva (por defecto junto a --pipeline).")
+    args = parser.parse_args()
+
+    if args.perfil is not None:
+        configurar_log(args.perfil or None)
+
+    ruta_deriva = args.referencia or ruta_referencia(args.pipeline)
+    monitor = referencia = None
+    if args.crear_referencia_deriva:
+        monitor = MonitorDeriva()
+    elif args.deriva is not None:
+        referencia = ReferenciaDeriva.leer(ruta_deriva)
+        if os.path.exists(args.pipeline) and referencia.huella_pipeline != huella_archivo(args.pipeline):
+            print(f"Aviso: {ruta_deriva} se creó con otro {args.pipeline}; conviene regenerarla.")
+        monitor = referencia.nuevo_monitor()
+
+    dtype_fusionado = None
+    if args.fusionado or args.float32:
+        dtype_fusionado = np.float32 if args.float32 else np.float64
+
+    inicio = time.perf_counter()
+    if args.workers == 1:
+        pipeline, model = cargar_modelo(args.paquete, args.pipeline, args.modelo)
+        proyeccion = None
+        if dtype_fusionado is not None:
+            proyeccion = ProyeccionFusionada.desde_pipeline(pipeline, dtype=dtype_fusionado)
+        filas, procesadas = puntuar_cartera(args.entrada, args.salida, pipeline, model, args.chunksize,
+                                            proyeccion=proyeccion, perfil=args.perfil is not None,
+                                            monitor=monitor)
+    else:
+        with PuntuadorParalelo(args.workers or None, args.pipeline, args.modelo,
+                               dtype_fusionado, args.paquete) as puntuador:
+            filas, procesadas = puntuar_cartera(args.entrada, args.salida, None, None, args.chunksize,
+                                                puntuador=puntuador, perfil=args.perfil is not None,
+                                                monitor=monitor)
+
+    print(f"El modelo se pudo ejecutar en {procesadas} de {filas} clientes "
+          f"({time.perf_counter() - inicio:.1f} s). Resultados en {args.salida}")
+    pico = memoria_pico_mb()
+    if pico is not None:
+        print(f"Memoria pico: {pico:,.0f} MB")
+
+    if args.crear_referencia_deriva:
+        huella = huella_archivo(args.pipeline) if os.path.exists(args.pipeline) else None
+        ReferenciaDeriva.desde_monitor(monitor, huella).guardar(ruta_deriva)
+        print(f"Referencia de deriva ({monitor.filas['entrada']:,} filas) guardada en {ruta_deriva}")
+    elif referencia is not None:
+        reporte = comparar(referencia, monitor)
+        print(f"Deriva contra {ruta_deriva} (PSI >= {PSI_MODERADA} moderada, >= {PSI_SIGNIFICATIVA} significativa):")
+        print(reporte.head(20).to_string(index=False, float_format=lambda x: f'{x:.3f}'))
+        if args.deriva:
+            reporte.to_csv(args.deriva, index=False)
+            print(f"Reporte completo en {args.deriva}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# bench_asignacion.py
+# Tiempo del solver voraz de asignacion_cobranza.py contra el tamaño de la
+# cartera y, en los tamaños chicos, brecha de valor contra el óptimo exacto
+# (programación lineal). Solo se generan las columnas que usa la asignación.
+#
+# Uso (desde app_bradescard2/):
+#   python benchmarks/bench_asignacion.py --filas 10000 100000 1000000 5000000 --lp-hasta 20000
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from asignacion_cobranza import (COLUMNAS_CANAL, asignar_lp, asignar_voraz, capacidades,
+                                 cargar_configuracion, matriz_valor)
+from datos_sinteticos import CANALES
+
+
+def generar_entrada(filas, seed):
+    """Allocation inputs with the ranges of the synthetic portfolio; channels as categoricals."""
+    rng = np.random.default_rng(seed)
+    datos = pd.DataFrame({
+        'ID_Cliente': np.arange(1, filas + 1),
+        'Saldo_total': np.round(rng.gamma(2.0, 4_000.0, filas), 2),
+        'Score_pago': rng.integers(0, 13, filas).astype(float),
+        'Ciclo_atraso_M1': rng.choice([0, 0, 0, 1, 2, 3], filas).astype(float),
+    })
+    for columna in COLUMNAS_CANAL:
+        # -1 = mes sin pago (nulo)
+        codigos = np.where(rng.random(filas) < 0.3, -1, rng.integers(0, len(CANALES), filas))
+        datos[columna] = pd.Categorical.from_codes(codigos, categories=CANALES)
+    datos['Prediccion_Modelo'] = rng.integers(0, 4, filas)
+    return datos
+
+
+def escalar(configuracion, filas, referencia):
+    """Capacities and budgets scaled with the portfolio so channels stay saturated at every size."""
+    for accion in configuracion['acciones']:
+        for campo in ('capacidad', 'presupuesto'):
+            if accion.get(campo) is not None:
+                accion[campo] = max(accion[campo] * filas / referencia, 1)
+    return configuracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solver voraz de asignación contra el tamaño de la cartera.")
+    parser.add_argument('--filas', type=int, nargs='+', default=[10_000, 100_000, 1_000_000, 5_000_000])
+    parser.add_argument('--lp-hasta', type=int, default=20_000, help="Compara contra el LP hasta este tamaño.")
+    parser.add_argument('--referencia', type=int, default=1_000_000,
+                        help="Tamaño para el que están pensadas las capacidades por defecto.")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    for filas in args.filas:
+        datos = generar_entrada(filas, args.seed)
+        configuracion = escalar(cargar_configuracion(), filas, args.referencia)
+
+        inicio = time.perf_counter()
+        valor = matriz_valor(datos, configuracion)
+        t_valor = time.perf_counter() - inicio
+        capacidad = capacidades(configuracion, filas)
+
+        inicio = time.perf_counter()
+        voraz = asignar_voraz(valor, capacidad)
+        t_voraz = time.perf_counter() - inicio
+        assert (np.bincount(voraz, minlength=len(capacidad))[1:] <= capacidad[1:]).all()
+        valor_voraz = valor[np.arange(filas), voraz].sum(dtype=np.float64)
+        linea = (f"{filas:>10,} filas | matriz {t_valor:6.2f} s | voraz {t_voraz:6.2f} s "
+                 f"({filas / t_voraz / 1e6:5.2f} M clientes/s)")
+
+        if filas <= args.lp_hasta:
+            inicio = time.perf_counter()
+            exacto = asignar_lp(valor, capacidad)
+            t_lp = time.perf_counter() - inicio
+            valor_lp = valor[np.arange(filas), exacto].sum(dtype=np.float64)
+            linea += f" | LP {t_lp:7.2f} s | brecha {1 - valor_voraz / valor_lp:6.2%}"
+        print(linea)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# bench_bosque.py
+# Verifica que el bosque compilado (bosque_compilado.py) predice exactamente lo
+# mismo que el RandomForestClassifier original (predict_proba dentro de
+# TOLERANCIA_PROBA) y compara la latencia p50/p99 de un solo cliente y el
+# rendimiento en lote.
+#
+# Uso (desde app_bradescard2/):
+#   python benchmarks/bench_bosque.py --filas 20000 --repeticiones 2000
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bosque_compilado import TOLERANCIA_PROBA, compilar_bosque
+from datos_sinteticos import generar_cartera
+from scoring import MODEL_PATH, PIPELINE_PATH, cargar_artefactos, transformar_conservando_indice
+
+warnings.simplefilter('ignore', FutureWarning)
+warnings.filterwarnings('ignore', message='Parsing dates in')
+
+
+def latencias_us(funcion, filas, repeticiones):
+    """Per-call latency in microseconds, one row per call."""
+    tiempos = np.empty(repeticiones)
+    for k in range(repeticiones):
+        fila = filas[k % len(filas)]
+        inicio = time.perf_counter()
+        funcion(fila)
+        tiempos[k] = time.perf_counter() - inicio
+    return tiempos * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y latencia del bosque compilado.")
+    parser.add_argument('--filas', type=int, default=20_000)
+    parser.add_argument('--repeticiones', type=int, default=2_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    args = parser.parse_args()
+
+    pipeline, model = cargar_artefactos(args.pipeline, args.modelo)
+    inicio = time.perf_counter()
+    bosque = compilar_bosque(model)
+    print(f"Compilación: {time.perf_counter() - inicio:.2f} s | {len(bosque.feature):,} nodos "
+          f"en {bosque.n_estimators} árboles | profundidad máxima {bosque.profundidad}")
+
+    datos = transformar_conservando_indice(pipeline, generar_cartera(args.filas, seed=args.seed))
+
+    # Paridad exacta en lote
+    inicio = time.perf_counter()
+    esperado = model.predict(datos)
+    t_sklearn = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    obtenido = bosque.predict(datos)
+    t_bosque = time.perf_counter() - inicio
+    np.testing.assert_array_equal(obtenido, esperado)
+    diferencia = np.max(np.abs(bosque.predict_proba(datos) - model.predict_proba(datos)))
+    assert diferencia <= TOLERANCIA_PROBA, f"predict_proba difiere en {diferencia:.1e} > {TOLERANCIA_PROBA:.0e}"
+    print(f"Paridad verificada en {len(datos):,} filas (predict idéntico, predict_proba con "
+          f"diferencia máx {diferencia:.1e}).")
+    print(f"Lote     | sklearn {len(datos) / t_sklearn:12,.0f} filas/s | compilado {len(datos) / t_bosque:12,.0f} filas/s")
+
+    # Latencia de un solo cliente, como en "Clasificar Cliente Seleccionado"
+    filas = [datos.iloc[[i]] for i in range(min(len(datos), 500))]
+    for nombre, funcion in [('sklearn', model.predict), ('compilado', bosque.predict)]:
+        t = latencias_us(funcion, filas, args.repeticiones)
+        print(f"1 fila   | {nombre:<9} | p50 {np.percentile(t, 50):10,.1f} µs | p99 {np.percentile(t, 99):10,.1f} µs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# bench_incremental.py
+# Verifica la actualización incremental con dos meses seguidos leídos en varios
+# bloques: el estado del primer mes se guarda y se vuelve a cargar, el segundo
+# mes (con altas, bajas y cambios) solo puntúa a los nuevos y cambiados, y sus
+# predicciones son idénticas a las de una corrida completa del mismo archivo.
+#
+# Uso (desde app_bradescard2/):
+#   python benchmarks/bench_incremental.py --filas 3000 --chunksize 1000
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from actualizacion_incremental import (BAJA, CAMBIADO, NUEVO, SIN_CAMBIO, EstadoScores, actualizar_cartera,
+                                       cargar_estado_previo, columnas_clave, huella_modelo)
+from datos_sinteticos import generar_cartera
+from scoring import MODEL_PATH, PIPELINE_PATH, cargar_artefactos
+
+warnings.filterwarnings('ignore', message='Parsing dates in')
+
+
+def mes_siguiente(df, rng, fraccion_cambios=0.05, fraccion_bajas=0.02, altas=200):
+    """
+    Next month's file: some balances change, some clients leave and new ones
+    (with fresh ID_Cliente) are appended. Returns the frame and the expected
+    number of changed, removed and new clients.
+    """
+    siguiente = df.copy()
+    cambian = rng.random(len(siguiente)) < fraccion_cambios
+    siguiente.loc[cambian, 'Saldo_total'] = siguiente.loc[cambian, 'Saldo_total'] + 1.0
+    salen = ~cambian & (rng.random(len(siguiente)) < fraccion_bajas)
+    siguiente = siguiente[~salen]
+    nuevos = generar_cartera(altas, seed=int(rng.integers(1 << 31)))
+    nuevos.insert(0, 'ID_Cliente', np.arange(altas) + int(df['ID_Cliente'].max()) + 1)
+    siguiente = pd.concat([siguiente, nuevos], ignore_index=True)
+    return siguiente, int(cambian.sum()), int(salen.sum()), altas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ida y vuelta de dos meses de la actualización incremental.")
+    parser.add_argument('--filas', type=int, default=3000)
+    parser.add_argument('--chunksize', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    args = parser.parse_args()
+    if args.filas <= args.chunksize:
+        parser.error("--filas debe ser mayor que --chunksize para probar varios bloques.")
+
+    rng = np.random.default_rng(args.seed)
+    mes1 = generar_cartera(args.filas, seed=args.seed)
+    mes1.insert(0, 'ID_Cliente', np.arange(1, len(mes1) + 1))
+    mes2, n_cambios, n_bajas, n_altas = mes_siguiente(mes1, rng)
+
+    pipeline, model = cargar_artefactos(args.pipeline, args.modelo)
+    huella = huella_modelo(args.pipeline, args.modelo)
+    columnas = sorted(c for c in mes1.columns if c != 'ID_Cliente')
+    clave = columnas_clave(mes1.columns)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rutas = {nombre: os.path.join(tmp, nombre) for nombre in
+                 ['mes1.csv', 'mes2.csv', 'estado.npz', 'salida1.csv', 'salida2.csv', 'delta2.csv',
+                  'completa2.csv']}
+        mes1.to_csv(rutas['mes1.csv'], index=False, encoding='latin-1')
+        mes2.to_csv(rutas['mes2.csv'], index=False, encoding='latin-1')
+
+        # Mes 1: sin estado previo, todo se puntúa
+        previo, motivo = cargar_estado_previo(rutas['estado.npz'], huella, columnas, clave)
+        assert motivo == "sin estado previo", motivo
+        estado1, reporte1 = actualizar_cartera(rutas['mes1.csv'], rutas['salida1.csv'], previo, huella,
+                                               pipeline, model, args.chunksize, verbose=False)
+        assert reporte1['nuevos'] == len(mes1), reporte1
+        assert estado1.clave == clave, estado1.clave
+        estado1.guardar(rutas['estado.npz'])
+
+        # Mes 2: el estado guardado tiene que seguir siendo válido
+        previo, motivo = cargar_estado_previo(rutas['estado.npz'], huella, columnas, clave)
+        assert motivo is None, motivo
+        inicio = time.perf_counter()
+        _, reporte2 = actualizar_cartera(rutas['mes2.csv'], rutas['salida2.csv'], previo, huella,
+                                         pipeline, model, args.chunksize, delta=rutas['delta2.csv'],
+                                         verbose=False)
+        t_incremental = time.perf_counter() - inicio
+        assert reporte2['cambiados'] == n_cambios, (reporte2, n_cambios)
+        assert reporte2['bajas'] == n_bajas, (reporte2, n_bajas)
+        assert reporte2['nuevos'] == n_altas, (reporte2, n_altas)
+        assert reporte2['sin_cambio'] == len(mes1) - n_cambios - n_bajas, reporte2
+
+        delta = pd.read_csv(rutas['delta2.csv'])
+        conteo_delta = delta['Estado'].value_counts()
+        assert conteo_delta.get(NUEVO, 0) == n_altas and conteo_delta.get(CAMBIADO, 0) == n_cambios, conteo_delta
+        assert conteo_delta.get(BAJA, 0) == n_bajas and SIN_CAMBIO not in conteo_delta, conteo_delta
+
+        # Corrida completa del mes 2 como referencia
+        inicio = time.perf_counter()
+        actualizar_cartera(rutas['mes2.csv'], rutas['completa2.csv'],
+                           EstadoScores.vacio(huella, columnas, clave), huella,
+                           pipeline, model, args.chunksize, verbose=False)
+        t_completa = time.perf_counter() - inicio
+        incremental = pd.read_csv(rutas['salida2.csv'])
+        completa = pd.read_csv(rutas['completa2.csv'])
+        pd.testing.assert_series_equal(incremental['Prediccion_Modelo'], completa['Prediccion_Modelo'],
+                                       check_exact=True)
+
+    print(f"{args.filas:,} filas en bloques de {args.chunksize:,}: {n_altas:,} nuevos, {n_cambios:,} cambiados, "
+          f"{n_bajas:,} bajas")
+    print(f"incremental {t_incremental:6.2f} s ({reporte2['fraccion_puntuada']:.1%} puntuado) | "
+          f"completa {t_completa:6.2f} s | predicciones idénticas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# bench_limpieza.py
+# Verifica que la limpieza vectorizada de pipeline_utils.py da exactamente el
+# mismo resultado que la versión original, también sobre el esquema compacto de
+# ingesta.compactar, y mide la aceleración y la memoria de ambos esquemas.
+#
+# Uso (desde app_bradescard2/):
+#   python benchmarks/bench_limpieza.py --filas 100000 1000000
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datos_sinteticos import generar_cartera
+from ingesta import compactar
+from limpieza_original import limpieza_sin_categoricas as limpieza_original
+from pipeline_utils import limpieza_sin_categoricas
+
+# Ambas versiones avisan del formato de fecha inferido y la original además
+# emite FutureWarnings de pandas en cada llamada
+warnings.simplefilter('ignore', FutureWarning)
+warnings.filterwarnings('ignore', message='Parsing dates in')
+
+
+def casos_paridad(seed):
+    """
+    Generated frames that exercise every branch of the cleaning: the full frame,
+    single rows (as in the single-client prediction), inactive months, clients
+    without M1 and extra random nulls in dates, channels and balances.
+    """
+    df = generar_cartera(3000, seed=seed)
+    df.insert(0, 'ID_Cliente', range(1, len(df) + 1))
+    rng = np.random.default_rng(seed)
+
+    ruido = df.copy()
+    for col in ['Fecha_corte_M2', 'Fecha_limite_pago_M3', 'Fecha_prox_corte_M1',
+                'Canal_Pago', 'Utilizacion_M1', 'Limite_credito']:
+        ruido.loc[rng.random(len(ruido)) < 0.05, col] = np.nan
+
+    return {
+        'completo': df,
+        'una_fila': df.iloc[[0]],
+        'rebanada': df.iloc[100:400],
+        'muestra': df.sample(500, random_state=seed),
+        'sin_m1': df[df['Saldo_total_M1'].isna()],
+        'meses_inactivos': df[df['Saldo_total_M6'].isna()],
+        'nulos_aleatorios': ruido,
+    }
+
+
+def verificar_paridad(seeds=(0, 1, 2)):
+    """Raises AssertionError if any case differs from the original implementation."""
+    for seed in seeds:
+        for nombre, df in casos_paridad(seed).items():
+            esperado = limpieza_original(df)
+            for esquema, entrada in [('por defecto', df), ('compacto', compactar(df))]:
+                obtenido = limpieza_sin_categoricas(entrada)
+                try:
+                    pd.testing.assert_frame_equal(obtenido, esperado)
+                except AssertionError as e:
+                    raise AssertionError(f"Diferencia en el caso '{nombre}', esquema {esquema} (seed={seed}): {e}")
+    print(f"Paridad verificada en {len(seeds)} seeds x {len(casos_paridad(seeds[0]))} casos.")
+
+
+def cronometrar(funcion, df):
+    inicio = time.perf_counter()
+    resultado = funcion(df)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y benchmark de limpieza_sin_categoricas.")
+    parser.add_argument('--filas', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--sin-original', action='store_true',
+                        help="Solo mide la versión vectorizada (la original tarda minutos en 1M filas).")
+    args = parser.parse_args()
+
+    verificar_paridad()
+
+    for filas in args.filas:
+        df = generar_cartera(filas, seed=args.seed)
+        nuevo, t_nuevo = cronometrar(limpieza_sin_categoricas, df)
+        linea = f"{filas:>10,} filas | vectorizada {t_nuevo:8.2f} s"
+        if not args.sin_original:
+            original, t_original = cronometrar(limpieza_original, df)
+            pd.testing.assert_frame_equal(nuevo, original)
+            linea += f" | original {t_original:8.2f} s | aceleración {t_original / t_nuevo:6.1f}x"
+        print(linea + f" | {len(nuevo):,} filas conservadas")
+
+        compacto = compactar(df)
+        mb = df.memory_usage(deep=True).sum() / 1024**2
+        mb_compacto = compacto.memory_usage(deep=True).sum() / 1024**2
+        print(f"{'':>10} memoria: por defecto {mb:,.1f} MB | compacto {mb_compacto:,.1f} MB "
+              f"| {mb / mb_compacto:.1f}x menos")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# bench_paralelo.py
+# Verifica que la predicción por fragmentos en paralelo da exactamente las mismas
+# predicciones (mismo orden e índice) que la ruta serial y mide el rendimiento
+# con distintos números de procesos.
+#
+# Uso (desde app_bradescard2/):
+#   python benchmarks/bench_paralelo.py --filas 1000000 --workers 1 2 4 8 16 32
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datos_sinteticos import generar_cartera
+from scoring import MODEL_PATH, PIPELINE_PATH, cargar_artefactos, predecir
+from scoring_paralelo import PuntuadorParalelo
+
+warnings.filterwarnings('ignore', message='Parsing dates in')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paridad y escalamiento de la predicción en paralelo.")
+    parser.add_argument('--filas', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    args = parser.parse_args()
+
+    df = generar_cartera(args.filas, seed=args.seed)
+    # Índice no consecutivo para comprobar que se conserva el original
+    df.index = df.index * 3 + 7
+
+    pipeline, model = cargar_artefactos(args.pipeline, args.modelo)
+    inicio = time.perf_counter()
+    serial = predecir(pipeline, model, df)
+    t_serial = time.perf_counter() - inicio
+    print(f"serial      {t_serial:8.2f} s | {args.filas / t_serial:12,.0f} filas/s")
+
+    for n in args.workers:
+        with PuntuadorParalelo(n, args.pipeline, args.modelo) as puntuador:
+            # La primera llamada incluye el arranque de los procesos y la carga de artefactos
+            puntuador.predecir(df.iloc[:n * 5_000])
+            inicio = time.perf_counter()
+            paralelo = puntuador.predecir(df)
+            t_paralelo = time.perf_counter() - inicio
+        pd.testing.assert_series_equal(paralelo, serial, check_exact=True)
+        print(f"{n:>3} procesos {t_paralelo:8.2f} s | {args.filas / t_paralelo:12,.0f} filas/s "
+              f"| aceleración {t_serial / t_paralelo:5.1f}x | predicciones idénticas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+# bench_pipeline.py
+# Mide tiempo y memoria pico de cada etapa del pipeline ajustado, del predict del
+# random forest y de las agregaciones de los dashboards sobre carteras sintéticas
+# de distintos tamaños. Los resultados se guardan en JSON para compararlos entre
+# versiones y detectar regresiones.
+#
+# Uso (desde app_bradescard2/):
+#   python benchmarks/bench_pipeline.py --filas 10000 100000 1000000 5000000 --salida resultados.json
+#   python benchmarks/bench_pipeline.py --filas 100000 --comparar resultados_anteriores.json
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agregados import nivel_de_riesgo, resumen_cartera, resumen_riesgo
+from cartera_compartida import CarteraCompartida
+from datos_sinteticos import generar_cartera
+from scoring import MODEL_PATH, PIPELINE_PATH, TARGET_COLUMN, cargar_artefactos, registrar_clases_pipeline
+
+warnings.simplefilter('ignore', FutureWarning)
+warnings.filterwarnings('ignore', message='Parsing dates in')
+
+TAMANOS = [10_000, 100_000, 1_000_000, 5_000_000]
+
+
+def asignar_riesgo(score):
+    # Misma regla que pages/Analisis_de_Riesgo.py
+    if score >= 9: return 'Bajo Riesgo'
+    elif score >= 5: return 'Riesgo Medio'
+    elif score > 0: return 'Alto Riesgo'
+    else: return 'Sin Información'
+
+
+def dashboard_cartera(df):
+    """Computations done by Análisis_de_Cartera.py on every rerun."""
+    metricas = (len(df), df['Saldo_total'].sum(), df['Utilizacion'].mean())
+    socios = df['Socio'].value_counts()
+    histograma = np.histogram(df['Saldo_total'].dropna(), bins=50)
+    return metricas, socios, histograma
+
+
+def dashboard_riesgo(df):
+    """Computations done by Analisis_de_Riesgo.py on every rerun."""
+    nivel = df['Score_pago'].apply(asignar_riesgo)
+    conteos = nivel.value_counts()
+    resumen = df.assign(Nivel_de_Riesgo=nivel).groupby('Nivel_de_Riesgo').agg(
+        Saldo_Total_Promedio=('Saldo_total', 'mean'),
+        Utilizacion_Promedio=('Utilizacion', 'mean'),
+        Numero_de_Clientes=('Socio', 'count')
+    )
+    return conteos, resumen
+
+
+def medir(funcion, *args, memoria=True, preparar=None):
+    """
+    Runs funcion twice: once for wall time and, when memoria is set, once under
+    tracemalloc for the peak of new allocations (NumPy and pandas buffers are
+    traced). With preparar, each run gets the arguments preparar() returns,
+    built outside the timing and the trace, so a cached computation is measured
+    from scratch both times. Returns (result, seconds, peak_mb).
+    """
+    if preparar is not None:
+        args = preparar()
+    gc.collect()
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    segundos = time.perf_counter() - inicio
+
+    pico_mb = None
+    if memoria:
+        del resultado
+        if preparar is not None:
+            args = preparar()
+        gc.collect()
+        tracemalloc.start()
+        resultado = funcion(*args)
+        pico_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+    return resultado, segundos, pico_mb
+
+
+def _forma(resultado):
+    if isinstance(resultado, (pd.DataFrame, np.ndarray)) and resultado.ndim == 2:
+        return resultado.shape
+    if isinstance(resultado, (pd.Series, np.ndarray)):
+        return len(resultado), 1
+    return None, None
+
+
+def medir_tamano(filas, pipeline, model, seed, memoria=True):
+    """Times every stage for one portfolio size. Returns a list of result rows."""
+    df = generar_cartera(filas, seed=seed)
+    df.insert(0, 'ID_Cliente', range(1, len(df) + 1))
+    filas_resultado = []
+
+    def registrar(etapa, resultado, segundos, pico_mb, filas_entrada):
+        filas_salida, columnas_salida = _forma(resultado)
+        filas_resultado.append({
+            'filas': filas, 'etapa': etapa, 'segundos': round(segundos, 4),
+            'pico_mb': None if pico_mb is None else round(pico_mb, 1),
+            'filas_entrada': filas_entrada, 'filas_salida': filas_salida,
+            'columnas_salida': columnas_salida,
+        })
+        print(f"{filas:>10,} | {etapa:<20} | {segundos:9.3f} s"
+              + ("" if pico_mb is None else f" | pico {pico_mb:9.1f} MB")
+              + ("" if filas_salida is None else f" | {filas_salida:,} filas"))
+
+    datos = df if TARGET_COLUMN in df.columns else df.assign(**{TARGET_COLUMN: 0})
+    for nombre, paso in pipeline.steps:
+        entrada = len(datos)
+        datos, segundos, pico = medir(paso.transform, datos, memoria=memoria)
+        registrar(nombre, datos, segundos, pico, entrada)
+
+    if model is not None:
+        predicciones, segundos, pico = medir(model.predict, datos, memoria=memoria)
+        registrar('predict', predicciones, segundos, pico, len(datos))
+    del datos
+
+    for nombre, funcion in [('dashboard_cartera', dashboard_cartera), ('dashboard_riesgo', dashboard_riesgo)]:
+        resultado, segundos, pico = medir(funcion, df, memoria=memoria)
+        registrar(nombre, None, segundos, pico, len(df))
+
+    # Capa de agregados (agregados.py): primer cálculo por huella y rerun desde la caché
+    nivel = nivel_de_riesgo(df['Score_pago'].to_numpy(dtype=np.float64, na_value=np.nan))
+    assert (np.asarray(nivel) == df['Score_pago'].apply(asignar_riesgo).to_numpy()).all()
+    carteras = []
+
+    def cartera_nueva():
+        # Cartera sin agregados ni columnas derivadas: cada corrida es un primer cálculo
+        carteras.append(CarteraCompartida(df, None))
+        return (carteras[-1],)
+
+    for nombre, funcion in [('agregados_cartera', resumen_cartera), ('agregados_riesgo', resumen_riesgo)]:
+        resultado, segundos, pico = medir(funcion, memoria=memoria, preparar=cartera_nueva)
+        registrar(nombre, None, segundos, pico, len(df))
+        resultado, segundos, pico = medir(funcion, carteras[-1], memoria=memoria)
+        registrar(f'{nombre}_rerun', None, segundos, pico, len(df))
+        carteras.clear()
+
+    return filas_resultado
+
+
+def metadatos():
+    """Environment description stored with the results."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import sklearn
+    return {
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'sklearn': sklearn.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def comparar(actuales, ruta_base, tolerancia):
+    """
+    Compares wall times against a previous results file. Returns the list of
+    (filas, etapa, base, actual) whose time grew by more than tolerancia.
+    """
+    with open(ruta_base, encoding='utf-8') as f:
+        base = {(r['filas'], r['etapa']): r for r in json.load(f)['resultados']}
+
+    regresiones = []
+    for r in actuales:
+        anterior = base.get((r['filas'], r['etapa']))
+        if anterior is None or anterior['segundos'] <= 0:
+            continue
+        cambio = r['segundos'] / anterior['segundos'] - 1
+        marca = 'REGRESIÓN' if cambio > tolerancia else ''
+        print(f"{r['filas']:>10,} | {r['etapa']:<20} | {anterior['segundos']:9.3f} s -> "
+              f"{r['segundos']:9.3f} s ({cambio:+.0%}) {marca}")
+        if cambio > tolerancia:
+            regresiones.append((r['filas'], r['etapa'], anterior['segundos'], r['segundos']))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark por etapa del pipeline y los dashboards.")
+    parser.add_argument('--filas', type=int, nargs='+', default=TAMANOS)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    parser.add_argument('--salida', default='resultados_benchmark.json', help="JSON de resultados.")
+    parser.add_argument('--sin-memoria', action='store_true',
+                        help="Solo mide tiempos (tracemalloc duplica el costo de cada etapa).")
+    parser.add_argument('--comparar', help="JSON de una ejecución anterior para detectar regresiones.")
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help="Aumento relativo de tiempo considerado regresión (0.2 = 20%%).")
+    args = parser.parse_args()
+
+    if os.path.exists(args.modelo):
+        pipeline, model = cargar_artefactos(args.pipeline, args.modelo)
+    else:
+        print(f"No se encontró {args.modelo}; se omite la etapa predict.")
+        registrar_clases_pipeline()
+        pipeline, model = joblib.load(args.pipeline), None
+
+    resultados = []
+    for filas in args.filas:
+        resultados += medir_tamano(filas, pipeline, model, args.seed, memoria=not args.sin_memoria)
+
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump({'meta': metadatos(), 'resultados': resultados}, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en {args.salida}")
+
+    if args.comparar:
+        regresiones = comparar(resultados, args.comparar, args.tolerancia)
+        if regresiones:
+            print(f"{len(regresiones)} etapas más lentas que la tolerancia de {args.tolerancia:.0%}.")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
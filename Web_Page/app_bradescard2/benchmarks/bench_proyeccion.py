@@ -0,0 +1,92 @@
+# bench_proyeccion.py
+# Compara la proyección fusionada (proyeccion_fusionada.py) contra los pasos
+# Preprocesamiento + PCAConY del pipeline: diferencia máxima de las PCA_*, la
+# columna objetivo escalada, las predicciones del modelo, tiempo y memoria pico,
+# en float64 y float32.
+#
+# Uso (desde app_bradescard2/):
+#   python benchmarks/bench_proyeccion.py --filas 100000 1000000
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import joblib
+
+from datos_sinteticos import generar_cartera
+from proyeccion_fusionada import TOLERANCIA_FLOAT32, TOLERANCIA_FLOAT64, ProyeccionFusionada
+from scoring import MODEL_PATH, PIPELINE_PATH, TARGET_COLUMN, registrar_clases_pipeline
+
+warnings.simplefilter('ignore', FutureWarning)
+warnings.filterwarnings('ignore', message='Parsing dates in')
+
+
+def medir(funcion, datos):
+    inicio = time.perf_counter()
+    funcion(datos)
+    segundos = time.perf_counter() - inicio
+    tracemalloc.start()
+    resultado = funcion(datos)
+    pico_mb = tracemalloc.get_traced_memory()[1] / 1024**2
+    tracemalloc.stop()
+    return resultado, segundos, pico_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proyección fusionada contra el pipeline original.")
+    parser.add_argument('--filas', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    args = parser.parse_args()
+
+    registrar_clases_pipeline()
+    pipeline = joblib.load(args.pipeline)
+    model = joblib.load(args.modelo)
+    prep = pipeline.named_steps['Preprocesamiento']
+    pca_target = pipeline.named_steps['PCAConY']
+
+    def original(datos):
+        return pca_target.transform(prep.transform(datos))
+
+    fusionadas = {
+        'float64': (ProyeccionFusionada.desde_pipeline(pipeline), TOLERANCIA_FLOAT64),
+        'float32': (ProyeccionFusionada.desde_pipeline(pipeline, dtype=np.float32), TOLERANCIA_FLOAT32),
+    }
+
+    for filas in args.filas:
+        df = generar_cartera(filas, seed=args.seed)
+        datos = pipeline.named_steps['Limpieza'].transform(df)
+        transformado, t_original, pico_original = medir(original, datos)
+        esperado = transformado.drop(columns=[TARGET_COLUMN]).to_numpy()
+        prediccion_original = model.predict(transformado)
+        print(f"{filas:>10,} filas | original  {t_original:7.2f} s | pico {pico_original:8.1f} MB")
+
+        for nombre, (proyeccion, tolerancia) in fusionadas.items():
+            obtenido, t, pico = medir(proyeccion.transformar_arreglo, datos)
+            error = np.max(np.abs(obtenido - esperado) / np.maximum(1, np.abs(esperado)))
+            assert error <= tolerancia, f"{nombre}: error relativo {error:.2e} > {tolerancia:.0e}"
+
+            # La columna objetivo llega escalada al modelo, igual que en el pipeline
+            fusionado = proyeccion.transform(datos)
+            np.testing.assert_array_equal(fusionado[TARGET_COLUMN].to_numpy(),
+                                          transformado[TARGET_COLUMN].to_numpy(),
+                                          err_msg=f"{nombre}: columna {TARGET_COLUMN} distinta")
+            distintas = int(np.count_nonzero(model.predict(fusionado) != prediccion_original))
+            if proyeccion.dtype == np.float64:
+                assert distintas == 0, f"{nombre}: {distintas:,} predicciones distintas"
+            print(f"{'':>16} | {nombre:<9} {t:7.2f} s | pico {pico:8.1f} MB "
+                  f"({pico / pico_original:.0%}) | error máx {error:.1e} | aceleración {t_original / t:5.1f}x "
+                  f"| predicciones distintas {distintas:,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# carga_servicio.py
+# Prueba de carga de servicio_scoring.py contra una instancia local. Abre N
+# conexiones keep-alive que envían clientes sintéticos durante un tiempo fijo y
+# reporta el throughput, la latencia (p50/p95/p99/máx) y las respuestas 503.
+#
+# Uso (desde app_bradescard2/, con el servicio corriendo):
+#   python servicio_scoring.py --puerto 8000 &
+#   python benchmarks/carga_servicio.py --puerto 8000 --conexiones 64 --segundos 30
+#   python benchmarks/carga_servicio.py --puerto 8000 --conexiones 8 --clientes-por-peticion 100
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datos_sinteticos import generar_cartera
+
+
+def cuerpos_peticion(n_clientes, por_peticion, seed):
+    """Pre-serialized request bodies with synthetic clients in the raw schema."""
+    df = generar_cartera(n_clientes, seed=seed)
+    df.insert(0, 'ID_Cliente', range(1, len(df) + 1))
+    registros = json.loads(df.to_json(orient='records'))
+    cuerpos = []
+    for inicio in range(0, len(registros), por_peticion):
+        lote = registros[inicio:inicio + por_peticion]
+        contenido = {'cliente': lote[0]} if por_peticion == 1 else {'clientes': lote}
+        cuerpos.append((json.dumps(contenido).encode('utf-8'), len(lote)))
+    return cuerpos
+
+
+async def _enviar(lector, escritor, host, cuerpo):
+    escritor.write(
+        f'POST /puntuar HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+        f'Content-Length: {len(cuerpo)}\r\n\r\n'.encode('latin-1') + cuerpo
+    )
+    await escritor.drain()
+    estado = int((await lector.readline()).split()[1])
+    largo = 0
+    while True:
+        linea = await lector.readline()
+        if linea in (b'\r\n', b''):
+            break
+        nombre, _, valor = linea.decode('latin-1').partition(':')
+        if nombre.lower() == 'content-length':
+            largo = int(valor)
+    await lector.readexactly(largo)
+    return estado
+
+
+async def _conexion(host, puerto, cuerpos, desplazamiento, fin, latencias, estados, filas):
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    i = desplazamiento
+    try:
+        while time.perf_counter() < fin:
+            cuerpo, n = cuerpos[i % len(cuerpos)]
+            i += 1
+            inicio = time.perf_counter()
+            estado = await _enviar(lector, escritor, host, cuerpo)
+            latencias.append(time.perf_counter() - inicio)
+            estados[estado] = estados.get(estado, 0) + 1
+            if estado == 200:
+                filas[0] += n
+    finally:
+        escritor.close()
+
+
+async def prueba_carga(host, puerto, cuerpos, conexiones, segundos):
+    latencias, estados, filas = [], {}, [0]
+    inicio = time.perf_counter()
+    fin = inicio + segundos
+    await asyncio.gather(*[
+        _conexion(host, puerto, cuerpos, k * 7, fin, latencias, estados, filas) for k in range(conexiones)
+    ])
+    return latencias, estados, filas[0], time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio de scoring.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8000)
+    parser.add_argument('--conexiones', type=int, default=64, help="Peticiones concurrentes.")
+    parser.add_argument('--segundos', type=float, default=30)
+    parser.add_argument('--clientes-por-peticion', type=int, default=1)
+    parser.add_argument('--clientes', type=int, default=5_000, help="Clientes sintéticos distintos a enviar.")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    cuerpos = cuerpos_peticion(args.clientes, args.clientes_por_peticion, args.seed)
+    latencias, estados, filas, duracion = asyncio.run(
+        prueba_carga(args.host, args.puerto, cuerpos, args.conexiones, args.segundos))
+
+    if not latencias:
+        print("No se completó ninguna petición.")
+        return
+    ms = np.array(latencias) * 1000
+    print(f"{len(latencias):,} peticiones en {duracion:.1f} s con {args.conexiones} conexiones "
+          f"({args.clientes_por_peticion} clientes por petición)")
+    print(f"Throughput: {len(latencias) / duracion:,.0f} peticiones/s | {filas / duracion:,.0f} clientes/s")
+    print(f"Latencia ms: p50 {np.percentile(ms, 50):.1f} | p95 {np.percentile(ms, 95):.1f} "
+          f"| p99 {np.percentile(ms, 99):.1f} | máx {ms.max():.1f}")
+    print("Respuestas: " + ", ".join(f"{estado}: {n:,}" for estado, n in sorted(estados.items())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+# datos_sinteticos.py
+# Generador de carteras sintéticas con el mismo layout de columnas que
+# COLL_TEC_CONSOLIDADO.txt, para medir el pipeline sin usar datos privados.
+
+import numpy as np
+import pandas as pd
+
+SOCIOS = ['BOD', 'BRA', 'CYA', 'GCC', 'LOB', 'PRO', 'SHA', 'SUB']
+PRODUCTOS = ['BK', 'PLCC', 'PP']
+CANALES = ['BBVA', 'Banamex', 'Bodega', 'C&A', 'Chedraui', 'Diestel', 'GCC',
+           'Inclusión Manual', 'Promoda', 'Prosa / Interbancario', 'Red efectiva',
+           'Santander', 'Shasa', 'Suburbia']
+ESTADOS = ['AGS', 'BC', 'BCS', 'CAM', 'CDMX', 'CHI', 'CHS', 'COA', 'COL', 'DF', 'DGO',
+           'EM', 'GRO', 'GTO', 'HGO', 'JAL', 'MEX', 'MIC', 'MOR', 'NAY', 'NL', 'OAX',
+           'PUE', 'QRO', 'QR', 'SIN', 'SLP', 'SON', 'TAB', 'TAM', 'TLX', 'VER', 'YUC', 'ZAC']
+BEHAVIORS = ['A', 'B', 'C', 'D', 'E']
+
+# Orden de columnas del archivo original (98 columnas)
+COLUMNAS = (
+    ['ORG', 'Socio', 'Producto', 'Fecha_aprobacion', 'Fecha_activacion', 'Mob',
+     'Saldo_total', 'Saldo_Mes', 'Pago_minimo', 'Utilizacion', 'Corte', 'Fecha_corte',
+     'Fecha_limite_pago', 'Fecha_prox_corte', 'Pago', 'Fecha_pago', 'Canal_Pago',
+     'Ciclo_Atraso', 'Limite_credito', 'Fecha_nac', 'Genero', 'ESTADO', 'CP', 'Behavior']
+    + [f'{base}_M{i}' for base in ['Saldo_total', 'Saldo_Mes', 'Pago_minimo', 'Fecha_corte',
+                                   'Fecha_limite_pago', 'Fecha_prox_corte', 'Ciclo_atraso',
+                                   'Utilizacion', 'Behavior', 'Pago', 'Fecha_pago',
+                                   'Canal_Pago']
+       for i in range(1, 7)]
+    + ['Score_pago', 'Variable_objetivo']
+)
+
+
+def _fechas(dias, validos):
+    """Formats day offsets from 2001-01-01 as dd/mm/YYYY strings (NaN where invalid)."""
+    dias = np.where(validos, dias, 0).astype(np.int64)
+    inicio = int(dias.min())
+    # Se formatea una sola vez cada día del rango y luego se indexa la tabla
+    tabla = (pd.to_datetime('2001-01-01')
+             + pd.to_timedelta(np.arange(inicio, int(dias.max()) + 1), unit='D'))
+    tabla = tabla.strftime('%d/%m/%Y').to_numpy(dtype=object)
+    texto = tabla[dias - inicio]
+    texto[~validos] = np.nan
+    return texto
+
+
+def _fijar_formato_dia_primero(df):
+    """
+    pd.to_datetime infers the format from the first non-null value of each column.
+    The real file starts with unambiguous dates (e.g. 31/10/2007), so the first
+    value of every date column is forced to a day greater than 12.
+    """
+    for columna in df.columns:
+        if not columna.startswith('Fecha'):
+            continue
+        validos = df[columna].notna().to_numpy()
+        if not validos.any():
+            continue
+        posicion = int(np.argmax(validos))
+        valor = df[columna].iat[posicion]
+        if int(valor[:2]) <= 12:
+            df.iat[posicion, df.columns.get_loc(columna)] = '28' + valor[2:]
+    return df
+
+
+def generar_cartera(n_filas, seed=42):
+    """
+    Generates a synthetic portfolio with the column layout expected by
+    limpieza_sin_categoricas: dd/mm/YYYY date strings, M1 (most recent) to M6
+    monthly blocks, null months for accounts younger than six months and
+    Fecha_prox_corte_M{i} matching Fecha_corte_M{i-1} for most clients.
+    """
+    rng = np.random.default_rng(seed)
+    n = n_filas
+    datos = {}
+
+    datos['ORG'] = rng.choice([310, 320, 330, 352, 354, 378], n)
+    datos['Socio'] = rng.choice(SOCIOS, n)
+    datos['Producto'] = rng.choice(PRODUCTOS, n, p=[0.2, 0.6, 0.2])
+
+    # Antigüedad de la cuenta en meses; las cuentas nuevas no tienen historia en M{k}
+    mob = np.minimum(rng.exponential(20.0, n).astype(np.int64) + 1, 307)
+    datos['Mob'] = mob
+    corte_actual = 8600 + rng.integers(-90, 90, n)
+    dias_aprob = corte_actual - mob * 30 - rng.integers(0, 30, n)
+    datos['Fecha_aprobacion'] = _fechas(dias_aprob, np.ones(n, bool))
+    datos['Fecha_activacion'] = _fechas(dias_aprob + rng.integers(0, 20, n), np.ones(n, bool))
+
+    limite = np.round(rng.gamma(2.0, 3000.0, n), -2) + 500
+    datos['Limite_credito'] = limite
+    utilizacion = rng.gamma(1.5, 0.5, n)
+    saldo = np.round(limite * utilizacion, 2)
+    datos['Saldo_total'] = saldo
+    datos['Saldo_Mes'] = np.round(saldo * rng.uniform(0.5, 1.0, n), 2)
+    datos['Pago_minimo'] = np.round(saldo * rng.uniform(0.05, 0.6, n), 0)
+    util = utilizacion.copy()
+    util[rng.random(n) < 0.0005] = np.nan
+    datos['Utilizacion'] = util
+    datos['Corte'] = rng.integers(2, 29, n)
+    datos['Fecha_corte'] = _fechas(corte_actual, np.ones(n, bool))
+    datos['Fecha_limite_pago'] = _fechas(corte_actual + 20, np.ones(n, bool))
+    datos['Fecha_prox_corte'] = _fechas(corte_actual + 30, np.ones(n, bool))
+    pago_hecho = rng.random(n) < 0.6
+    datos['Pago'] = np.where(pago_hecho, np.round(saldo * rng.uniform(0, 0.5, n), 0), np.nan)
+    datos['Fecha_pago'] = _fechas(corte_actual + rng.integers(1, 25, n), pago_hecho)
+    canal = rng.choice(CANALES, n).astype(object)
+    canal[rng.random(n) < 0.3] = np.nan
+    datos['Canal_Pago'] = canal
+    datos['Ciclo_Atraso'] = rng.choice(np.arange(0, 8), n, p=[0.35, 0.2, 0.12, 0.1, 0.08, 0.06, 0.05, 0.04])
+    nac_validos = rng.random(n) > 0.01
+    datos['Fecha_nac'] = _fechas(-rng.integers(0, 15000, n), nac_validos)
+    genero = rng.choice(['F', 'M'], n).astype(object)
+    genero[rng.random(n) < 0.02] = np.nan
+    datos['Genero'] = genero
+    estado = rng.choice(ESTADOS, n).astype(object)
+    estado[rng.random(n) < 0.01] = np.nan
+    datos['ESTADO'] = estado
+    datos['CP'] = rng.integers(1000, 99999, n)
+    behavior = rng.choice(BEHAVIORS, n).astype(object)
+    behavior[rng.random(n) < 0.1] = np.nan
+    datos['Behavior'] = behavior
+
+    # Bloques mensuales: M1 es el mes más reciente, M6 el más antiguo
+    historia = np.minimum(mob, 6)
+    historia[rng.random(n) < 0.01] = 0
+    # Algunos clientes no tienen estado de cuenta en M1 aunque sí en meses anteriores
+    sin_m1 = (historia > 1) & (rng.random(n) < 0.03)
+    bloques = {}
+    for i in range(1, 7):
+        activo = (historia >= i) & ~(sin_m1 & (i == 1))
+        corte_mes = corte_actual - 30 * i
+        factor = rng.uniform(0.7, 1.1, n)
+        saldo_mes = np.where(activo, np.round(saldo * factor, 2), np.nan)
+        bloques[f'Saldo_total_M{i}'] = saldo_mes
+        bloques[f'Saldo_Mes_M{i}'] = np.round(saldo_mes * rng.uniform(0.5, 1.0, n), 2)
+        bloques[f'Pago_minimo_M{i}'] = np.round(saldo_mes * rng.uniform(0.05, 0.3, n), 0)
+        bloques[f'Fecha_corte_M{i}'] = _fechas(corte_mes, activo)
+        bloques[f'Fecha_limite_pago_M{i}'] = _fechas(corte_mes + 20, activo)
+        # La mayoría de los clientes tienen Fecha_prox_corte_M{i} == Fecha_corte_M{i-1}
+        desfase = np.where(rng.random(n) < 0.8, 0, rng.integers(1, 5, n))
+        bloques[f'Fecha_prox_corte_M{i}'] = _fechas(corte_mes + 30 + desfase, activo)
+        bloques[f'Ciclo_atraso_M{i}'] = np.where(activo, rng.choice(np.arange(0, 5), n), np.nan)
+        bloques[f'Utilizacion_M{i}'] = np.where(activo, utilizacion * factor, np.nan)
+        behavior_mes = rng.choice(BEHAVIORS, n).astype(object)
+        behavior_mes[~activo] = np.nan
+        bloques[f'Behavior_M{i}'] = behavior_mes
+        pago_mes = activo & (rng.random(n) < 0.55)
+        bloques[f'Pago_M{i}'] = np.where(pago_mes, np.round(saldo_mes * rng.uniform(0, 0.4, n), 0), np.nan)
+        bloques[f'Fecha_pago_M{i}'] = _fechas(corte_mes + rng.integers(1, 25, n), pago_mes)
+        # Canal habitual por cliente con algo de ruido mensual
+        canal_mes = np.where(rng.random(n) < 0.7, canal, rng.choice(CANALES, n)).astype(object)
+        canal_mes[~pago_mes] = np.nan
+        bloques[f'Canal_Pago_M{i}'] = canal_mes
+    datos.update(bloques)
+
+    score = rng.integers(0, 13, n).astype(float)
+    score[rng.random(n) < 0.005] = np.nan
+    datos['Score_pago'] = score
+    datos['Variable_objetivo'] = (rng.random(n) < 0.32).astype(np.int64)
+
+    return _fijar_formato_dia_primero(pd.DataFrame(datos, columns=COLUMNAS))
@@ -0,0 +1,74 @@
+# prueba_deriva.py
+# Verifica el monitor de deriva contra sí mismo: la referencia se crea con una
+# cartera sintética puntuada en bloques, se guarda y se vuelve a leer, y la
+# misma cartera puntuada otra vez tiene que salir estable en todas las columnas
+# (PSI ~ 0). Con un corrimiento de Score_pago la deriva sí se tiene que marcar.
+#
+# Uso (desde app_bradescard2/):
+#   python benchmarks/prueba_deriva.py --filas 20000 --chunksize 5000
+
+import argparse
+import os
+import sys
+import tempfile
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datos_sinteticos import generar_cartera
+from monitor_deriva import PSI_MODERADA, MonitorDeriva, ReferenciaDeriva, comparar, monitorear
+from scoring import MODEL_PATH, PIPELINE_PATH, cargar_artefactos, fijar_formato_fechas, predecir
+
+warnings.filterwarnings('ignore', message='Parsing dates in')
+
+# PSI máximo aceptado al comparar los mismos datos: solo el error de rango del boceto
+PSI_MISMOS_DATOS = 0.01
+
+
+def puntuar(pipeline, model, df, chunksize, monitor):
+    """Scores df in chunks inside the monitor block, as batch_scoring.py does."""
+    formatos = {}
+    with monitorear(monitor):
+        for inicio in range(0, len(df), chunksize):
+            predecir(pipeline, model, fijar_formato_fechas(df.iloc[inicio:inicio + chunksize].copy(), formatos))
+    return monitor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PSI del monitor de deriva con los datos de la referencia.")
+    parser.add_argument('--filas', type=int, default=20000)
+    parser.add_argument('--chunksize', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    args = parser.parse_args()
+
+    pipeline, model = cargar_artefactos(args.pipeline, args.modelo)
+    df = generar_cartera(args.filas, seed=args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'referencia_deriva.json')
+        ReferenciaDeriva.desde_monitor(puntuar(pipeline, model, df, args.chunksize, MonitorDeriva())).guardar(ruta)
+        referencia = ReferenciaDeriva.leer(ruta)
+
+    # Los mismos datos: ninguna columna con deriva
+    reporte = comparar(referencia, puntuar(pipeline, model, df, args.chunksize, referencia.nuevo_monitor()))
+    peor = reporte.iloc[0]
+    assert peor['PSI'] < PSI_MISMOS_DATOS, reporte.head().to_string()
+    assert (reporte['Deriva'].isin(['estable', ''])).all(), reporte[reporte['Deriva'] != 'estable'].to_string()
+
+    # Score_pago corrido: la deriva se detecta
+    corrido = df.assign(Score_pago=df['Score_pago'] * 1.5)
+    reporte_corrido = comparar(referencia, puntuar(pipeline, model, corrido, args.chunksize,
+                                                   referencia.nuevo_monitor()))
+    psi_corrido = reporte_corrido.set_index('Columna').loc['Score_pago', 'PSI']
+    assert psi_corrido >= PSI_MODERADA, reporte_corrido.head().to_string()
+
+    print(f"{args.filas:,} filas en bloques de {args.chunksize:,}, {len(reporte)} columnas: "
+          f"PSI máximo con los mismos datos {peor['PSI']:.2e} ({peor['Columna']}) | "
+          f"Score_pago x1.5 PSI {psi_corrido:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# prueba_servicio.py
+# Verifica las respuestas de servicio_scoring.py con una instancia en el mismo
+# proceso: un cliente que la limpieza descarta responde 200 con
+# "procesado": false (no 500), solo o dentro de un micro-lote con clientes
+# válidos, y las predicciones de los válidos son las de la ruta serial. Un
+# número mal formado responde 400 con la columna y el cliente, y una petición
+# con más clientes que el límite de la cola responde 413 (no 503).
+#
+# Uso (desde app_bradescard2/):
+#   python benchmarks/prueba_servicio.py --clientes 200 --conexiones 32
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datos_sinteticos import generar_cartera
+from scoring import MODEL_PATH, PIPELINE_PATH, fijar_formato_fechas, predecir
+from servicio_scoring import MicroLotes, Puntuador, ServicioScoring
+
+warnings.filterwarnings('ignore', message='Parsing dates in')
+
+
+def clientes_prueba(n, seed):
+    """
+    Synthetic clients in the raw schema, with every third one made unmatchable
+    by the date filter of the cleaning step (no Fecha_prox_corte_M2-M6), so
+    limpieza_sin_categoricas drops it.
+    """
+    df = generar_cartera(n, seed=seed)
+    df.insert(0, 'ID_Cliente', range(1, len(df) + 1))
+    descartar = df.index % 3 == 1
+    for i in range(2, 7):
+        df.loc[descartar, f'Fecha_prox_corte_M{i}'] = None
+    return df
+
+
+async def _post(host, puerto, contenido):
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    cuerpo = json.dumps(contenido).encode('utf-8')
+    escritor.write(
+        f'POST /puntuar HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+        f'Content-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + cuerpo
+    )
+    await escritor.drain()
+    estado = int((await lector.readline()).split()[1])
+    largo = 0
+    while True:
+        linea = await lector.readline()
+        if linea in (b'\r\n', b''):
+            break
+        nombre, _, valor = linea.decode('latin-1').partition(':')
+        if nombre.lower() == 'content-length':
+            largo = int(valor)
+    respuesta = json.loads(await lector.readexactly(largo))
+    escritor.close()
+    return estado, respuesta
+
+
+async def verificar(puntuador, registros, esperado, conexiones):
+    """Runs the checks against a service on a free local port."""
+    # Límite de la cola por debajo del total de clientes, para probar la petición demasiado grande
+    lotes = MicroLotes(puntuador, max_pendientes=len(registros) - 1)
+    lotes.iniciar()
+    servidor = await asyncio.start_server(ServicioScoring(lotes).atender, '127.0.0.1', 0)
+    host, puerto = servidor.sockets[0].getsockname()[:2]
+    try:
+        # Un cliente descartado, solo
+        estado, respuesta = await _post(host, puerto, {'cliente': registros[1]})
+        assert estado == 200, (estado, respuesta)
+        assert respuesta['resultados'] == [{'ID_Cliente': 2, 'procesado': False, 'prediccion': None}], respuesta
+
+        # Un número mal formado no se convierte en nulo en silencio
+        malo = dict(registros[0], Limite_credito='12,000.50 MXN')
+        estado, respuesta = await _post(host, puerto, {'clientes': [registros[2], malo]})
+        assert estado == 400, (estado, respuesta)
+        assert 'Limite_credito' in respuesta['error'] and 'ID_Cliente 1' in respuesta['error'], respuesta
+        estado, respuesta = await _post(host, puerto, {'cliente': dict(registros[0], Limite_credito='')})
+        assert estado == 200, (estado, respuesta)
+
+        # Más clientes que los que caben en la cola: 413, no 503 con Retry-After
+        estado, respuesta = await _post(host, puerto, {'clientes': registros})
+        assert estado == 413 and f'{len(registros) - 1:,}' in respuesta['error'], (estado, respuesta)
+
+        # Válidos y descartados en la misma petición
+        estado, respuesta = await _post(host, puerto, {'clientes': registros[:6]})
+        assert estado == 200, (estado, respuesta)
+        assert [r['prediccion'] for r in respuesta['resultados']] == esperado[:6], respuesta
+
+        # Peticiones concurrentes de un cliente que se juntan en micro-lotes
+        semaforo = asyncio.Semaphore(conexiones)
+
+        async def uno(registro):
+            async with semaforo:
+                return await _post(host, puerto, {'cliente': registro})
+
+        respuestas = await asyncio.gather(*[uno(r) for r in registros])
+        estados = [estado for estado, _ in respuestas]
+        assert estados.count(200) == len(registros), {e: estados.count(e) for e in set(estados)}
+        obtenido = [r['resultados'][0]['prediccion'] for _, r in respuestas]
+        assert obtenido == esperado, "Las predicciones del servicio difieren de la ruta serial."
+        return lotes.lotes
+    finally:
+        servidor.close()
+        await servidor.wait_closed()
+        await lotes.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Respuestas del servicio de scoring con clientes descartados.")
+    parser.add_argument('--clientes', type=int, default=200)
+    parser.add_argument('--conexiones', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    args = parser.parse_args()
+
+    df = clientes_prueba(args.clientes, args.seed)
+    registros = json.loads(df.to_json(orient='records', double_precision=15))
+    puntuador = Puntuador(args.pipeline, args.modelo)
+    # Referencia: la ruta serial sobre todos los clientes juntos
+    serial = predecir(puntuador.pipeline, puntuador.model, fijar_formato_fechas(df.copy(), {}))
+    esperado = [int(serial[i]) if i in serial.index else None for i in df.index]
+    descartados = esperado.count(None)
+    assert descartados >= len(df) // 3, "La limpieza no descartó a los clientes preparados para ello."
+
+    lotes = asyncio.run(verificar(puntuador, registros, esperado, args.conexiones))
+    print(f"{len(df):,} clientes ({descartados:,} descartados por la limpieza) en {lotes:,} micro-lotes: "
+          "respuestas 200 y predicciones idénticas a la ruta serial")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# bosque_compilado.py
+# Representación plana del random forest ajustado: los nodos de todos los árboles
+# se empacan en arreglos contiguos (feature, umbral, hijos y probabilidades de la
+# hoja) y se recorren todos los árboles a la vez con NumPy. Evita el costo fijo
+# de RandomForestClassifier.predict (validación, joblib, un predict_proba por
+# árbol), que domina cuando se clasifica un solo cliente.
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.utils.fixes import parse_version
+
+# Filas por bloque en el recorrido vectorizado (filas x árboles índices de nodo)
+FILAS_POR_BLOQUE = 20_000
+# Desde sklearn 1.4 tree_.value guarda fracciones y predict_proba ya no normaliza
+VALORES_NORMALIZADOS = parse_version(sklearn.__version__).release >= (1, 4)
+# Diferencia máxima de predict_proba contra sklearn (la suma en float64 del lote
+# puede diferir en el último bit si sklearn reparte los árboles entre hilos)
+TOLERANCIA_PROBA = 1e-12
+
+
+class BosqueCompilado:
+    """
+    Flat, array-backed version of a fitted RandomForestClassifier. predict and
+    predict_proba give the same results as the sklearn model: inputs are cast to
+    float32 like sklearn does before walking the trees, leaf probabilities are
+    taken as the installed sklearn computes them (normalized only before 1.4)
+    and summed tree by tree in the original order.
+    """
+    def __init__(self, feature, umbral, izquierdo, derecho, nan_izquierda, valores, raices,
+                 profundidad, classes, feature_names=None):
+        self.feature = feature
+        self.umbral = umbral
+        self.izquierdo = izquierdo
+        self.derecho = derecho
+        self.nan_izquierda = nan_izquierda
+        self.valores = valores
+        self.raices = raices
+        self.profundidad = int(profundidad)
+        self.classes_ = classes
+        self.feature_names_in_ = feature_names
+        self.n_estimators = len(raices)
+
+    def arreglos(self):
+        """The packed arrays, e.g. to save them with np.savez."""
+        arreglos = {
+            'feature': self.feature, 'umbral': self.umbral, 'izquierdo': self.izquierdo,
+            'derecho': self.derecho, 'nan_izquierda': self.nan_izquierda, 'valores': self.valores,
+            'raices': self.raices, 'profundidad': np.array(self.profundidad),
+            'classes': self.classes_,
+        }
+        if self.feature_names_in_ is not None:
+            arreglos['feature_names'] = np.asarray(self.feature_names_in_, dtype=str)
+        return arreglos
+
+    def _matriz(self, X):
+        """Column selection by name like sklearn, then the float32 cast sklearn applies."""
+        if isinstance(X, pd.DataFrame) and self.feature_names_in_ is not None:
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return X
+
+    def hojas(self, X):
+        """
+        Leaf node reached in every tree, shape (n_rows, n_trees). All trees are
+        walked together; leaves point to themselves, so a fixed number of steps
+        equal to the maximum depth reaches every leaf.
+        """
+        X = self._matriz(X)
+        filas = np.arange(len(X))[:, None]
+        nodos = np.broadcast_to(self.raices, (len(X), self.n_estimators)).copy()
+        for _ in range(self.profundidad):
+            valor = X[filas, self.feature[nodos]]
+            izquierda = valor.astype(np.float64) <= self.umbral[nodos]
+            nulos = np.isnan(valor)
+            if nulos.any():
+                izquierda = np.where(nulos, self.nan_izquierda[nodos], izquierda)
+            nodos = np.where(izquierda, self.izquierdo[nodos], self.derecho[nodos])
+        return nodos
+
+    def predict_proba(self, X):
+        X = self._matriz(X)
+        proba = np.empty((len(X), self.valores.shape[1]), dtype=np.float64)
+        for inicio in range(0, len(X), FILAS_POR_BLOQUE):
+            nodos = self.hojas(X[inicio:inicio + FILAS_POR_BLOQUE])
+            bloque = np.zeros((len(nodos), self.valores.shape[1]), dtype=np.float64)
+            # Suma árbol por árbol, en el mismo orden que RandomForestClassifier
+            for t in range(self.n_estimators):
+                bloque += self.valores[nodos[:, t]]
+            proba[inicio:inicio + len(nodos)] = bloque / self.n_estimators
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def compilar_bosque(model):
+    """
+    Packs a fitted RandomForestClassifier (single output) into a BosqueCompilado.
+    Node ids of tree t are offset by the number of nodes of the previous trees.
+    """
+    feature, umbral, izquierdo, derecho, nan_izquierda, valores, raices = [], [], [], [], [], [], []
+    desplazamiento = 0
+    profundidad = 0
+    for estimador in model.estimators_:
+        arbol = estimador.tree_
+        n = arbol.node_count
+        ids = np.arange(n) + desplazamiento
+        hoja = arbol.children_left == -1
+
+        # Las hojas apuntan a sí mismas y comparan contra la feature 0
+        izquierdo.append(np.where(hoja, ids, arbol.children_left + desplazamiento))
+        derecho.append(np.where(hoja, ids, arbol.children_right + desplazamiento))
+        feature.append(np.where(hoja, 0, arbol.feature))
+        umbral.append(np.where(hoja, 0.0, arbol.threshold))
+        if hasattr(arbol, 'missing_go_to_left'):
+            nan_izquierda.append(arbol.missing_go_to_left.astype(bool))
+        else:
+            nan_izquierda.append(np.zeros(n, dtype=bool))
+
+        # Mismos valores de hoja que DecisionTreeClassifier.predict_proba de esta versión
+        valor = arbol.value[:, 0, :model.n_classes_].astype(np.float64)
+        if not VALORES_NORMALIZADOS:
+            normalizador = valor.sum(axis=1)
+            normalizador[normalizador == 0.0] = 1.0
+            valor = valor / normalizador[:, None]
+        valores.append(valor)
+
+        raices.append(desplazamiento)
+        desplazamiento += n
+        profundidad = max(profundidad, arbol.max_depth)
+
+    indice = np.int32 if desplazamiento < 2**31 else np.int64
+    return BosqueCompilado(
+        feature=np.concatenate(feature).astype(np.int32),
+        umbral=np.concatenate(umbral).astype(np.float64),
+        izquierdo=np.concatenate(izquierdo).astype(indice),
+        derecho=np.concatenate(derecho).astype(indice),
+        nan_izquierda=np.concatenate(nan_izquierda),
+        valores=np.ascontiguousarray(np.concatenate(valores)),
+        raices=np.asarray(raices, dtype=indice),
+        profundidad=profundidad,
+        classes=model.classes_,
+        feature_names=getattr(model, 'feature_names_in_', None),
+    )
@@ -0,0 +1,180 @@
+# buscador_clientes.py
+# Búsqueda de clientes para las secciones de consulta individual. En lugar de
+# mandar todos los ID_Cliente a un st.selectbox, se arma un índice una vez por
+# cartera (IDs ordenados y posiciones por Socio/Producto) y el servidor devuelve
+# solo la página de resultados visible.
+
+import math
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+COLUMNAS_FILTRO = ['Socio', 'Producto']
+COLUMNAS_RESULTADO = ['Socio', 'Producto', 'Saldo_total']
+TAMANO_PAGINA = 50
+
+
+class IndiceClientes:
+    """
+    Search index over the client ids of one portfolio. Exact lookups use the
+    hash table of pd.Index; prefix and range searches use binary search over the
+    sorted ids; Socio/Producto filters use the row positions of each value,
+    grouped once.
+    """
+    def __init__(self, ids, columnas_filtro):
+        self.ids = ids
+        valores = ids.to_numpy()
+        self.numerico = valores.dtype.kind in 'iu'
+        if not self.numerico:
+            valores = valores.astype(str)
+        self.orden = np.argsort(valores, kind='stable')
+        self.ordenados = valores[self.orden]
+
+        # Posiciones de cada valor de los filtros (ordenadas por fila)
+        self.posiciones_filtro = {}
+        for columna, serie in columnas_filtro.items():
+            codigos, categorias = pd.factorize(serie, sort=True)
+            orden = np.argsort(codigos, kind='stable')
+            limites = np.searchsorted(codigos[orden], np.arange(len(categorias) + 1))
+            self.posiciones_filtro[columna] = {
+                categoria: orden[limites[k]:limites[k + 1]] for k, categoria in enumerate(categorias)
+            }
+
+    def opciones(self, columna):
+        """Values available for a filter column."""
+        return list(self.posiciones_filtro.get(columna, {}))
+
+    def _rango_ordenado(self, desde, hasta):
+        """Slice of the sorted ids between desde and hasta (inclusive)."""
+        inicio = np.searchsorted(self.ordenados, desde, side='left')
+        fin = np.searchsorted(self.ordenados, hasta, side='right')
+        return self.orden[inicio:fin]
+
+    def exacto(self, id_cliente):
+        """Positions of the rows with this id (hash lookup)."""
+        try:
+            pos = self.ids.get_loc(id_cliente)
+        except (KeyError, TypeError):
+            return np.array([], dtype=np.int64)
+        if isinstance(pos, slice):
+            return np.arange(pos.start, pos.stop)
+        if isinstance(pos, np.ndarray):
+            return np.flatnonzero(pos)
+        return np.array([pos])
+
+    def prefijo(self, texto):
+        """
+        Positions of the ids whose text starts with texto, in id order. For
+        numeric ids every prefix is a union of ranges: p, [10p, 10p+9], [100p, 100p+99], ...
+        """
+        if not self.numerico:
+            return self._rango_ordenado(texto, texto + '\uffff')
+        if not texto.isdigit() or (texto.startswith('0') and texto != '0'):
+            return np.array([], dtype=np.int64)
+        if len(self.ordenados) == 0:
+            return np.array([], dtype=np.int64)
+        p = int(texto)
+        digitos = len(str(int(self.ordenados[-1])))
+        tramos = []
+        for k in range(0, max(digitos - len(texto), 0) + 1):
+            if p == 0 and k > 0:
+                break
+            tramos.append(self._rango_ordenado(p * 10**k, (p + 1) * 10**k - 1))
+        return np.concatenate(tramos) if tramos else np.array([], dtype=np.int64)
+
+    def rango(self, desde=None, hasta=None):
+        """Positions of the ids in [desde, hasta], in id order; open ends when None."""
+        if len(self.ordenados) == 0:
+            return np.array([], dtype=np.int64)
+        desde = self.ordenados[0] if desde is None else desde
+        hasta = self.ordenados[-1] if hasta is None else hasta
+        return self._rango_ordenado(desde, hasta)
+
+    def buscar(self, exacto=None, prefijo='', desde=None, hasta=None, filtros=None):
+        """
+        Row positions matching all the criteria: exact id, id prefix, id range
+        and filters {column: [values]}. Results follow id order; with filters
+        only they follow row order. Without criteria, every client in id order.
+        """
+        prefijo = (prefijo or '').strip()
+        if exacto is not None:
+            posiciones = self.exacto(exacto)
+        elif prefijo:
+            posiciones = self.prefijo(prefijo)
+        elif desde is not None or hasta is not None:
+            posiciones = self.rango(desde, hasta)
+        else:
+            posiciones = None
+
+        for columna, valores in (filtros or {}).items():
+            if not valores:
+                continue
+            grupos = self.posiciones_filtro[columna]
+            seleccion = np.sort(np.concatenate([grupos[v] for v in valores if v in grupos]
+                                               or [np.array([], dtype=np.int64)]))
+            posiciones = seleccion if posiciones is None else posiciones[np.isin(posiciones, seleccion)]
+
+        return self.orden if posiciones is None else posiciones
+
+
+def pagina(posiciones, numero, tamano=TAMANO_PAGINA):
+    """Positions of page numero (1-based) and the total number of pages."""
+    paginas = max(math.ceil(len(posiciones) / tamano), 1)
+    numero = min(max(numero, 1), paginas)
+    return posiciones[(numero - 1) * tamano:numero * tamano], paginas
+
+
+def indice_clientes(cartera):
+    """Search index of a shared portfolio, built once."""
+    return cartera.agregado('indice_clientes', lambda c: IndiceClientes(
+        c.ids, {col: c.columna(col) for col in COLUMNAS_FILTRO if col in c.df.columns}))
+
+
+def selector_cliente(cartera, clave, etiqueta='Selecciona un ID de Cliente:'):
+    """
+    Client search widget: exact id, id prefix or range, Socio/Producto filters and the
+    results page by page. Only the visible page is sent to the browser. Returns
+    the selected ID_Cliente, or None when nothing matches.
+    """
+    indice = indice_clientes(cartera)
+
+    col_id, col_modo = st.columns([3, 1])
+    modo = col_modo.radio("Buscar por", ["ID exacto", "Prefijo", "Rango de IDs"], key=f'{clave}_modo')
+    exacto, texto, desde, hasta = None, '', None, None
+    if modo == "ID exacto":
+        entrada = col_id.text_input("ID de Cliente", key=f'{clave}_exacto').strip()
+        if entrada:
+            exacto = int(entrada) if indice.numerico and entrada.lstrip('-').isdigit() else entrada
+    elif modo == "Prefijo":
+        texto = col_id.text_input("Primeros dígitos del ID de Cliente", key=f'{clave}_prefijo')
+    elif indice.numerico:
+        col_desde, col_hasta = col_id.columns(2)
+        desde = col_desde.number_input("Desde", value=None, step=1, key=f'{clave}_desde')
+        hasta = col_hasta.number_input("Hasta", value=None, step=1, key=f'{clave}_hasta')
+    else:
+        col_desde, col_hasta = col_id.columns(2)
+        desde = col_desde.text_input("Desde", key=f'{clave}_desde') or None
+        hasta = col_hasta.text_input("Hasta", key=f'{clave}_hasta') or None
+
+    filtros = {}
+    columnas_filtro = [c for c in COLUMNAS_FILTRO if c in indice.posiciones_filtro]
+    for col, columna in zip(st.columns(max(len(columnas_filtro), 1)), columnas_filtro):
+        filtros[columna] = col.multiselect(columna, indice.opciones(columna), key=f'{clave}_{columna}')
+
+    posiciones = indice.buscar(exacto, texto, desde, hasta, filtros)
+    if len(posiciones) == 0:
+        st.info("Ningún cliente coincide con la búsqueda.")
+        return None
+
+    _, paginas = pagina(posiciones, 1)
+    numero = st.number_input(f"Página (de {paginas:,}; {len(posiciones):,} clientes)", min_value=1,
+                             max_value=paginas, value=1, step=1, key=f'{clave}_pagina')
+    visibles, _ = pagina(posiciones, numero)
+
+    columnas = [c for c in COLUMNAS_RESULTADO if c in cartera.df.columns]
+    tabla = cartera.vista(columnas, visibles)
+    tabla.insert(0, 'ID_Cliente', cartera.ids[visibles])
+    st.dataframe(tabla, use_container_width=True, hide_index=True)
+
+    return st.selectbox(etiqueta, tabla['ID_Cliente'].tolist(), key=f'{clave}_id')
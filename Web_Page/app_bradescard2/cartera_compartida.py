@@ -0,0 +1,144 @@
+# cartera_compartida.py
+# Cartera cargada, compartida por todas las sesiones y páginas del proceso. El
+# DataFrame se publica una sola vez por huella de datos y nadie lo modifica: las
+# páginas leen columnas sin copiarlas y guardan lo que derivan (nivel de riesgo,
+# predicciones, ...) como arreglos aparte de una fila por cliente, en lugar de
+# agregar columnas a una copia del DataFrame.
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from almacen_scores import ids_cliente
+from ingesta import cargar_cartera, huella_archivo, reporte_memoria
+
+# Carteras vivas por proceso (una por huella de datos)
+MAX_CARTERAS = 2
+
+_carteras = OrderedDict()
+_candado_carteras = threading.Lock()
+
+
+def _solo_lectura(valores):
+    """Read-only view of an array; the data itself is not copied."""
+    vista = valores.view()
+    vista.flags.writeable = False
+    return vista
+
+
+class CarteraCompartida:
+    """
+    Immutable portfolio of one fingerprint. df is never modified after it is
+    published; ID_Cliente comes from the file or, when missing, is the same 1..n
+    range the pages used to insert, kept as a separate index.
+    """
+    def __init__(self, df, huella):
+        self.df = df
+        self.huella = huella
+        # pd.Index usa una tabla hash: búsqueda O(1) por ID_Cliente
+        self.ids = pd.Index(ids_cliente(df))
+        self._derivadas = {}
+        self._agregados = {}
+        self._candado = threading.Lock()
+
+    def __len__(self):
+        return len(self.df)
+
+    def columna(self, nombre):
+        """
+        Values of one column as a read-only array. Numeric columns are views of
+        the shared frame; categorical ones are returned as their Categorical.
+        """
+        serie = self.df[nombre]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            return serie.array
+        valores = serie.to_numpy()
+        return _solo_lectura(valores) if isinstance(valores, np.ndarray) else valores
+
+    def vista(self, columnas, filas=None):
+        """
+        Frame with some columns of the portfolio. Without filas the columns are
+        shared with df (no copy); with filas (positions) only those rows are taken.
+        """
+        if filas is None:
+            return pd.DataFrame({c: self.df[c] for c in columnas}, columns=columnas, copy=False)
+        return pd.DataFrame({c: self.df[c].iloc[filas] for c in columnas}, columns=columnas)
+
+    def derivada(self, nombre, calcular):
+        """
+        Side array with one value per client, computed once per portfolio with
+        calcular(df) and shared by every session. Returned read-only.
+        """
+        with self._candado:
+            if nombre not in self._derivadas:
+                valores = calcular(self.df)
+                if isinstance(valores, (pd.Series, pd.Index)):
+                    valores = valores.array if isinstance(valores.dtype, pd.CategoricalDtype) else valores.to_numpy()
+                if len(valores) != len(self.df):
+                    raise ValueError(f"La columna derivada '{nombre}' debe tener una fila por cliente.")
+                if isinstance(valores, np.ndarray):
+                    valores = _solo_lectura(valores)
+                self._derivadas[nombre] = valores
+            return self._derivadas[nombre]
+
+    def agregado(self, nombre, calcular):
+        """
+        Small result derived from the whole portfolio (summary table, histogram,
+        ...), computed once with calcular(self) and shared by every session.
+        """
+        with self._candado:
+            if nombre in self._agregados:
+                return self._agregados[nombre]
+        # Fuera del candado: calcular puede pedir columnas derivadas u otros agregados
+        resultado = calcular(self)
+        with self._candado:
+            return self._agregados.setdefault(nombre, resultado)
+
+    def memoria(self):
+        """Per-column memory report of the frame (ingesta.reporte_memoria), computed once."""
+        return self.agregado('memoria', lambda cartera: reporte_memoria(cartera.df))
+
+
+def publicar_cartera(df, huella):
+    """
+    Shared portfolio for this fingerprint. The first frame published for a
+    fingerprint wins; later calls with the same fingerprint get that store, so
+    sessions that load the same file hold a single copy of the data.
+    """
+    if huella is None:
+        huella = id(df)
+    with _candado_carteras:
+        cartera = _carteras.get(huella)
+        if cartera is None or len(cartera) != len(df):
+            cartera = CarteraCompartida(df, huella)
+            _carteras[huella] = cartera
+        _carteras.move_to_end(huella)
+        while len(_carteras) > MAX_CARTERAS:
+            _carteras.popitem(last=False)
+        return cartera
+
+
+def cargar_cartera_compartida(fuente, **opciones):
+    """
+    Loads a portfolio (path or uploaded file) through the shared stores: when a
+    session already published the same content, its frame is reused without
+    reading the file again. Options are passed to ingesta.cargar_cartera.
+    """
+    huella = huella_archivo(fuente)
+    with _candado_carteras:
+        cartera = _carteras.get(huella)
+        if cartera is not None:
+            _carteras.move_to_end(huella)
+            return cartera
+    df, huella = cargar_cartera(fuente, huella=huella, **opciones)
+    return publicar_cartera(df, huella)
+
+
+def cartera_de_sesion(estado):
+    """
+    Shared portfolio of a Streamlit session (st.session_state), published again
+    from the session's own reference if the process dropped it.
+    """
+    return publicar_cartera(estado['df'], estado.get('df_huella'))
@@ -0,0 +1,303 @@
+# clientes_similares.py
+# Índice de clientes similares sobre las features PCA_* que produce
+# PCAWithTarget. Se construye al terminar la predicción en lote con las features
+# que ya guarda el almacén de scores y responde los k clientes más cercanos con
+# su predicción y saldos clave en milisegundos.
+#
+# Hasta MAX_FILAS_EXACTO clientes el índice es exacto (BallTree). Con más, es un
+# archivo invertido aproximado: un k-means sobre las primeras DIM_CUANTIZADOR
+# componentes (las de mayor varianza) reparte a los clientes en listas y una
+# consulta solo mide la distancia completa a los clientes de las N_SONDAS listas
+# más cercanas.
+#
+# El índice se guarda en disco (arreglos .npy con memory mapping y un
+# manifest.json) y pertenece a una huella de los artefactos del modelo y a la
+# huella de la cartera puntuada: con otra cartera cargada no se consulta, porque
+# sus ids (1..n cuando falta ID_Cliente) no nombran a los mismos clientes. Un
+# lote nuevo de la misma cartera lo actualiza de forma incremental: los clientes
+# sin cambios conservan su lista, solo los nuevos o cambiados se asignan a los
+# centroides y los que ya no están se eliminan. Con otra cartera solo se
+# conservan los centroides. El k-means solo se vuelve a entrenar cuando la
+# cartera crece más de FACTOR_REENTRENAMIENTO veces o cambia el modelo.
+
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import BallTree
+
+INDICE_DIR = os.path.join('data', 'indice_similares')
+MANIFIESTO = 'manifest.json'
+FORMATO = 'bradescard-similares'
+VERSION_INDICE = 1
+
+COLUMNAS_SALDO = ['Saldo_total', 'Limite_credito', 'Utilizacion', 'Score_pago']
+K_SIMILARES = 10
+MAX_FILAS_EXACTO = 200_000
+DIM_CUANTIZADOR = 16
+N_SONDAS = 8
+# Puntos de entrenamiento del k-means por lista
+MUESTRA_POR_LISTA = 40
+FACTOR_REENTRENAMIENTO = 4
+FILAS_POR_BLOQUE = 100_000
+
+_indice = None
+_candado = threading.Lock()
+
+
+def _ids_guardables(ids):
+    """Client ids as an array np.save can write without pickle."""
+    ids = np.asarray(ids)
+    return ids if ids.dtype.kind in 'iuf' else ids.astype(str)
+
+
+def numero_listas(filas):
+    return int(np.clip(np.sqrt(filas), 16, 4096))
+
+
+def asignar_listas(features, centroides, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Nearest centroid of every row (on the quantizer components), in blocks."""
+    dim = centroides.shape[1]
+    normas = (centroides.astype(np.float32) ** 2).sum(axis=1)
+    listas = np.empty(len(features), dtype=np.int32)
+    for inicio in range(0, len(features), filas_por_bloque):
+        bloque = np.asarray(features[inicio:inicio + filas_por_bloque, :dim], dtype=np.float32)
+        # ||x - c||^2 sin el término ||x||^2, que no cambia el argmin
+        listas[inicio:inicio + len(bloque)] = np.argmin(normas - 2 * bloque @ centroides.T, axis=1)
+    return listas
+
+
+def entrenar_cuantizador(features, seed=0):
+    """k-means centroids on a sample of the first DIM_CUANTIZADOR components."""
+    listas = numero_listas(len(features))
+    rng = np.random.default_rng(seed)
+    muestra = np.sort(rng.choice(len(features), min(len(features), MUESTRA_POR_LISTA * listas), replace=False))
+    kmeans = MiniBatchKMeans(n_clusters=listas, n_init=1, batch_size=4096, random_state=seed)
+    kmeans.fit(np.asarray(features[muestra, :DIM_CUANTIZADOR], dtype=np.float32))
+    return kmeans.cluster_centers_.astype(np.float32)
+
+
+class IndiceSimilares:
+    """
+    Nearest-neighbour index of the scored clients. Rows keep ids, PCA features,
+    predictions and key balances; in the inverted-file mode they are stored
+    grouped by list (inicios[l]:inicios[l + 1] are the rows of list l).
+    """
+    def __init__(self, ids, features, predicciones, saldos, huella, huella_cartera, centroides=None,
+                 inicios=None, filas_entrenamiento=0):
+        self.ids = ids
+        self.features = features
+        self.predicciones = predicciones
+        self.saldos = saldos
+        self.huella = huella
+        self.huella_cartera = huella_cartera
+        self.centroides = centroides
+        self.inicios = inicios
+        self.filas_entrenamiento = filas_entrenamiento
+        self._arbol = None
+        self._candado = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def exacto(self):
+        return self.centroides is None
+
+    def pertenece(self, huella, huella_cartera):
+        """True when the index was built with these model artifacts from this portfolio."""
+        return self.huella == huella and self.huella_cartera == huella_cartera
+
+    @classmethod
+    def construir(cls, ids, features, predicciones, saldos, huella, huella_cartera, centroides=None,
+                  listas=None, filas_entrenamiento=None):
+        """
+        Index of these rows: exact up to MAX_FILAS_EXACTO rows, otherwise an
+        inverted file. centroides (trained on filas_entrenamiento rows) and
+        listas (list of each row, -1 when unknown) are reused when given, so
+        only the rows without a list are assigned.
+        """
+        ids = _ids_guardables(ids)
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        if len(ids) <= MAX_FILAS_EXACTO:
+            return cls(ids, features, np.asarray(predicciones), saldos, huella, huella_cartera)
+
+        if centroides is None:
+            centroides = entrenar_cuantizador(features)
+            filas_entrenamiento = len(ids)
+            listas = None
+        if listas is None:
+            listas = asignar_listas(features, centroides)
+        else:
+            sin_lista = listas < 0
+            listas[sin_lista] = asignar_listas(features[sin_lista], centroides)
+        orden = np.argsort(listas, kind='stable')
+        inicios = np.concatenate([[0], np.cumsum(np.bincount(listas, minlength=len(centroides)))]).astype(np.int64)
+        return cls(ids[orden], features[orden], np.asarray(predicciones)[orden], saldos[orden], huella,
+                   huella_cartera, centroides, inicios, filas_entrenamiento)
+
+    def listas(self):
+        """List of every stored row (None for the exact index)."""
+        if self.exacto:
+            return None
+        return np.repeat(np.arange(len(self.centroides), dtype=np.int32), np.diff(self.inicios))
+
+    def _candidatos(self, vector, k, n_sondas):
+        distancias = ((self.centroides - vector[:DIM_CUANTIZADOR]) ** 2).sum(axis=1)
+        filas, total = [], 0
+        for numero, lista in enumerate(np.argsort(distancias)):
+            if numero >= n_sondas and total >= k:
+                break
+            inicio, fin = self.inicios[lista], self.inicios[lista + 1]
+            filas.append(np.arange(inicio, fin))
+            total += fin - inicio
+        return np.concatenate(filas)
+
+    def buscar(self, vector, k=K_SIMILARES, n_sondas=N_SONDAS):
+        """Stored rows of the k nearest clients to vector and their euclidean distances, nearest first."""
+        vector = np.asarray(vector, dtype=np.float32)
+        k = min(k, len(self))
+        if self.exacto:
+            with self._candado:
+                if self._arbol is None:
+                    self._arbol = BallTree(self.features)
+            distancias, filas = self._arbol.query(vector[None, :], k=k)
+            return filas[0], distancias[0]
+        candidatos = self._candidatos(vector, k, n_sondas)
+        distancias = ((self.features[candidatos] - vector) ** 2).sum(axis=1)
+        mejores = np.argpartition(distancias, k - 1)[:k] if k < len(candidatos) else np.arange(len(candidatos))
+        mejores = mejores[np.argsort(distancias[mejores])]
+        return candidatos[mejores], np.sqrt(distancias[mejores])
+
+    def similares(self, vector, k=K_SIMILARES, excluir=None):
+        """
+        Frame of the k clients nearest to vector (without the client excluir):
+        ID_Cliente, distance, prediction and key balances. Returns (frame, seconds).
+        """
+        inicio = time.perf_counter()
+        filas, distancias = self.buscar(vector, k + (excluir is not None))
+        if excluir is not None:
+            conservar = np.array([str(i) != str(excluir) for i in self.ids[filas]], dtype=bool)
+            filas, distancias = filas[conservar][:k], distancias[conservar][:k]
+        tabla = pd.DataFrame({'ID_Cliente': self.ids[filas], 'Distancia': distancias,
+                              'Prediccion_Modelo': self.predicciones[filas]})
+        for j, columna in enumerate(COLUMNAS_SALDO):
+            tabla[columna] = self.saldos[filas, j]
+        return tabla, time.perf_counter() - inicio
+
+    def guardar(self, directorio=INDICE_DIR):
+        """Writes the index as .npy arrays plus a manifest (whole directory renamed at the end)."""
+        arreglos = {'ids': self.ids, 'features': self.features, 'predicciones': self.predicciones,
+                    'saldos': self.saldos}
+        if not self.exacto:
+            arreglos.update(centroides=self.centroides, inicios=self.inicios)
+        temporal = f'{directorio}.{os.getpid()}.tmp'
+        shutil.rmtree(temporal, ignore_errors=True)
+        os.makedirs(temporal)
+        for nombre, arreglo in arreglos.items():
+            np.save(os.path.join(temporal, f'{nombre}.npy'), np.ascontiguousarray(arreglo), allow_pickle=False)
+        manifiesto = {'formato': FORMATO, 'version': VERSION_INDICE, 'huella': self.huella,
+                      'huella_cartera': self.huella_cartera,
+                      'filas': len(self), 'exacto': self.exacto, 'filas_entrenamiento': self.filas_entrenamiento,
+                      'columnas_saldo': COLUMNAS_SALDO, 'arreglos': sorted(arreglos)}
+        with open(os.path.join(temporal, MANIFIESTO), 'w', encoding='utf-8') as f:
+            json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+        if os.path.isdir(directorio):
+            shutil.rmtree(directorio)
+        os.replace(temporal, directorio)
+        return directorio
+
+    @classmethod
+    def leer(cls, directorio=INDICE_DIR):
+        """Memory-mapped index, or None when the directory has no valid index."""
+        ruta = os.path.join(directorio, MANIFIESTO)
+        if not os.path.exists(ruta):
+            return None
+        with open(ruta, encoding='utf-8') as f:
+            manifiesto = json.load(f)
+        if manifiesto.get('formato') != FORMATO or manifiesto.get('version') != VERSION_INDICE:
+            return None
+        arreglos = {nombre: np.load(os.path.join(directorio, f'{nombre}.npy'), mmap_mode='r', allow_pickle=False)
+                    for nombre in manifiesto['arreglos']}
+        return cls(arreglos['ids'], arreglos['features'], arreglos['predicciones'], arreglos['saldos'],
+                   manifiesto['huella'], manifiesto.get('huella_cartera'), arreglos.get('centroides'),
+                   arreglos.get('inicios'), manifiesto['filas_entrenamiento'])
+
+
+def actualizar(previo, ids, features, predicciones, saldos, huella, huella_cartera):
+    """
+    New index for a scored batch, reusing the previous one when it belongs to
+    the same model fingerprint and portfolio: unchanged clients keep their list
+    and only new or changed clients are assigned. Clients missing from the
+    batch are dropped. From another portfolio only the centroids are reused.
+    Returns (index, report).
+    """
+    inicio = time.perf_counter()
+    ids = _ids_guardables(ids)
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    reporte = {'filas': len(ids), 'nuevos': len(ids), 'cambiados': 0, 'bajas': 0, 'incremental': False}
+    if previo is not None and (previo.huella != huella or previo.features.shape[1] != features.shape[1]):
+        previo = None
+    misma_cartera = previo is not None and previo.huella_cartera == huella_cartera
+    if misma_cartera:
+        anterior = pd.Index(previo.ids).get_indexer(ids)
+        existe = anterior >= 0
+        igual = np.zeros(len(ids), dtype=bool)
+        for desde in range(0, len(ids), FILAS_POR_BLOQUE):
+            # Por bloques: las features previas se leen del disco sin copiarlas enteras
+            bloque = slice(desde, desde + FILAS_POR_BLOQUE)
+            filas = np.flatnonzero(existe[bloque]) + desde
+            igual[filas] = (np.asarray(previo.features[anterior[filas]]) == features[filas]).all(axis=1)
+        reporte.update(nuevos=int((~existe).sum()), cambiados=int((existe & ~igual).sum()),
+                       bajas=int(len(previo) - existe.sum()))
+
+    centroides = listas = None
+    if (previo is not None and not previo.exacto and len(ids) > MAX_FILAS_EXACTO
+            and len(ids) <= FACTOR_REENTRENAMIENTO * previo.filas_entrenamiento):
+        centroides = np.asarray(previo.centroides)
+        listas = np.full(len(ids), -1, dtype=np.int32)
+        if misma_cartera:
+            listas[igual] = previo.listas()[anterior[igual]]
+        reporte['incremental'] = True
+    indice = IndiceSimilares.construir(ids, features, predicciones, saldos, huella, huella_cartera, centroides,
+                                       listas, previo.filas_entrenamiento if reporte['incremental'] else None)
+    reporte['exacto'] = indice.exacto
+    reporte['segundos'] = time.perf_counter() - inicio
+    return indice, reporte
+
+
+def obtener_indice(directorio=INDICE_DIR):
+    """Process-wide index, read from disk on first use or after another process rewrote it."""
+    global _indice
+    ruta = os.path.join(directorio, MANIFIESTO)
+    marca = os.stat(ruta).st_mtime_ns if os.path.exists(ruta) else None
+    with _candado:
+        if _indice is None or _indice[0] != marca:
+            _indice = (marca, IndiceSimilares.leer(directorio) if marca is not None else None)
+        return _indice[1]
+
+
+def actualizar_indice_similares(almacen, cartera, huella, directorio=INDICE_DIR):
+    """
+    Updates the persisted index with the batch results of an AlmacenScores
+    (features, predictions) and the key balances of the shared portfolio,
+    tagged with the portfolio fingerprint. Returns the update report.
+    """
+    global _indice
+    posiciones = almacen.posiciones
+    columnas = [c for c in COLUMNAS_SALDO if c in cartera.df.columns]
+    saldos = np.full((len(posiciones), len(COLUMNAS_SALDO)), np.nan, dtype=np.float32)
+    for j, columna in enumerate(COLUMNAS_SALDO):
+        if columna in columnas:
+            saldos[:, j] = cartera.df[columna].to_numpy(dtype=np.float32, na_value=np.nan)[posiciones]
+    indice, reporte = actualizar(obtener_indice(directorio), cartera.ids[posiciones], almacen.features,
+                                 almacen.predicciones, saldos, huella, cartera.huella)
+    indice.guardar(directorio)
+    with _candado:
+        _indice = None
+    return reporte
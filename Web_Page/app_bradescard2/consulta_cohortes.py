@@ -0,0 +1,322 @@
+# consulta_cohortes.py
+# Consultas de cohortes sobre el archivo Parquet de la cartera, sin pasar por el
+# DataFrame en memoria. Una cohorte es una conjunción de predicados (Socio en
+# [...], Producto == ..., Utilizacion > 0.8, Ciclo_atraso_M1 >= 2, ...) y la
+# respuesta es solo el agregado: clientes, saldos, utilización y mezcla de
+# niveles de riesgo, en total y por una columna de agrupación.
+#
+# A partir de la caché de ingesta.py se escribe una sola vez por huella una copia
+# con las columnas de cohorte, ordenada por Socio, Producto y Ciclo_atraso_M1 y
+# en row groups chicos, así que el min/max de cada row group es muy selectivo:
+#   1. los predicados se comparan con las estadísticas de cada row group y se
+#      descartan los que no pueden tener filas de la cohorte;
+#   2. de los restantes se leen solo las columnas usadas, con el filtro empujado
+#      al escaneo de Arrow (memory-mapped);
+#   3. cada lote filtrado se agrega al momento: en memoria solo hay un lote y
+#      sumas parciales por grupo.
+# Sin pyarrow se filtra y agrega el DataFrame compartido con pandas.
+
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from agregados import NIVELES_RIESGO, nivel_de_riesgo
+from ingesta import CACHE_DIR, ruta_cache
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Sin pyarrow se consulta el DataFrame en memoria
+    pa = None
+    ds = None
+    pq = None
+
+COLUMNAS_COHORTE = ['Socio', 'Producto', 'Behavior', 'ESTADO', 'Canal_Pago', 'Saldo_total', 'Saldo_Mes',
+                    'Pago_minimo', 'Limite_credito', 'Utilizacion', 'Score_pago', 'Mob',
+                    'Ciclo_atraso_M1', 'Ciclo_atraso_M2', 'Ciclo_atraso_M3']
+# Orden de la copia de cohortes: agrupa las filas que comparten los filtros más usados
+ORDEN_COHORTE = ['Socio', 'Producto', 'Ciclo_atraso_M1']
+COLUMNAS_AGRUPACION = ['Socio', 'Producto', 'Behavior', 'ESTADO', 'Canal_Pago']
+FILAS_POR_GRUPO = 64_000
+FILAS_POR_LOTE = 256_000
+# Consultas recordadas por motor; repetir una cohorte en un rerun no vuelve a escanear
+MAX_CONSULTAS = 32
+MAX_MOTORES = 2
+OPERADORES = ('==', '!=', '<', '<=', '>', '>=', 'en', 'entre')
+
+Predicado = namedtuple('Predicado', ['columna', 'operador', 'valor'])
+ResultadoCohorte = namedtuple('ResultadoCohorte', ['resumen', 'por_riesgo', 'por_grupo', 'grupos_leidos',
+                                                   'grupos_totales', 'filas_leidas', 'segundos'])
+
+_motores = OrderedDict()
+_candado_motores = threading.Lock()
+
+
+def ruta_cohortes(huella, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f'{huella}.cohortes.parquet')
+
+
+def escribir_cohortes(huella, cache_dir=CACHE_DIR, progreso=None):
+    """
+    Writes the cohort copy of a cached portfolio: the cohort columns only,
+    sorted by ORDEN_COHORTE (nulls last) in row groups of FILAS_POR_GRUPO rows
+    (atomic rename). Returns its path, or None when there is no cache to read.
+    """
+    destino = ruta_cohortes(huella, cache_dir)
+    if os.path.exists(destino):
+        return destino
+    origen = ruta_cache(huella, cache_dir)
+    if pq is None or not os.path.exists(origen):
+        return None
+    columnas = [c for c in COLUMNAS_COHORTE if c in pq.read_schema(origen).names]
+    tabla = pq.read_table(origen, columns=columnas, memory_map=True)
+    if progreso is not None:
+        progreso(1, 3, "Ordenando")
+    claves = [c for c in ORDEN_COHORTE if c in columnas]
+    # lexsort sobre códigos: los categóricos se ordenan por categoría sin materializar texto
+    codigos = [pd.factorize(tabla.column(c).to_pandas(), sort=True)[0] for c in reversed(claves)]
+    codigos = [np.where(c < 0, np.iinfo(np.int64).max, c) for c in codigos]
+    tabla = tabla.take(pa.array(np.lexsort(codigos), type=pa.int64()))
+    if progreso is not None:
+        progreso(2, 3, "Escribiendo")
+    temporal = f'{destino}.{os.getpid()}.tmp'
+    pq.write_table(tabla, temporal, row_group_size=FILAS_POR_GRUPO)
+    os.replace(temporal, destino)
+    return destino
+
+
+def _puede_cumplir(predicado, minimo, maximo, nulos, filas):
+    """False when the min/max statistics of a row group prove no row satisfies predicado."""
+    if nulos is not None and nulos == filas:
+        # Ninguna comparación es verdadera con nulos
+        return False
+    if minimo is None or maximo is None:
+        return True
+    operador, valor = predicado.operador, predicado.valor
+    if operador == '==':
+        return minimo <= valor <= maximo
+    if operador == '!=':
+        return not (minimo == maximo == valor)
+    if operador == '<':
+        return minimo < valor
+    if operador == '<=':
+        return minimo <= valor
+    if operador == '>':
+        return maximo > valor
+    if operador == '>=':
+        return maximo >= valor
+    if operador == 'en':
+        return any(minimo <= v <= maximo for v in valor)
+    return maximo >= valor[0] and minimo <= valor[1]
+
+
+def _expresion(predicados):
+    """Arrow filter expression of the conjunction, pushed down to the scan."""
+    expresion = None
+    for p in predicados:
+        campo = ds.field(p.columna)
+        condicion = {
+            '==': lambda: campo == p.valor, '!=': lambda: campo != p.valor,
+            '<': lambda: campo < p.valor, '<=': lambda: campo <= p.valor,
+            '>': lambda: campo > p.valor, '>=': lambda: campo >= p.valor,
+            'en': lambda: campo.isin(list(p.valor)),
+            'entre': lambda: (campo >= p.valor[0]) & (campo <= p.valor[1]),
+        }[p.operador]()
+        expresion = condicion if expresion is None else expresion & condicion
+    return expresion
+
+
+def _mascara(df, predicados):
+    """Boolean mask of the conjunction over a frame (nulls never match)."""
+    mascara = np.ones(len(df), dtype=bool)
+    for p in predicados:
+        serie = df[p.columna]
+        condicion = {
+            '==': lambda: serie == p.valor, '!=': lambda: serie.notna() & (serie != p.valor),
+            '<': lambda: serie < p.valor, '<=': lambda: serie <= p.valor,
+            '>': lambda: serie > p.valor, '>=': lambda: serie >= p.valor,
+            'en': lambda: serie.isin(p.valor),
+            'entre': lambda: serie.between(p.valor[0], p.valor[1]),
+        }[p.operador]()
+        mascara &= np.asarray(condicion, dtype=bool)
+    return mascara
+
+
+def _parciales(lote, agrupar):
+    """Per (group, risk level) partial sums of one filtered batch."""
+    saldo = lote['Saldo_total'].to_numpy(dtype=np.float64, na_value=np.nan)
+    utilizacion = lote['Utilizacion'].to_numpy(dtype=np.float64, na_value=np.nan)
+    atraso = lote['Ciclo_atraso_M1'].to_numpy(dtype=np.float64, na_value=np.nan)
+    datos = pd.DataFrame({
+        'Nivel_de_Riesgo': nivel_de_riesgo(lote['Score_pago'].to_numpy(dtype=np.float64, na_value=np.nan)),
+        'Clientes': 1,
+        'Saldo_Total': np.nan_to_num(saldo),
+        'Utilizacion_Suma': np.nan_to_num(utilizacion), 'Utilizacion_N': ~np.isnan(utilizacion),
+        'Atraso_Suma': np.nan_to_num(atraso), 'Atraso_N': ~np.isnan(atraso),
+    })
+    claves = ['Nivel_de_Riesgo']
+    if agrupar is not None:
+        datos[agrupar] = lote[agrupar].astype(object).fillna('(sin dato)').to_numpy()
+        claves = [agrupar] + claves
+    return datos.groupby(claves, observed=True).sum()
+
+
+def _promedios(tabla):
+    tabla['Saldo_Promedio'] = tabla['Saldo_Total'] / tabla['Clientes']
+    tabla['Utilizacion_Promedio'] = tabla['Utilizacion_Suma'] / tabla['Utilizacion_N'].where(tabla['Utilizacion_N'] > 0)
+    tabla['Atraso_M1_Promedio'] = tabla['Atraso_Suma'] / tabla['Atraso_N'].where(tabla['Atraso_N'] > 0)
+    return tabla.drop(columns=['Utilizacion_Suma', 'Utilizacion_N', 'Atraso_Suma', 'Atraso_N'])
+
+
+class MotorCohortes:
+    """
+    Cohort queries over the cohort copy of a portfolio (Arrow scan with
+    row-group pruning) or, without pyarrow, over a frame. consultar returns
+    only the aggregated ResultadoCohorte; results are kept per query.
+    """
+    def __init__(self, ruta=None, df=None):
+        self.ruta = ruta
+        self.df = df
+        self._consultas = OrderedDict()
+        self._candado = threading.Lock()
+        if ruta is not None:
+            self.fragmento = next(iter(ds.dataset(ruta, format='parquet').get_fragments()))
+            metadatos = pq.ParquetFile(ruta, memory_map=True).metadata
+            self.columnas = metadatos.schema.to_arrow_schema().names
+            self.estadisticas = [self._estadisticas(metadatos.row_group(i)) for i in range(metadatos.num_row_groups)]
+        else:
+            self.columnas = list(df.columns)
+            self.estadisticas = None
+
+    @staticmethod
+    def _estadisticas(grupo):
+        """(rows, {column: (min, max, nulls)}) of one row group."""
+        columnas = {}
+        for j in range(grupo.num_columns):
+            columna = grupo.column(j)
+            estadistica = columna.statistics
+            if estadistica is None:
+                columnas[columna.path_in_schema] = (None, None, None)
+            elif estadistica.has_min_max:
+                minimo, maximo = estadistica.min, estadistica.max
+                if isinstance(minimo, bytes):
+                    minimo, maximo = minimo.decode('utf-8', 'replace'), maximo.decode('utf-8', 'replace')
+                columnas[columna.path_in_schema] = (minimo, maximo, estadistica.null_count)
+            else:
+                columnas[columna.path_in_schema] = (None, None, estadistica.null_count)
+        return grupo.num_rows, columnas
+
+    def grupos_candidatos(self, predicados):
+        """Row groups whose statistics do not rule out every predicate."""
+        candidatos = []
+        for numero, (filas, columnas) in enumerate(self.estadisticas):
+            try:
+                posible = all(_puede_cumplir(p, *columnas.get(p.columna, (None, None, None)), filas)
+                              for p in predicados)
+            except TypeError:  # Valor de otro tipo que la columna: se lee el row group
+                posible = True
+            if posible:
+                candidatos.append(numero)
+        return candidatos
+
+    def _lotes(self, predicados, columnas, candidatos):
+        """Filtered batches (frames with columnas) of the candidate row groups."""
+        if self.ruta is None:
+            mascara = _mascara(self.df, predicados)
+            for inicio in range(0, len(self.df), FILAS_POR_LOTE):
+                bloque = self.df.iloc[inicio:inicio + FILAS_POR_LOTE]
+                yield bloque.loc[mascara[inicio:inicio + FILAS_POR_LOTE], columnas]
+            return
+        if not candidatos:
+            return
+        fragmento = self.fragmento.subset(row_group_ids=candidatos)
+        for lote in fragmento.to_batches(columns=columnas, filter=_expresion(predicados) if predicados else None,
+                                         batch_size=FILAS_POR_LOTE):
+            if lote.num_rows:
+                yield lote.to_pandas()
+
+    def consultar(self, predicados, agrupar=None):
+        """
+        Aggregated cohort: total metrics, clients and balance per risk level
+        (from Score_pago) and, with agrupar, the same per value of that column
+        with its risk mix. Nulls never satisfy a predicate.
+        """
+        predicados = tuple(Predicado(p.columna, p.operador, tuple(p.valor) if isinstance(p.valor, list) else p.valor)
+                           for p in predicados)
+        clave = (predicados, agrupar)
+        with self._candado:
+            if clave in self._consultas:
+                self._consultas.move_to_end(clave)
+                return self._consultas[clave]
+
+        inicio = time.perf_counter()
+        columnas = sorted({'Saldo_total', 'Utilizacion', 'Score_pago', 'Ciclo_atraso_M1'}
+                          | {p.columna for p in predicados} | ({agrupar} if agrupar else set()))
+        if self.estadisticas is not None:
+            candidatos = self.grupos_candidatos(predicados)
+            leidos, totales = len(candidatos), len(self.estadisticas)
+            filas_leidas = sum(self.estadisticas[i][0] for i in candidatos)
+        else:
+            candidatos = None
+            leidos = totales = 1
+            filas_leidas = len(self.df)
+        parciales = [_parciales(lote, agrupar) for lote in self._lotes(predicados, columnas, candidatos)]
+
+        claves = ([agrupar] if agrupar else []) + ['Nivel_de_Riesgo']
+        if parciales:
+            total = pd.concat(parciales).groupby(level=claves, observed=True).sum()
+        else:
+            total = pd.DataFrame(columns=['Clientes', 'Saldo_Total', 'Utilizacion_Suma', 'Utilizacion_N',
+                                          'Atraso_Suma', 'Atraso_N'],
+                                 index=pd.MultiIndex.from_arrays([[]] * len(claves), names=claves), dtype=np.float64)
+
+        por_riesgo = total.groupby(level='Nivel_de_Riesgo', observed=True).sum()
+        por_riesgo = por_riesgo.reindex([n for n in NIVELES_RIESGO if n in por_riesgo.index])
+        resumen = _promedios(por_riesgo.sum().to_frame().T).iloc[0].to_dict()
+        por_riesgo = _promedios(por_riesgo).reset_index()
+
+        por_grupo = None
+        if agrupar:
+            por_grupo = _promedios(total.groupby(level=agrupar, observed=True).sum())
+            mezcla = total['Clientes'].unstack('Nivel_de_Riesgo', fill_value=0)
+            for nivel in NIVELES_RIESGO:
+                if nivel in mezcla.columns:
+                    por_grupo[f'% {nivel}'] = mezcla[nivel] / por_grupo['Clientes']
+            por_grupo = por_grupo.sort_values('Clientes', ascending=False).reset_index()
+
+        resultado = ResultadoCohorte(resumen, por_riesgo, por_grupo, leidos, totales, filas_leidas,
+                                     time.perf_counter() - inicio)
+        with self._candado:
+            self._consultas[clave] = resultado
+            if len(self._consultas) > MAX_CONSULTAS:
+                self._consultas.popitem(last=False)
+        return resultado
+
+
+def motor_cohortes(huella, df=None, cache_dir=CACHE_DIR):
+    """
+    Shared engine of a portfolio: over the cohort copy when it exists, over the
+    frame df when pyarrow is missing, otherwise None (the copy must be written
+    first with escribir_cohortes).
+    """
+    ruta = ruta_cohortes(huella, cache_dir)
+    with _candado_motores:
+        motor = _motores.get(huella)
+        if motor is None:
+            if pq is not None and os.path.exists(ruta):
+                motor = MotorCohortes(ruta=ruta)
+            elif pq is None and df is not None:
+                columnas = [c for c in COLUMNAS_COHORTE if c in df.columns]
+                motor = MotorCohortes(df=pd.DataFrame({c: df[c] for c in columnas}, columns=columnas, copy=False))
+            else:
+                return None
+            _motores[huella] = motor
+        _motores.move_to_end(huella)
+        while len(_motores) > MAX_MOTORES:
+            _motores.popitem(last=False)
+        return motor
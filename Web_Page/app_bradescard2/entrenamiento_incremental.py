@@ -0,0 +1,172 @@
+# entrenamiento_incremental.py
+# Ajuste del pipeline (Limpieza -> Preprocesamiento -> PCAConY) sin cargar la
+# cartera completa en memoria. El archivo se recorre dos veces por bloques:
+#   1. limpieza, categorías del OneHotEncoder y media/varianza acumuladas del
+#      StandardScaler (partial_fit);
+#   2. covarianza acumulada de las features preprocesadas, de la que salen los
+#      70 componentes del PCA.
+# El resultado es un Pipeline con las mismas clases y pasos que el del notebook,
+# así que reemplaza directamente a fitted_pipeline.pkl.
+#
+# Uso:
+#   python entrenamiento_incremental.py data/COLL_TEC_CONSOLIDADO.txt --salida fitted_pipeline.pkl
+
+import argparse
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, StandardScaler
+from sklearn.pipeline import Pipeline
+from sklearn.utils.extmath import svd_flip
+
+from batch_scoring import leer_por_bloques, memoria_pico_mb
+from pipeline_utils import PCAWithTarget, Preprocesador, columnas_por_tipo, limpieza_sin_categoricas
+from scoring import TARGET_COLUMN, fijar_formato_fechas
+
+
+def bloques_entrenamiento(ruta, chunksize, formatos, test_size=0.2, seed=42):
+    """
+    Cleaned training rows of the file, chunk by chunk. The notebook held out 20%
+    of the rows with train_test_split; here each row is assigned to the test set
+    with a seeded random draw per chunk, so both passes see the same rows.
+    """
+    for numero, bloque in enumerate(leer_por_bloques(ruta, chunksize)):
+        if test_size > 0:
+            rng = np.random.default_rng([seed, numero])
+            bloque = bloque[rng.random(len(bloque)) >= test_size]
+        bloque = fijar_formato_fechas(bloque, formatos)
+        limpio = limpieza_sin_categoricas(bloque)
+        if not limpio.empty:
+            yield limpio
+
+
+def _encoder_con_categorias(categorical_cols, categorias):
+    """
+    OneHotEncoder fitted on a small frame holding every category seen in the
+    stream; with categories='auto' it learns exactly the sorted categories a
+    fit on the full data would.
+    """
+    largo = max((len(categorias[c]) for c in categorical_cols), default=1)
+    marco = pd.DataFrame({
+        c: (sorted(categorias[c]) * largo)[:largo] if categorias[c] else [np.nan] * largo
+        for c in categorical_cols
+    }, columns=categorical_cols)
+    return OneHotEncoder(drop='first', handle_unknown='ignore', sparse_output=False).fit(marco)
+
+
+def ajustar_preprocesador(bloques):
+    """First pass: column roles, OHE categories and streaming scaler statistics."""
+    prep = Preprocesador()
+    categorias = None
+    scaler = StandardScaler()
+    filas = 0
+    for limpio in bloques:
+        if prep.numeric_cols is None:
+            prep.categorical_cols, prep.numeric_cols = columnas_por_tipo(limpio)
+            categorias = {c: set() for c in prep.categorical_cols}
+        for c in prep.categorical_cols:
+            categorias[c].update(limpio[c].dropna().unique())
+        scaler.partial_fit(limpio[prep.numeric_cols])
+        filas += len(limpio)
+
+    if prep.numeric_cols is None:
+        raise ValueError("Ninguna fila sobrevivió a la limpieza; no hay datos para entrenar.")
+    prep.ohe = _encoder_con_categorias(prep.categorical_cols, categorias)
+    prep.scaler = scaler
+    return prep, filas
+
+
+def ajustar_pca(bloques, prep, n_components=70, target_column=TARGET_COLUMN):
+    """
+    Second pass: accumulates the sum and the cross-product matrix of the
+    preprocessed features (d x d, independent of the number of rows) and takes
+    the principal components from the resulting covariance, like PCA with the
+    full solver.
+    """
+    n = 0
+    suma = None
+    productos = None
+    columnas = None
+    for limpio in bloques:
+        X = prep.transform(limpio).drop(columns=[target_column])
+        if columnas is None:
+            columnas = X.columns
+            suma = np.zeros(len(columnas))
+            productos = np.zeros((len(columnas), len(columnas)))
+        X = X.to_numpy(dtype=np.float64)
+        n += len(X)
+        suma += X.sum(axis=0)
+        productos += X.T @ X
+
+    media = suma / n
+    covarianza = (productos - n * np.outer(media, media)) / (n - 1)
+    varianzas, vectores = np.linalg.eigh(covarianza)
+    orden = np.argsort(varianzas)[::-1]
+    varianzas = np.clip(varianzas[orden], 0, None)
+    componentes = vectores[:, orden].T
+    # Misma convención de signos que PCA de sklearn
+    _, componentes = svd_flip(np.zeros((1, len(componentes))), componentes, u_based_decision=False)
+
+    pca_target = PCAWithTarget(target_column=target_column, n_components=n_components)
+    pca = pca_target.pca
+    pca.n_components_ = n_components
+    pca.components_ = componentes[:n_components]
+    pca.explained_variance_ = varianzas[:n_components]
+    pca.explained_variance_ratio_ = varianzas[:n_components] / varianzas.sum()
+    pca.singular_values_ = np.sqrt(varianzas[:n_components] * (n - 1))
+    pca.mean_ = media
+    pca.noise_variance_ = varianzas[n_components:].mean() if len(varianzas) > n_components else 0.0
+    pca.n_samples_ = n
+    pca.n_features_in_ = len(columnas)
+    pca.feature_names_in_ = np.asarray(columnas, dtype=object)
+    return pca_target
+
+
+def entrenar_pipeline(ruta, chunksize=200_000, test_size=0.2, n_components=70, seed=42, verbose=True):
+    """Fits the three pipeline steps out of core and returns the fitted Pipeline."""
+    formatos = {}
+    inicio = time.perf_counter()
+    prep, filas = ajustar_preprocesador(bloques_entrenamiento(ruta, chunksize, formatos, test_size, seed))
+    if verbose:
+        print(f"Pasada 1: {filas:,} filas limpias, {len(prep.numeric_cols)} numéricas, "
+              f"{len(prep.categorical_cols)} categóricas ({time.perf_counter() - inicio:.1f} s)")
+
+    inicio = time.perf_counter()
+    pca_target = ajustar_pca(bloques_entrenamiento(ruta, chunksize, formatos, test_size, seed),
+                             prep, n_components)
+    if verbose:
+        print(f"Pasada 2: {n_components} componentes, varianza explicada "
+              f"{pca_target.pca.explained_variance_ratio_.sum():.1%} ({time.perf_counter() - inicio:.1f} s)")
+
+    limpieza = FunctionTransformer(limpieza_sin_categoricas)
+    limpieza.fit(pd.DataFrame())
+    return Pipeline([
+        ("Limpieza", limpieza),
+        ("Preprocesamiento", prep),
+        ("PCAConY", pca_target),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrenamiento por bloques del pipeline de preprocesamiento.")
+    parser.add_argument('entrada', help="Archivo de la cartera (CSV/TXT delimitado por comas).")
+    parser.add_argument('--salida', default='fitted_pipeline.pkl')
+    parser.add_argument('--chunksize', type=int, default=200_000, help="Filas por bloque.")
+    parser.add_argument('--test-size', type=float, default=0.2,
+                        help="Fracción de filas excluidas del ajuste, como el train_test_split del notebook.")
+    parser.add_argument('--componentes', type=int, default=70)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    pipeline = entrenar_pipeline(args.entrada, args.chunksize, args.test_size, args.componentes, args.seed)
+    joblib.dump(pipeline, args.salida)
+    print(f"Pipeline guardado en {args.salida}")
+    pico = memoria_pico_mb()
+    if pico is not None:
+        print(f"Memoria pico: {pico:,.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,379 @@
+# entrenamiento_modelo.py
+# Entrenamiento reproducible del clasificador con búsqueda de hiperparámetros.
+# Reemplaza el RFECV/RandomizedSearchCV/cross_val_score de los notebooks de
+# Modelos, que reajustaban Preprocesamiento y PCA dentro de cada pliegue y de
+# cada candidato:
+#   - la limpieza se hace una sola vez (es fila por fila);
+#   - Preprocesamiento + PCAConY se ajustan una vez por pliegue y las features
+#     de entrenamiento/validación se guardan en disco (.npy), compartidas por
+#     todos los candidatos y rondas, y reutilizadas en la siguiente corrida;
+#   - la búsqueda es successive halving: todos los candidatos empiezan con pocas
+#     filas y solo el mejor 1/factor de cada ronda pasa a la siguiente con
+#     factor veces más filas;
+#   - las evaluaciones (candidato, pliegue) corren en paralelo con joblib con
+#     un límite de procesos (--workers).
+# El mejor candidato se reentrena con todo el conjunto de entrenamiento sobre un
+# pipeline ajustado con las mismas filas, y se guardan ambos en el formato de
+# fitted_pipeline.pkl y random_forest_model.pkl, junto con un reporte de tiempos,
+# en un directorio nuevo (--directorio) y no sobre los archivos de producción.
+# Solo un bosque aleatorio se guarda como random_forest_model.pkl: el bosque
+# compilado del servicio, de la página y del paquete no acepta otro modelo.
+#
+# Uso:
+#   python entrenamiento_modelo.py data/cartera_con_cluster.csv --objetivo Cluster --workers 8
+#   python entrenamiento_modelo.py data/COLL_TEC_CONSOLIDADO.txt --objetivo Variable_objetivo --familias rf svm
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import get_scorer
+from sklearn.model_selection import ParameterSampler, StratifiedKFold, train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer
+from sklearn.svm import SVC
+
+from batch_scoring import memoria_pico_mb
+from ingesta import huella_archivo, leer_csv
+from pipeline_utils import PCAWithTarget, Preprocesador, limpieza_sin_categoricas
+from scoring import MODEL_PATH, PIPELINE_PATH, TARGET_COLUMN, fijar_formato_fechas
+
+try:
+    from imblearn.combine import SMOTETomek
+except ImportError:  # El balanceo es opcional
+    SMOTETomek = None
+
+CACHE_ENTRENAMIENTO = os.path.join('data', 'cache', 'entrenamiento')
+SALIDA_ENTRENAMIENTO = 'modelo_entrenado'
+VERSION_CACHE = 1
+
+# Espacios de búsqueda de los notebooks (RandomizedSearchCV de RF y SVM)
+ESPACIOS = {
+    'rf': (RandomForestClassifier, {
+        'n_estimators': [100, 200],
+        'max_depth': [None, 20, 30],
+        'min_samples_split': [2, 5],
+        'min_samples_leaf': [1, 2],
+        'max_features': ['sqrt', 'log2'],
+        'class_weight': [None, 'balanced'],
+    }),
+    'svm': (SVC, {
+        'C': [0.1, 1, 10],
+        'kernel': ['linear', 'rbf'],
+        'gamma': ['scale', 'auto', 0.1, 1],
+    }),
+}
+
+
+def nuevo_estimador(familia, parametros, seed):
+    """Unfitted estimator of a family; one thread each, parallelism is across tasks."""
+    clase, _ = ESPACIOS[familia]
+    fijos = {'random_state': seed}
+    if clase is RandomForestClassifier:
+        fijos['n_jobs'] = 1
+    return clase(**fijos, **parametros)
+
+
+def candidatos(familias, n_por_familia, seed):
+    """Random candidates of every family, as [(familia, parametros)]."""
+    resultado = []
+    for familia in familias:
+        _, espacio = ESPACIOS[familia]
+        for parametros in ParameterSampler(espacio, n_iter=n_por_familia, random_state=seed):
+            resultado.append((familia, parametros))
+    # ParameterSampler sin reemplazo puede repetir la misma combinación entre llamadas
+    unicos = {json.dumps([f, p], sort_keys=True, default=str): (f, p) for f, p in resultado}
+    return list(unicos.values())
+
+
+def preparar_datos(ruta, objetivo, test_size, seed):
+    """
+    Cleaned rows and labels, split into training and holdout sets (stratified).
+    With objetivo=Variable_objetivo the column stays in the features as the
+    constant 0 the scoring path adds; any other objetivo column is removed
+    before the cleaning step and Variable_objetivo is kept as in the notebook.
+    """
+    df = fijar_formato_fechas(leer_csv(ruta), {})
+    if objetivo not in df.columns:
+        raise ValueError(f"El archivo no tiene la columna objetivo '{objetivo}'.")
+    etiquetas = df[objetivo] if objetivo == TARGET_COLUMN else df.pop(objetivo)
+    if TARGET_COLUMN not in df.columns:
+        df[TARGET_COLUMN] = 0
+
+    limpio = limpieza_sin_categoricas(df)
+    y = etiquetas.loc[limpio.index]
+    validas = y.notna().to_numpy()
+    limpio, y = limpio[validas], y[validas].to_numpy()
+    if y.dtype == object:  # Las etiquetas se guardan en .npy sin pickle
+        y = y.astype(str)
+    if objetivo == TARGET_COLUMN:
+        limpio[TARGET_COLUMN] = 0
+
+    posiciones = np.arange(len(limpio))
+    entrenamiento, prueba = train_test_split(posiciones, test_size=test_size, stratify=y, random_state=seed)
+    return limpio, y, np.sort(entrenamiento), np.sort(prueba)
+
+
+def _ajustar_transformacion(X, n_components):
+    prep = Preprocesador().fit(X)
+    pca_target = PCAWithTarget(n_components=n_components).fit(prep.transform(X))
+    return prep, pca_target
+
+
+def _transformar(prep, pca_target, X):
+    return pca_target.transform(prep.transform(X))
+
+
+class CacheTransformaciones:
+    """
+    Fitted Preprocesamiento + PCAConY features of every fold, on disk. Each
+    fold is a directory with the training/validation features and labels as
+    .npy files (memory-mapped by the evaluation workers), the column names and
+    a fixed row permutation used to draw the nested halving budgets. The key
+    covers the file content and every option that changes the features.
+    """
+    def __init__(self, directorio, huella_datos, objetivo, test_size, n_pliegues, n_components, seed):
+        clave = json.dumps([VERSION_CACHE, huella_datos, objetivo, test_size, n_pliegues, n_components, seed])
+        self.directorio = os.path.join(directorio, hashlib.blake2b(clave.encode(), digest_size=12).hexdigest())
+
+    def ruta(self, pliegue):
+        return os.path.join(self.directorio, f'pliegue_{pliegue}')
+
+    def existe(self, pliegue):
+        return os.path.exists(os.path.join(self.ruta(pliegue), 'columnas.json'))
+
+    def guardar(self, pliegue, Z_entrenamiento, y_entrenamiento, Z_validacion, y_validacion, columnas, seed):
+        """Writes the fold into a temporary directory and renames it (atomic)."""
+        destino = self.ruta(pliegue)
+        temporal = f'{destino}.{os.getpid()}.tmp'
+        os.makedirs(temporal, exist_ok=True)
+        np.save(os.path.join(temporal, 'Z_entrenamiento.npy'), Z_entrenamiento, allow_pickle=False)
+        np.save(os.path.join(temporal, 'y_entrenamiento.npy'), y_entrenamiento, allow_pickle=False)
+        np.save(os.path.join(temporal, 'Z_validacion.npy'), Z_validacion, allow_pickle=False)
+        np.save(os.path.join(temporal, 'y_validacion.npy'), y_validacion, allow_pickle=False)
+        permutacion = np.random.default_rng([seed, len(y_entrenamiento)]).permutation(len(y_entrenamiento))
+        np.save(os.path.join(temporal, 'permutacion.npy'), permutacion, allow_pickle=False)
+        with open(os.path.join(temporal, 'columnas.json'), 'w', encoding='utf-8') as f:
+            json.dump(list(map(str, columnas)), f)
+        if os.path.exists(destino):  # Otro proceso terminó primero
+            shutil.rmtree(temporal, ignore_errors=True)
+            return
+        os.replace(temporal, destino)
+
+
+def _preparar_pliegue(cache, pliegue, X, y, entrenamiento, validacion, n_components, seed):
+    """Fits and stores the transform of one fold (skipped when cached). Returns its seconds."""
+    if cache.existe(pliegue):
+        return pliegue, 0.0, True
+    inicio = time.perf_counter()
+    prep, pca_target = _ajustar_transformacion(X.iloc[entrenamiento], n_components)
+    Z_entrenamiento = _transformar(prep, pca_target, X.iloc[entrenamiento])
+    Z_validacion = _transformar(prep, pca_target, X.iloc[validacion])
+    cache.guardar(pliegue, Z_entrenamiento.to_numpy(dtype=np.float64), y[entrenamiento],
+                  Z_validacion.to_numpy(dtype=np.float64), y[validacion], Z_entrenamiento.columns, seed)
+    return pliegue, time.perf_counter() - inicio, False
+
+
+def _evaluar(ruta_pliegue, familia, parametros, filas, metrica, seed, balancear):
+    """Fits one candidate on the first filas rows of the fold permutation and scores it."""
+    Z = np.load(os.path.join(ruta_pliegue, 'Z_entrenamiento.npy'), mmap_mode='r')
+    y = np.load(os.path.join(ruta_pliegue, 'y_entrenamiento.npy'))
+    permutacion = np.load(os.path.join(ruta_pliegue, 'permutacion.npy'))
+    seleccion = np.sort(permutacion[:filas])
+    Z_ajuste, y_ajuste = np.asarray(Z[seleccion]), y[seleccion]
+    if balancear:
+        Z_ajuste, y_ajuste = SMOTETomek(random_state=seed).fit_resample(Z_ajuste, y_ajuste)
+
+    modelo = nuevo_estimador(familia, parametros, seed)
+    inicio = time.perf_counter()
+    modelo.fit(Z_ajuste, y_ajuste)
+    ajuste = time.perf_counter() - inicio
+
+    Z_validacion = np.load(os.path.join(ruta_pliegue, 'Z_validacion.npy'), mmap_mode='r')
+    y_validacion = np.load(os.path.join(ruta_pliegue, 'y_validacion.npy'))
+    inicio = time.perf_counter()
+    puntaje = get_scorer(metrica)(modelo, np.asarray(Z_validacion), y_validacion)
+    return {'puntaje': float(puntaje), 'segundos_ajuste': ajuste, 'segundos_evaluacion': time.perf_counter() - inicio}
+
+
+def successive_halving(cache, pliegues, lista_candidatos, filas_minimas, factor, metrica, seed,
+                       balancear=False, n_jobs=1, verbose=True):
+    """
+    Successive halving over training-row budgets. Returns the index of the
+    best candidate and one record per (candidate, round) with its fold scores
+    and timings.
+    """
+    filas_maximas = min(len(np.load(os.path.join(cache.ruta(p), 'y_entrenamiento.npy'), mmap_mode='r'))
+                        for p in pliegues)
+    vivos = list(range(len(lista_candidatos)))
+    registros = []
+    ronda = 0
+    with Parallel(n_jobs=n_jobs) as paralelo:
+        while True:
+            filas = int(min(filas_minimas * factor**ronda, filas_maximas))
+            inicio = time.perf_counter()
+            tareas = [(c, p) for c in vivos for p in pliegues]
+            resultados = paralelo(
+                delayed(_evaluar)(cache.ruta(p), *lista_candidatos[c], filas, metrica, seed, balancear)
+                for c, p in tareas
+            )
+            por_candidato = {c: [] for c in vivos}
+            for (c, _), resultado in zip(tareas, resultados):
+                por_candidato[c].append(resultado)
+
+            puntajes_ronda = {}
+            for c, medidas in por_candidato.items():
+                familia, parametros = lista_candidatos[c]
+                puntajes = [m['puntaje'] for m in medidas]
+                puntajes_ronda[c] = float(np.mean(puntajes))
+                registros.append({
+                    'candidato': c, 'familia': familia, 'parametros': parametros, 'ronda': ronda,
+                    'filas': filas, 'puntaje_medio': puntajes_ronda[c], 'puntajes': puntajes,
+                    'segundos_ajuste': sum(m['segundos_ajuste'] for m in medidas),
+                    'segundos_evaluacion': sum(m['segundos_evaluacion'] for m in medidas),
+                })
+            if verbose:
+                mejor = max(puntajes_ronda, key=puntajes_ronda.get)
+                print(f"Ronda {ronda}: {len(vivos)} candidatos x {len(pliegues)} pliegues con {filas:,} filas "
+                      f"({time.perf_counter() - inicio:.1f} s); mejor {metrica} {puntajes_ronda[mejor]:.4f}")
+
+            if len(vivos) == 1 or filas >= filas_maximas:
+                return max(puntajes_ronda, key=puntajes_ronda.get), registros
+            vivos = sorted(vivos, key=puntajes_ronda.get, reverse=True)[:max(1, len(vivos) // factor)]
+            ronda += 1
+
+
+def entrenar_final(X, y, entrenamiento, prueba, familia, parametros, n_components, metrica, seed, balancear):
+    """
+    Fits the pipeline and the chosen candidate on the whole training set and
+    scores the holdout. The pipeline has the same steps as fitted_pipeline.pkl
+    and the model is fitted on the named PCA frame, so both load through
+    scoring.cargar_artefactos and paquete_modelo.
+    """
+    prep, pca_target = _ajustar_transformacion(X.iloc[entrenamiento], n_components)
+    limpieza = FunctionTransformer(limpieza_sin_categoricas)
+    limpieza.fit(pd.DataFrame())
+    pipeline = Pipeline([
+        ("Limpieza", limpieza),
+        ("Preprocesamiento", prep),
+        ("PCAConY", pca_target),
+    ])
+
+    Z = _transformar(prep, pca_target, X.iloc[entrenamiento])
+    y_ajuste = y[entrenamiento]
+    if balancear:
+        Z, y_ajuste = SMOTETomek(random_state=seed).fit_resample(Z, y_ajuste)
+    modelo = nuevo_estimador(familia, parametros, seed)
+    if isinstance(modelo, RandomForestClassifier):
+        modelo.set_params(n_jobs=-1)
+    inicio = time.perf_counter()
+    modelo.fit(Z, y_ajuste)
+    segundos = time.perf_counter() - inicio
+
+    puntaje = get_scorer(metrica)(modelo, _transformar(prep, pca_target, X.iloc[prueba]), y[prueba])
+    return pipeline, modelo, float(puntaje), segundos
+
+
+def rutas_salida(directorio, salida, salida_pipeline, modelo):
+    """
+    Paths of the fitted model and pipeline: salida and salida_pipeline when
+    given, otherwise the production file names inside directorio. A model that
+    is not a random forest is never written as random_forest_model.pkl, since
+    every consumer compiles that file with compilar_bosque; it goes to
+    modelo_<clase>.pkl in the same directory instead.
+    """
+    salida = salida or os.path.join(directorio, os.path.basename(MODEL_PATH))
+    salida_pipeline = salida_pipeline or os.path.join(directorio, os.path.basename(PIPELINE_PATH))
+    if not isinstance(modelo, RandomForestClassifier) and os.path.basename(salida) == os.path.basename(MODEL_PATH):
+        salida = os.path.join(os.path.dirname(salida), f'modelo_{type(modelo).__name__.lower()}.pkl')
+        print(f"Aviso: el mejor modelo no es un bosque aleatorio; se guarda en {salida} y no se puede "
+              "empaquetar ni servir con el bosque compilado.")
+    return salida, salida_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrenamiento del modelo con successive halving y caché por pliegue.")
+    parser.add_argument('entrada', help="Archivo de la cartera con la columna objetivo.")
+    parser.add_argument('--objetivo', default='Cluster', help="Columna a predecir.")
+    parser.add_argument('--familias', nargs='+', default=['rf'], choices=sorted(ESPACIOS))
+    parser.add_argument('--candidatos', type=int, default=20, help="Candidatos aleatorios por familia.")
+    parser.add_argument('--pliegues', type=int, default=5)
+    parser.add_argument('--filas-minimas', type=int, default=5_000, help="Filas por pliegue en la primera ronda.")
+    parser.add_argument('--factor', type=int, default=3, help="Factor de eliminación y de crecimiento de filas.")
+    parser.add_argument('--metrica', default='f1_weighted', help="Scorer de scikit-learn.")
+    parser.add_argument('--balanceo', action='store_true', help="SMOTETomek sobre las filas de ajuste.")
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--componentes', type=int, default=70)
+    parser.add_argument('--workers', type=int, default=0, help="Procesos en paralelo (0 = todos los núcleos).")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cache', default=CACHE_ENTRENAMIENTO)
+    parser.add_argument('--directorio', default=SALIDA_ENTRENAMIENTO,
+                        help="Directorio de salida del modelo, del pipeline y del reporte.")
+    parser.add_argument('--salida', default=None, help="Archivo del modelo (por defecto en --directorio).")
+    parser.add_argument('--salida-pipeline', default=None, help="Archivo del pipeline (por defecto en --directorio).")
+    parser.add_argument('--reporte', default=None, help="Reporte JSON (por defecto en --directorio).")
+    args = parser.parse_args()
+
+    if args.balanceo and SMOTETomek is None:
+        parser.error("--balanceo requiere imbalanced-learn (pip install imbalanced-learn).")
+    n_jobs = args.workers or -1
+
+    inicio = time.perf_counter()
+    X, y, entrenamiento, prueba = preparar_datos(args.entrada, args.objetivo, args.test_size, args.seed)
+    print(f"{len(entrenamiento):,} filas de entrenamiento y {len(prueba):,} de prueba "
+          f"({time.perf_counter() - inicio:.1f} s)")
+
+    cache = CacheTransformaciones(args.cache, huella_archivo(args.entrada), args.objetivo, args.test_size,
+                                  args.pliegues, args.componentes, args.seed)
+    divisiones = StratifiedKFold(args.pliegues, shuffle=True, random_state=args.seed).split(
+        entrenamiento, y[entrenamiento])
+    transformaciones = Parallel(n_jobs=min(args.pliegues, os.cpu_count() if n_jobs < 0 else n_jobs))(
+        delayed(_preparar_pliegue)(cache, p, X, y, entrenamiento[a], entrenamiento[v], args.componentes, args.seed)
+        for p, (a, v) in enumerate(divisiones)
+    )
+    pliegues = [p for p, _, _ in transformaciones]
+    print("Transformaciones por pliegue: " + ", ".join(
+        f"{p}: {'caché' if en_cache else f'{s:.1f} s'}" for p, s, en_cache in transformaciones))
+
+    lista_candidatos = candidatos(args.familias, args.candidatos, args.seed)
+    mejor, registros = successive_halving(cache, pliegues, lista_candidatos, args.filas_minimas, args.factor,
+                                          args.metrica, args.seed, args.balanceo, n_jobs)
+    familia, parametros = lista_candidatos[mejor]
+    print(f"Mejor candidato: {familia} {parametros}")
+
+    pipeline, modelo, puntaje, segundos = entrenar_final(X, y, entrenamiento, prueba, familia, parametros,
+                                                         args.componentes, args.metrica, args.seed, args.balanceo)
+    salida, salida_pipeline = rutas_salida(args.directorio, args.salida, args.salida_pipeline, modelo)
+    reporte_path = args.reporte or os.path.join(args.directorio, 'reporte_entrenamiento.json')
+    for ruta in (salida, salida_pipeline, reporte_path):
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    joblib.dump(pipeline, salida_pipeline)
+    joblib.dump(modelo, salida)
+    print(f"{args.metrica} en prueba: {puntaje:.4f}. Modelo en {salida}, pipeline en {salida_pipeline}")
+
+    reporte = {
+        'entrada': args.entrada, 'objetivo': args.objetivo, 'metrica': args.metrica,
+        'mejor': {'familia': familia, 'parametros': parametros, 'puntaje_prueba': puntaje,
+                  'segundos_ajuste_final': segundos},
+        'transformaciones': [{'pliegue': p, 'segundos': s, 'cache': en_cache} for p, s, en_cache in transformaciones],
+        'candidatos': registros,
+        'segundos_totales': time.perf_counter() - inicio,
+    }
+    with open(reporte_path, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, ensure_ascii=False, indent=2, default=str)
+    print(f"Reporte de tiempos por candidato en {reporte_path} ({reporte['segundos_totales']:.1f} s en total)")
+    pico = memoria_pico_mb()
+    if pico is not None:
+        print(f"Memoria pico: {pico:,.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+# ingesta.py
+# Carga de la cartera con caché columnar. Cada archivo se identifica por el hash
+# de su contenido y se convierte una sola vez a Parquet con un esquema explícito;
+# las cargas siguientes leen el Parquet con memory mapping en lugar de volver a
+# parsear el CSV en cada rerun de Streamlit.
+#
+# Por defecto la cartera se guarda con un esquema compacto (compactar): texto de
+# baja cardinalidad como categórico, números en el tipo más pequeño que no
+# pierde información y fechas como días enteros desde FECHA_BASE.
+# limpieza_sin_categoricas devuelve exactamente lo mismo con ambos esquemas.
+
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from pipeline_utils import FECHA_BASE, FECHAS_DIA_PRIMERO, es_fecha_compacta, fechas_desde_dias
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Sin pyarrow se lee siempre el CSV
+    pa = None
+    pq = None
+
+CACHE_DIR = os.path.join('data', 'cache')
+CACHE_MAX_BYTES = 4 * 1024**3
+VERSION_ESQUEMA = 2
+_BLOQUE_HASH = 8 * 1024**2
+
+# Columnas de texto que se leen siempre como texto; un bloque sin valores en
+# alguna de ellas se inferiría como float y rompería el OneHotEncoder.
+COLUMNAS_TEXTO = (
+    ['Socio', 'Producto', 'Canal_Pago', 'Genero', 'ESTADO', 'Behavior']
+    + [f'Canal_Pago_M{i}' for i in range(1, 7)]
+    + [f'Behavior_M{i}' for i in range(1, 7)]
+)
+
+# Texto con a lo sumo esta fracción de valores distintos se guarda como categórico
+MAX_FRACCION_CATEGORIAS = 0.5
+
+# Sin esquema compacto las fechas se guardan como texto sin parsear:
+# limpieza_sin_categoricas infiere el formato igual que si leyera el CSV.
+_PATRON_FECHA = re.compile(r'^(Fecha|Prox)')
+
+
+def _tipo_arrow(columna, serie):
+    """Arrow type of a known column in the cache schema, or None for unknown columns."""
+    if isinstance(serie.dtype, pd.CategoricalDtype) or es_fecha_compacta(serie):
+        # Diccionario de texto / int32 con nulos: se infieren de pandas
+        return None
+    if columna in COLUMNAS_TEXTO or _PATRON_FECHA.match(columna):
+        return pa.string()
+    if serie.dtype.kind in 'iuf':
+        # Saldos, pagos, utilización, ciclos de atraso, score; con el ancho reducido
+        # por compactar o int64/float64 como los infiere read_csv
+        return pa.from_numpy_dtype(serie.dtype)
+    return None
+
+
+def esquema_cartera(df):
+    """
+    Explicit Arrow schema for a portfolio frame. Known columns get a fixed type;
+    any other column keeps the type Arrow infers from pandas.
+    """
+    campos = []
+    for columna in df.columns:
+        tipo = _tipo_arrow(columna, df[columna])
+        if tipo is None:
+            tipo = pa.Schema.from_pandas(df[[columna]], preserve_index=False).field(columna).type
+        campos.append(pa.field(columna, tipo))
+    return pa.schema(campos, metadata={'version_esquema': str(VERSION_ESQUEMA)})
+
+
+def huella_archivo(fuente):
+    """
+    Content hash (blake2b) of a path or a file-like object such as a Streamlit
+    UploadedFile. The file is read in blocks so it is never duplicated in memory.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'v{VERSION_ESQUEMA}'.encode())
+    if isinstance(fuente, (str, os.PathLike)):
+        with open(fuente, 'rb') as f:
+            for bloque in iter(lambda: f.read(_BLOQUE_HASH), b''):
+                h.update(bloque)
+    else:
+        fuente.seek(0)
+        for bloque in iter(lambda: fuente.read(_BLOQUE_HASH), b''):
+            h.update(bloque)
+        fuente.seek(0)
+    return h.hexdigest()
+
+
+def leer_csv(fuente):
+    """Reads the portfolio CSV with the same options used everywhere in the app."""
+    if not isinstance(fuente, (str, os.PathLike)):
+        fuente.seek(0)
+    return pd.read_csv(fuente, delimiter=",", encoding="latin-1", low_memory=False,
+                       dtype={col: str for col in COLUMNAS_TEXTO})
+
+
+def _dias_compactos(serie):
+    """
+    Int32 days from FECHA_BASE of a text date column, parsed with the same call
+    limpieza_sin_categoricas uses. None when some date has a time of day, which
+    a day offset would lose.
+    """
+    fechas = pd.to_datetime(serie, dayfirst=FECHAS_DIA_PRIMERO, errors='coerce')
+    fechas = fechas.to_numpy().astype('datetime64[ns]')
+    nulos = np.isnat(fechas)
+    dias = fechas.astype('datetime64[D]')
+    if (dias[~nulos] != fechas[~nulos]).any():
+        return None
+    dias = (dias - np.datetime64(FECHA_BASE.date(), 'D')).astype(np.int64)
+    dias[nulos] = 0
+    return pd.arrays.IntegerArray(dias.astype(np.int32), nulos)
+
+
+def _texto_compacto(serie):
+    """Categorical when the column has few distinct values, the column unchanged otherwise."""
+    validos = serie.count()
+    if validos and serie.nunique() <= MAX_FRACCION_CATEGORIAS * validos:
+        return serie.astype('category')
+    return serie
+
+
+def _numero_compacto(serie):
+    """Smallest integer type for integers; float32 for floats that it represents exactly."""
+    if serie.dtype.kind in 'iu':
+        return pd.to_numeric(serie, downcast='integer')
+    if serie.dtype == np.float64:
+        reducido = serie.to_numpy().astype(np.float32)
+        if np.array_equal(reducido, serie.to_numpy(), equal_nan=True):
+            return pd.Series(reducido, index=serie.index, name=serie.name)
+    return serie
+
+
+def compactar(df):
+    """
+    Compact schema of a portfolio read with leer_csv: low-cardinality text as
+    category, numbers downcast without loss and Fecha_*/Prox* dates as Int32 days
+    from FECHA_BASE. The deep memory of each original column is kept in
+    attrs['memoria_original'] for reporte_memoria.
+    """
+    memoria = df.memory_usage(deep=True, index=False)
+    columnas = {}
+    for columna in df.columns:
+        serie = df[columna]
+        if serie.dtype == object and _PATRON_FECHA.match(columna):
+            dias = _dias_compactos(serie)
+            columnas[columna] = serie if dias is None else pd.Series(dias, index=df.index, name=columna)
+        elif serie.dtype == object:
+            columnas[columna] = _texto_compacto(serie)
+        elif serie.dtype.kind in 'iuf':
+            columnas[columna] = _numero_compacto(serie)
+        else:
+            columnas[columna] = serie
+    compacto = pd.DataFrame(columnas, index=df.index, columns=df.columns)
+    compacto.attrs['memoria_original'] = {c: int(b) for c, b in memoria.items()}
+    return compacto
+
+
+def reporte_memoria(df):
+    """
+    Per-column memory of a frame (deep, MB), largest first. When the frame comes
+    from compactar, the memory of the same column with the default dtypes and the
+    reduction factor are included.
+    """
+    memoria = df.memory_usage(deep=True, index=False)
+    reporte = pd.DataFrame({
+        'Columna': memoria.index,
+        'Tipo': df.dtypes.astype(str).to_numpy(),
+        'MB': memoria.to_numpy() / 1024**2,
+    })
+    original = df.attrs.get('memoria_original')
+    if original:
+        reporte['MB_original'] = reporte['Columna'].map(original) / 1024**2
+        reporte['Reduccion'] = reporte['MB_original'] / reporte['MB'].where(reporte['MB'] > 0)
+    return reporte.sort_values('MB', ascending=False, ignore_index=True)
+
+
+def vista_legible(df):
+    """Copy of a (small) frame with compact date columns shown as dates again."""
+    vista = df.copy()
+    for columna in vista.columns:
+        if es_fecha_compacta(vista[columna]):
+            vista[columna] = fechas_desde_dias(vista[columna])
+    return vista
+
+
+def ruta_cache(huella, cache_dir=CACHE_DIR, compacto=True):
+    sufijo = '.compacto' if compacto else ''
+    return os.path.join(cache_dir, f'{huella}{sufijo}.parquet')
+
+
+def escribir_cache(df, ruta):
+    """Writes the frame to Parquet with the explicit schema (atomic rename)."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tabla = pa.Table.from_pandas(df, schema=esquema_cartera(df), preserve_index=False)
+    if 'memoria_original' in df.attrs:
+        metadatos = dict(tabla.schema.metadata or {})
+        metadatos[b'memoria_original'] = json.dumps(df.attrs['memoria_original']).encode()
+        tabla = tabla.replace_schema_metadata(metadatos)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    pq.write_table(tabla, temporal, row_group_size=256_000)
+    os.replace(temporal, ruta)
+
+
+def leer_cache(ruta):
+    """Memory-mapped read of a cached portfolio."""
+    tabla = pq.read_table(ruta, memory_map=True)
+    # Marca el uso para la política de desalojo (menos reciente primero)
+    os.utime(ruta)
+    memoria = (tabla.schema.metadata or {}).get(b'memoria_original')
+    df = tabla.to_pandas(split_blocks=True, self_destruct=True)
+    if memoria is not None:
+        df.attrs['memoria_original'] = json.loads(memoria)
+    return df
+
+
+def desalojar(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, conservar=()):
+    """
+    Removes the least recently used entries until the cache directory fits in
+    max_bytes. Entries listed in conservar are never removed.
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    entradas = []
+    for nombre in os.listdir(cache_dir):
+        if not nombre.endswith('.parquet'):
+            continue
+        ruta = os.path.join(cache_dir, nombre)
+        estado = os.stat(ruta)
+        entradas.append((estado.st_mtime, estado.st_size, ruta))
+
+    total = sum(tamano for _, tamano, _ in entradas)
+    eliminadas = []
+    for _, tamano, ruta in sorted(entradas):
+        if total <= max_bytes:
+            break
+        if ruta in conservar:
+            continue
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:  # Otro proceso ya la eliminó
+            pass
+        total -= tamano
+        eliminadas.append(ruta)
+    return eliminadas
+
+
+def cargar_cartera(fuente, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, huella=None, compacto=True):
+    """
+    Loads a portfolio from a path or an uploaded file. Returns (df, huella), where
+    huella is the content fingerprint of the source. The first load of a given
+    content parses the CSV and stores it in the cache; later loads read the
+    cached Parquet file. With compacto the frame uses the compact schema.
+    """
+    if huella is None:
+        huella = huella_archivo(fuente)
+    if pq is None:
+        df = leer_csv(fuente)
+        return (compactar(df) if compacto else df), huella
+
+    ruta = ruta_cache(huella, cache_dir, compacto)
+    if os.path.exists(ruta):
+        try:
+            return leer_cache(ruta), huella
+        except (OSError, pa.ArrowInvalid):
+            # Entrada corrupta o incompleta: se vuelve a generar
+            os.remove(ruta)
+
+    df = leer_csv(fuente)
+    if compacto:
+        df = compactar(df)
+    escribir_cache(df, ruta)
+    desalojar(cache_dir, max_bytes, conservar=(ruta,))
+    return df, huella
@@ -0,0 +1,205 @@
+# instrumentacion.py
+# Perfil por etapa del scoring: tiempo, memoria pico, filas y columnas de
+# entrada/salida de Limpieza, Preprocesamiento, PCAConY y la predicción, y las
+# filas que descarta cada filtro de limpieza_sin_categoricas. Solo mide dentro
+# de un bloque `with perfilar():`; fuera de él cada punto de medición es una
+# lectura de un ContextVar y un objeto nulo compartido.
+#
+# Cada etapa y cada filtro se emite como una línea JSON en el logger
+# 'bradescard.perfil' (batch_scoring.py --perfil las escribe a stderr o a un archivo).
+#
+# tracemalloc es global al proceso y los perfiles son por ContextVar: con dos
+# perfiles con memoria activos a la vez (p. ej. dos trabajos de trabajos.py) el
+# pico de uno incluiría las asignaciones del otro. La traza se comparte con un
+# contador de sesiones y la memoria de una etapa solo se informa si su perfil fue
+# el único activo durante toda la etapa; si no, queda como no disponible (None).
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger('bradescard.perfil')
+
+_perfil_activo = contextvars.ContextVar('perfil_activo', default=None)
+
+# Sesiones con memoria activas; la traza la detiene la última si la inició este módulo
+_candado_traza = threading.Lock()
+_sesiones_memoria = 0
+_traza_propia = False
+# Aumenta con cada sesión nueva: una etapa que ve otro valor al terminar compartió la traza
+_generacion = 0
+
+
+def _forma(datos):
+    """(rows, columns) of a frame or array; None for anything else."""
+    forma = getattr(datos, 'shape', None)
+    if forma is None:
+        return None, None
+    return int(forma[0]), (int(forma[1]) if len(forma) > 1 else 1)
+
+
+class _MedicionNula:
+    """Shared no-op stand-in for a stage when profiling is disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def salida(self, datos):
+        return datos
+
+
+_NULA = _MedicionNula()
+
+
+class _Medicion:
+    """One timed stage of an active PerfilPipeline."""
+    def __init__(self, perfil, nombre, entrada):
+        self.perfil = perfil
+        self.registro = {'etapa': nombre}
+        self.registro['filas_entrada'], self.registro['columnas_entrada'] = _forma(entrada)
+
+    def __enter__(self):
+        self._generacion = None
+        if self.perfil.memoria:
+            with _candado_traza:
+                if _sesiones_memoria == 1 and tracemalloc.is_tracing():
+                    tracemalloc.reset_peak()
+                    self._memoria_inicial = tracemalloc.get_traced_memory()[0]
+                    self._generacion = _generacion
+        self._inicio = time.perf_counter()
+        return self
+
+    def salida(self, datos):
+        """Records the output shape of the stage and returns datos unchanged."""
+        self.registro['filas_salida'], self.registro['columnas_salida'] = _forma(datos)
+        return datos
+
+    def __exit__(self, tipo, *exc):
+        self.registro['segundos'] = time.perf_counter() - self._inicio
+        if self.perfil.memoria:
+            self.registro['memoria_pico_mb'] = self._memoria_pico_mb()
+        if tipo is not None:
+            self.registro['error'] = tipo.__name__
+        self.perfil.agregar('etapa', self.registro)
+        return False
+
+    def _memoria_pico_mb(self):
+        """Peak of the stage over its start, or None when another profile shared the trace."""
+        with _candado_traza:
+            if self._generacion is None or self._generacion != _generacion or not tracemalloc.is_tracing():
+                return None
+            pico = tracemalloc.get_traced_memory()[1]
+        return (pico - self._memoria_inicial) / 1024**2
+
+
+class PerfilPipeline:
+    """
+    Stage and filter records of one profiled run. etapas and filtros are lists
+    of plain dicts, ready for json.dumps or pd.DataFrame. With memoria=True the
+    peak memory of each stage is measured with tracemalloc (NumPy buffers
+    included), which slows every thread of the process down while it is
+    active; memoria_pico_mb is None for stages that overlapped another
+    profile with memory.
+    """
+    def __init__(self, nombre, memoria=True, emitir=True):
+        self.nombre = nombre
+        self.memoria = memoria
+        self.emitir = emitir
+        self.proceso = os.getpid()
+        self.etapas = []
+        self.filtros = []
+
+    def agregar(self, tipo, registro):
+        (self.etapas if tipo == 'etapa' else self.filtros).append(registro)
+        if self.emitir and logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'perfil': self.nombre, 'tipo': tipo, 'proceso': self.proceso, **registro},
+                                   ensure_ascii=False, default=str))
+
+    def combinar(self, etapas, filtros, **etiquetas):
+        """Adds records measured elsewhere (e.g. a worker process) with extra labels."""
+        for registro in etapas:
+            self.agregar('etapa', {**registro, **etiquetas})
+        for registro in filtros:
+            self.agregar('filtro', {**registro, **etiquetas})
+
+    def filas_descartadas(self):
+        """Rows dropped by each filter, summed over the run."""
+        totales = {}
+        for registro in self.filtros:
+            totales[registro['filtro']] = totales.get(registro['filtro'], 0) + registro['filas_descartadas']
+        return totales
+
+
+@contextmanager
+def perfilar(nombre='scoring', memoria=True, emitir=True):
+    """
+    Profiles every instrumented stage run inside the block (same thread or
+    task) and yields the PerfilPipeline. With memoria, tracemalloc is shared by
+    every active block: the first one starts it (unless it was already
+    tracing) and the last one stops it.
+    """
+    global _sesiones_memoria, _traza_propia, _generacion
+    perfil = PerfilPipeline(nombre, memoria, emitir)
+    if memoria:
+        with _candado_traza:
+            if _sesiones_memoria == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _traza_propia = True
+            _sesiones_memoria += 1
+            _generacion += 1
+    token = _perfil_activo.set(perfil)
+    try:
+        yield perfil
+    finally:
+        _perfil_activo.reset(token)
+        if memoria:
+            with _candado_traza:
+                _sesiones_memoria -= 1
+                if _sesiones_memoria == 0 and _traza_propia:
+                    tracemalloc.stop()
+                    _traza_propia = False
+
+
+def perfil_activo():
+    """The PerfilPipeline of the current block, or None when profiling is off."""
+    return _perfil_activo.get()
+
+
+def etapa(nombre, entrada=None):
+    """
+    Context manager timing one stage. Call .salida(datos) on it to record the
+    output shape. Returns a shared no-op object when profiling is off.
+    """
+    perfil = _perfil_activo.get()
+    if perfil is None:
+        return _NULA
+    return _Medicion(perfil, nombre, entrada)
+
+
+def registrar_filtro(nombre, filas_entrada, filas_salida, detalle=None):
+    """Records the rows a filter keeps and drops (no-op when profiling is off)."""
+    perfil = _perfil_activo.get()
+    if perfil is None:
+        return
+    registro = {'filtro': nombre, 'filas_entrada': int(filas_entrada), 'filas_salida': int(filas_salida),
+                'filas_descartadas': int(filas_entrada) - int(filas_salida)}
+    if detalle:
+        registro['detalle'] = detalle
+    perfil.agregar('filtro', registro)
+
+
+def configurar_log(destino=None):
+    """Sends the JSON profile records to stderr, or appended to the file destino."""
+    manejador = logging.FileHandler(destino, encoding='utf-8') if destino else logging.StreamHandler()
+    manejador.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(manejador)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return manejador
@@ -0,0 +1,432 @@
+# monitor_deriva.py
+# Monitoreo de deriva de los datos de entrada, de las componentes PCA_* que
+# produce PCAWithTarget y de la mezcla de clases predichas, contra una
+# referencia guardada junto a fitted_pipeline.pkl (referencia_deriva.json).
+#
+# Todo se resume en bocetos de memoria fija que se actualizan bloque por bloque
+# y se pueden combinar (los procesos de scoring_paralelo.py devuelven el suyo):
+#   - CuantilesKLL: cuantiles y CDF aproximados de cada columna numérica (KS)
+#   - HistogramaFijo: conteos sobre los deciles de la referencia (PSI)
+#   - ConteoCategorias: frecuencia de cada categoría (PSI)
+# La memoria no depende del número de filas. Igual que instrumentacion.py, solo
+# se mide dentro de un bloque `with monitorear(monitor):`; fuera de él cada
+# punto de observación es una lectura de un ContextVar.
+#
+# Uso:
+#   python batch_scoring.py data/entrenamiento.csv --crear-referencia-deriva
+#   python batch_scoring.py data/COLL_TEC_CONSOLIDADO.txt --deriva deriva.csv
+
+import contextvars
+import json
+import os
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_NUMERICAS = ['Saldo_total', 'Saldo_Mes', 'Pago_minimo', 'Pago', 'Utilizacion',
+                      'Limite_credito', 'Mob', 'Score_pago']
+COLUMNAS_CATEGORICAS = ['Socio', 'Producto', 'Canal_Pago', 'Behavior']
+PREFIJO_PCA = 'PCA_'
+COLUMNA_PREDICCION = 'Prediccion_Modelo'
+NOMBRE_REFERENCIA = 'referencia_deriva.json'
+VERSION_REFERENCIA = 1
+
+# Elementos por nivel del boceto de cuantiles: error de rango ~1% con pocos KB por columna
+K_CUANTILES = 512
+N_BINS = 10
+MAX_CATEGORIAS = 64
+OTRAS = '(otras)'
+# Proporción mínima en PSI, para que una categoría vacía no dé log(0)
+EPSILON_PSI = 1e-4
+PSI_MODERADA = 0.1
+PSI_SIGNIFICATIVA = 0.25
+
+_monitor_activo = contextvars.ContextVar('monitor_deriva', default=None)
+
+
+class CuantilesKLL:
+    """
+    Mergeable quantile sketch in the style of KLL. Level h holds values of
+    weight 2**h; a level with more than k values is sorted and every other
+    value (random offset) moves up one level. Memory is O(k log(n / k)) and
+    the expected rank error about sqrt(levels) / k.
+    """
+    def __init__(self, k=K_CUANTILES, seed=None):
+        self.k = k
+        self.niveles = [np.empty(0)]
+        self.n = 0
+        self.nulos = 0
+        self._rng = np.random.default_rng(seed)
+        self._ordenados = None
+
+    def actualizar(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        finitos = valores[np.isfinite(valores)]
+        self.nulos += len(valores) - len(finitos)
+        if len(finitos):
+            self.n += len(finitos)
+            self.niveles[0] = np.concatenate([self.niveles[0], finitos])
+            self._compactar()
+
+    def combinar(self, otro):
+        for h, nivel in enumerate(otro.niveles):
+            if h == len(self.niveles):
+                self.niveles.append(np.empty(0))
+            self.niveles[h] = np.concatenate([self.niveles[h], nivel])
+        self.n += otro.n
+        self.nulos += otro.nulos
+        self._compactar()
+
+    def _compactar(self):
+        h = 0
+        while h < len(self.niveles):
+            nivel = self.niveles[h]
+            if len(nivel) > self.k:
+                if h + 1 == len(self.niveles):
+                    self.niveles.append(np.empty(0))
+                nivel = np.sort(nivel)
+                # Con un número impar de valores el menor se queda en el nivel
+                impar = len(nivel) % 2
+                promovidos = nivel[impar + self._rng.integers(2)::2]
+                self.niveles[h + 1] = np.concatenate([self.niveles[h + 1], promovidos])
+                self.niveles[h] = nivel[:impar]
+            h += 1
+        self._ordenados = None
+
+    def _valores_acumulados(self):
+        """Stored values sorted, with the cumulative weight up to each one."""
+        if self._ordenados is None:
+            valores = np.concatenate(self.niveles)
+            pesos = np.concatenate([np.full(len(nivel), 2.0 ** h) for h, nivel in enumerate(self.niveles)])
+            orden = np.argsort(valores, kind='stable')
+            self._ordenados = valores[orden], np.cumsum(pesos[orden])
+        return self._ordenados
+
+    def cdf(self, x):
+        """Estimated fraction of the non-null values <= x."""
+        valores, acumulado = self._valores_acumulados()
+        x = np.asarray(x, dtype=np.float64)
+        if len(valores) == 0:
+            return np.zeros(x.shape)
+        posicion = np.searchsorted(valores, x, side='right')
+        return np.where(posicion > 0, acumulado[np.maximum(posicion - 1, 0)], 0.0) / acumulado[-1]
+
+    def cuantiles(self, q):
+        """Estimated quantiles q (0-1) of the non-null values (NaN when empty)."""
+        valores, acumulado = self._valores_acumulados()
+        q = np.asarray(q, dtype=np.float64)
+        if len(valores) == 0:
+            return np.full(q.shape, np.nan)
+        posicion = np.searchsorted(acumulado, q * acumulado[-1], side='left')
+        return valores[np.clip(posicion, 0, len(valores) - 1)]
+
+    def a_dict(self):
+        return {'k': self.k, 'n': self.n, 'nulos': self.nulos, 'niveles': [nivel.tolist() for nivel in self.niveles]}
+
+    @classmethod
+    def desde_dict(cls, datos):
+        boceto = cls(datos['k'])
+        boceto.n = datos['n']
+        boceto.nulos = datos['nulos']
+        boceto.niveles = [np.asarray(nivel, dtype=np.float64) for nivel in datos['niveles']]
+        return boceto
+
+
+class HistogramaFijo:
+    """
+    Counts per fixed bin (bordes are the inner edges) plus nulls; merging adds
+    the counts. A value equal to an edge falls in the lower bin, the same
+    <= rule as CuantilesKLL.cdf, which gives the reference shares.
+    """
+    def __init__(self, bordes):
+        self.bordes = np.asarray(bordes, dtype=np.float64)
+        self.conteos = np.zeros(len(self.bordes) + 1, dtype=np.int64)
+        self.nulos = 0
+
+    def actualizar(self, valores):
+        valores = np.asarray(valores, dtype=np.float64)
+        finitos = np.isfinite(valores)
+        self.nulos += int(len(valores) - finitos.sum())
+        self.conteos += np.bincount(np.searchsorted(self.bordes, valores[finitos], side='left'),
+                                    minlength=len(self.conteos))
+
+    def combinar(self, otro):
+        self.conteos += otro.conteos
+        self.nulos += otro.nulos
+
+    def proporciones(self):
+        """Share of each bin, nulls last."""
+        conteos = np.append(self.conteos, self.nulos)
+        return conteos / max(conteos.sum(), 1)
+
+
+class ConteoCategorias:
+    """
+    Count per category plus nulls. Beyond MAX_CATEGORIAS the least frequent
+    categories are folded into OTRAS, so memory stays bounded.
+    """
+    def __init__(self):
+        self.conteos = {}
+        self.nulos = 0
+
+    def actualizar(self, valores):
+        serie = valores if isinstance(valores, pd.Series) else pd.Series(valores)
+        self.nulos += int(serie.isna().sum())
+        self._sumar({str(valor): int(k) for valor, k in serie.value_counts(sort=False).items()})
+
+    def combinar(self, otro):
+        self.nulos += otro.nulos
+        self._sumar(otro.conteos)
+
+    def _sumar(self, conteos):
+        for categoria, k in conteos.items():
+            self.conteos[categoria] = self.conteos.get(categoria, 0) + k
+        if len(self.conteos) > MAX_CATEGORIAS:
+            orden = sorted(self.conteos.items(), key=lambda item: (item[0] == OTRAS, -item[1]))
+            otras = sum(k for _, k in orden[MAX_CATEGORIAS - 1:])
+            self.conteos = dict(orden[:MAX_CATEGORIAS - 1])
+            self.conteos[OTRAS] = otras
+
+    def proporciones(self, categorias):
+        """Share of each of categorias (unknown ones count 0), nulls last."""
+        conteos = np.array([self.conteos.get(c, 0) for c in categorias] + [self.nulos], dtype=np.float64)
+        return conteos / max(self.nulos + sum(self.conteos.values()), 1)
+
+
+class MonitorDeriva:
+    """
+    Sketches of one data stream: raw inputs, PCA_* columns of the transformed
+    data and predicted classes. With bordes (the reference bin edges of each
+    numeric column) the numeric columns also get fixed-bin histograms for PSI.
+    Monitors of parallel workers are merged with combinar.
+    """
+    def __init__(self, bordes=None, k=K_CUANTILES):
+        self.bordes = bordes or {}
+        self.k = k
+        self.cuantiles = {}
+        self.histogramas = {}
+        self.categorias = {}
+        self.filas = {'entrada': 0, 'transformado': 0, 'prediccion': 0}
+
+    def parametros(self):
+        """Arguments to build an empty monitor with the same bins (e.g. in a worker)."""
+        return {'bordes': self.bordes, 'k': self.k}
+
+    def _numerica(self, columna, valores):
+        if columna not in self.cuantiles:
+            self.cuantiles[columna] = CuantilesKLL(self.k)
+            if columna in self.bordes:
+                self.histogramas[columna] = HistogramaFijo(self.bordes[columna])
+        self.cuantiles[columna].actualizar(valores)
+        if columna in self.histogramas:
+            self.histogramas[columna].actualizar(valores)
+
+    def _categorica(self, columna, valores):
+        self.categorias.setdefault(columna, ConteoCategorias()).actualizar(valores)
+
+    def observar_entrada(self, df):
+        self.filas['entrada'] += len(df)
+        for columna in COLUMNAS_NUMERICAS:
+            if columna in df.columns:
+                self._numerica(columna, pd.to_numeric(df[columna], errors='coerce').to_numpy(np.float64, na_value=np.nan))
+        for columna in COLUMNAS_CATEGORICAS:
+            if columna in df.columns:
+                self._categorica(columna, df[columna])
+
+    def observar_transformado(self, df):
+        self.filas['transformado'] += len(df)
+        for columna in df.columns:
+            if columna.startswith(PREFIJO_PCA):
+                self._numerica(columna, df[columna].to_numpy(np.float64))
+
+    def observar_predicciones(self, predicciones):
+        self.filas['prediccion'] += len(predicciones)
+        self._categorica(COLUMNA_PREDICCION, predicciones)
+
+    def combinar(self, otro):
+        for columna, boceto in otro.cuantiles.items():
+            if columna in self.cuantiles:
+                self.cuantiles[columna].combinar(boceto)
+            else:
+                self.cuantiles[columna] = boceto
+        for columna, histograma in otro.histogramas.items():
+            if columna in self.histogramas:
+                self.histogramas[columna].combinar(histograma)
+            else:
+                self.histogramas[columna] = histograma
+        for columna, conteo in otro.categorias.items():
+            if columna in self.categorias:
+                self.categorias[columna].combinar(conteo)
+            else:
+                self.categorias[columna] = conteo
+        for fuente, filas in otro.filas.items():
+            self.filas[fuente] += filas
+
+
+class ReferenciaDeriva:
+    """
+    Reference distribution for the monitor: the sketches of the data the
+    pipeline was fitted on, the bin edges of each numeric column (reference
+    deciles) with their shares, and the fingerprint of the pipeline file.
+    """
+    def __init__(self, monitor, bordes, proporciones, huella_pipeline=None):
+        self.monitor = monitor
+        self.bordes = bordes
+        self.proporciones = proporciones
+        self.huella_pipeline = huella_pipeline
+
+    @classmethod
+    def desde_monitor(cls, monitor, huella_pipeline=None, n_bins=N_BINS):
+        """
+        Freezes a monitor as the reference. The bins are the distinct deciles
+        of each column and their shares come from the quantile sketch, so the
+        reference needs a single pass over the data.
+        """
+        bordes = {}
+        proporciones = {}
+        for columna, boceto in monitor.cuantiles.items():
+            if boceto.n == 0:
+                continue
+            internos = np.unique(boceto.cuantiles(np.arange(1, n_bins) / n_bins))
+            acumulado = np.concatenate([[0.0], boceto.cdf(internos), [1.0]])
+            total = boceto.n + boceto.nulos
+            bordes[columna] = internos.tolist()
+            proporciones[columna] = (np.append(np.diff(acumulado) * boceto.n, boceto.nulos) / total).tolist()
+        return cls(monitor, bordes, proporciones, huella_pipeline)
+
+    def nuevo_monitor(self):
+        """Empty monitor binned on the reference edges."""
+        return MonitorDeriva(bordes=self.bordes, k=self.monitor.k)
+
+    def guardar(self, ruta):
+        datos = {
+            'version': VERSION_REFERENCIA,
+            'huella_pipeline': self.huella_pipeline,
+            'filas': self.monitor.filas,
+            'k': self.monitor.k,
+            'cuantiles': {c: b.a_dict() for c, b in self.monitor.cuantiles.items()},
+            'categorias': {c: {'conteos': n.conteos, 'nulos': n.nulos} for c, n in self.monitor.categorias.items()},
+            'bordes': self.bordes,
+            'proporciones': self.proporciones,
+        }
+        temporal = f'{ruta}.{os.getpid()}.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False)
+        os.replace(temporal, ruta)
+        return ruta
+
+    @classmethod
+    def leer(cls, ruta):
+        with open(ruta, encoding='utf-8') as f:
+            datos = json.load(f)
+        if datos.get('version') != VERSION_REFERENCIA:
+            raise ValueError(f"{ruta}: versión de referencia {datos.get('version')} no soportada.")
+        monitor = MonitorDeriva(k=datos['k'])
+        monitor.filas.update(datos['filas'])
+        monitor.cuantiles = {c: CuantilesKLL.desde_dict(b) for c, b in datos['cuantiles'].items()}
+        for columna, conteo in datos['categorias'].items():
+            monitor.categorias[columna] = ConteoCategorias()
+            monitor.categorias[columna].conteos = conteo['conteos']
+            monitor.categorias[columna].nulos = conteo['nulos']
+        return cls(monitor, datos['bordes'], datos['proporciones'], datos['huella_pipeline'])
+
+
+def ruta_referencia(pipeline_path):
+    """Reference file stored next to the fitted pipeline."""
+    return os.path.join(os.path.dirname(os.path.abspath(pipeline_path)), NOMBRE_REFERENCIA)
+
+
+def psi(esperado, observado, epsilon=EPSILON_PSI):
+    """Population stability index between two share vectors over the same bins."""
+    esperado = np.maximum(np.asarray(esperado, dtype=np.float64), epsilon)
+    observado = np.maximum(np.asarray(observado, dtype=np.float64), epsilon)
+    return float(np.sum((observado - esperado) * np.log(observado / esperado)))
+
+
+def ks(referencia, actual):
+    """Kolmogorov-Smirnov statistic between two quantile sketches (on the values they store)."""
+    if referencia.n == 0 or actual.n == 0:
+        return np.nan
+    puntos = np.concatenate([referencia._valores_acumulados()[0], actual._valores_acumulados()[0]])
+    return float(np.max(np.abs(referencia.cdf(puntos) - actual.cdf(puntos))))
+
+
+def nivel_deriva(valor_psi):
+    if not np.isfinite(valor_psi):
+        return ''
+    if valor_psi >= PSI_SIGNIFICATIVA:
+        return 'significativa'
+    return 'moderada' if valor_psi >= PSI_MODERADA else 'estable'
+
+
+def comparar(referencia, monitor):
+    """
+    Drift of every monitored column against the reference: PSI (reference
+    deciles or categories, nulls as one more bin), KS for numeric columns,
+    medians and null shares. Sorted by PSI, highest first.
+    """
+    filas = []
+    for columna, boceto in monitor.cuantiles.items():
+        base = referencia.monitor.cuantiles.get(columna)
+        if base is None:
+            continue
+        valor_psi = np.nan
+        if columna in monitor.histogramas and columna in referencia.proporciones:
+            valor_psi = psi(referencia.proporciones[columna], monitor.histogramas[columna].proporciones())
+        filas.append({
+            'Columna': columna, 'Tipo': 'numérica', 'Filas': boceto.n + boceto.nulos, 'PSI': valor_psi,
+            'KS': ks(base, boceto),
+            'Mediana_referencia': float(base.cuantiles(0.5)), 'Mediana_actual': float(boceto.cuantiles(0.5)),
+            'Nulos_referencia': base.nulos / max(base.n + base.nulos, 1),
+            'Nulos_actual': boceto.nulos / max(boceto.n + boceto.nulos, 1),
+        })
+    for columna, conteo in monitor.categorias.items():
+        base = referencia.monitor.categorias.get(columna)
+        if base is None:
+            continue
+        categorias = sorted(set(base.conteos) | set(conteo.conteos))
+        esperado, observado = base.proporciones(categorias), conteo.proporciones(categorias)
+        filas.append({
+            'Columna': columna, 'Tipo': 'categórica', 'Filas': conteo.nulos + sum(conteo.conteos.values()),
+            'PSI': psi(esperado, observado), 'KS': np.nan,
+            'Mediana_referencia': np.nan, 'Mediana_actual': np.nan,
+            'Nulos_referencia': esperado[-1], 'Nulos_actual': observado[-1],
+        })
+    reporte = pd.DataFrame(filas, columns=['Columna', 'Tipo', 'Filas', 'PSI', 'KS', 'Mediana_referencia',
+                                           'Mediana_actual', 'Nulos_referencia', 'Nulos_actual'])
+    reporte['Deriva'] = reporte['PSI'].map(nivel_deriva)
+    return reporte.sort_values('PSI', ascending=False, na_position='last', kind='stable').reset_index(drop=True)
+
+
+@contextmanager
+def monitorear(monitor):
+    """Feeds every observation point run inside the block (same thread or task) to monitor."""
+    token = _monitor_activo.set(monitor)
+    try:
+        yield monitor
+    finally:
+        _monitor_activo.reset(token)
+
+
+def monitor_activo():
+    """The MonitorDeriva of the current block, or None when monitoring is off."""
+    return _monitor_activo.get()
+
+
+def observar_entrada(df):
+    monitor = _monitor_activo.get()
+    if monitor is not None:
+        monitor.observar_entrada(df)
+
+
+def observar_transformado(df):
+    monitor = _monitor_activo.get()
+    if monitor is not None:
+        monitor.observar_transformado(df)
+
+
+def observar_predicciones(predicciones):
+    monitor = _monitor_activo.get()
+    if monitor is not None:
+        monitor.observar_predicciones(predicciones)
@@ -1,11 +1,13 @@
 # pages/3_ρί_Análisis_de_Riesgo.py
 
 import streamlit as st
-import pandas as pd
+import numpy as np
 import plotly.express as px
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
+
+from agregados import resumen_riesgo
+from cartera_compartida import cartera_de_sesion
+from segmentacion import evaluar_k, segmentar_cartera
+from trabajos import TERMINADO, enviar_trabajo, mostrar_trabajo, obtener_trabajo, refrescar_si_pendiente
 
 st.set_page_config(page_title="Análisis de Riesgo", layout="wide")
 
@@ -19,20 +21,17 @@ if 'df' not in st.session_state:
     st.warning("Por favor, carga tus datos en la página de 'Inicio' primero.")
     st.stop()
 
-df = st.session_state['df'].copy()
+# Cartera compartida entre sesiones: no se copia ni se le agregan columnas
+cartera = cartera_de_sesion(st.session_state)
 
 # --- Sección 1: Segmentación por Reglas de Negocio (Score de Pago) ---
 st.header("Segmentación por Score de Pago")
 
-def asignar_riesgo(score):
-    if score >= 9: return 'Bajo Riesgo'
-    elif score >= 5: return 'Riesgo Medio'
-    elif score > 0: return 'Alto Riesgo'
-    else: return 'Sin Información'
-
-df['Nivel_de_Riesgo'] = df['Score_pago'].apply(asignar_riesgo)
+# Nivel de riesgo vectorizado (>= 9 bajo, >= 5 medio, > 0 alto, resto sin información)
+# y tablas por nivel, calculados una vez por cartera
+resumen = resumen_riesgo(cartera)
 
-riesgo_counts = df['Nivel_de_Riesgo'].value_counts()
+riesgo_counts = resumen.conteos
 fig_riesgo = px.bar(
     riesgo_counts, y=riesgo_counts.values, x=riesgo_counts.index,
     title='Distribución de Clientes por Nivel de Riesgo (Score)',
@@ -42,11 +41,7 @@ fig_riesgo = px.bar(
 )
 st.plotly_chart(fig_riesgo, use_container_width=True)
 
-analisis_riesgo = df.groupby('Nivel_de_Riesgo').agg(
-    Saldo_Total_Promedio=('Saldo_total', 'mean'),
-    Utilizacion_Promedio=('Utilizacion', 'mean'),
-    Numero_de_Clientes=('Socio', 'count')
-).reset_index()
+analisis_riesgo = resumen.por_nivel
 
 st.write("Análisis Comparativo por Segmento de Score:")
 st.dataframe(analisis_riesgo.style.format({
@@ -57,48 +52,64 @@ st.divider()
 
 # --- Sección 2: Segmentación por Machine Learning (Clustering) ---
 st.header("Segmentación por Comportamiento (K-Means Clustering)")
-st.write("Usa Machine Learning para agrupar a tus clientes en 3 clústeres basados en su comportamiento financiero general.")
+st.write("Usa Machine Learning para agrupar a tus clientes en clústeres (3 por defecto) basados en su comportamiento financiero general.")
+
+# Máximo de puntos enviados al navegador en el gráfico de dispersión
+PUNTOS_GRAFICO = 20_000
+
+huella = cartera.huella
+with st.expander("Elegir el número de clústeres (codo y silueta sobre una muestra)"):
+    if st.button("Evaluar número de clústeres"):
+        with st.spinner("Evaluando k de 2 a 8 en paralelo..."):
+            st.session_state['evaluacion_k'] = evaluar_k(cartera.df, huella)
+    if 'evaluacion_k' in st.session_state:
+        evaluacion = st.session_state['evaluacion_k']
+        col_codo, col_silueta = st.columns(2)
+        col_codo.plotly_chart(px.line(evaluacion, x='k', y='Inercia', markers=True, title='Método del codo'),
+                              use_container_width=True)
+        col_silueta.plotly_chart(px.line(evaluacion, x='k', y='Silueta', markers=True, title='Silueta'),
+                                 use_container_width=True)
+
+n_clusters = st.slider("Número de clústeres", min_value=2, max_value=8, value=3)
+
+def segmentar_en_segundo_plano(trabajo, df, huella, k):
+    # Escalado, MiniBatchKMeans sobre una muestra y PCA 2D; el resultado queda
+    # en caché por huella de datos y parámetros
+    return segmentar_cartera(df, huella, k=k, progreso=lambda hechos, total: trabajo.avanzar(
+        hechos, total, "Calculando clústeres"))
+
 
 if st.button("Ejecutar Análisis de Clustering", type="primary"):
-    with st.spinner("Procesando datos y calculando clústeres..."):
-        # 1. Preparar datos (versión simplificada de tu pipeline para clustering)
-        df_proc = df.copy()
-        numeric_cols = df_proc.select_dtypes(include=['number']).columns
-        df_proc[numeric_cols] = df_proc[numeric_cols].fillna(0)
-        
-        # Eliminar columnas no relevantes para el clustering de comportamiento
-        cols_to_drop = ['Variable_objetivo', 'ID_Cliente', 'Score_pago', 'Nivel_de_Riesgo']
-        df_proc = df_proc.drop(columns=[col for col in cols_to_drop if col in df_proc.columns], errors='ignore')
-        
-        # Seleccionar solo las columnas numéricas para el modelo
-        df_numeric = df_proc.select_dtypes(include=['number'])
-
-        # 2. Escalar los datos
-        scaler = StandardScaler()
-        df_scaled = scaler.fit_transform(df_numeric)
-
-        # 3. Aplicar KMeans con 3 clústeres
-        kmeans = KMeans(n_clusters=3, n_init=10, random_state=42)
-        df['Cluster'] = kmeans.fit_predict(df_scaled)
-        st.session_state['df_clustered'] = df # Guardar para no recalcular
-        st.success("¡Clustering completado! Se han identificado 3 segmentos.")
-
-if 'df_clustered' in st.session_state:
-    df_clustered = st.session_state['df_clustered']
-    
+    # Trabajo en segundo plano, compartido con otras sesiones que pidan la misma cartera y k
+    enviar_trabajo(('segmentacion', huella, n_clusters), f"Clustering con k={n_clusters}",
+                   segmentar_en_segundo_plano, cartera.df, huella, n_clusters)
+    st.session_state['clustering_k'] = n_clusters
+
+trabajo = None
+if 'clustering_k' in st.session_state:
+    trabajo = obtener_trabajo(('segmentacion', huella, st.session_state['clustering_k']))
+pendiente = trabajo is not None and mostrar_trabajo(trabajo, 'segmentacion')
+
+if trabajo is not None and trabajo.estado == TERMINADO:
+    # El resultado queda en el trabajo: los reruns no vuelven a escalar, agrupar ni proyectar
+    segmentos = trabajo.resultado
+    st.success(f"¡Clustering completado! Se han identificado {st.session_state['clustering_k']} segmentos "
+               f"({trabajo.segundos:.1f} s).")
+
     # 4. Visualizar los clústeres con PCA
     st.subheader("Visualización de los Clústeres")
-    
-    # Reducir dimensionalidad a 2 componentes para graficar
-    pca = PCA(n_components=2)
-    df_numeric_scaled = StandardScaler().fit_transform(df_clustered.select_dtypes(include=['number']).fillna(0))
-    components = pca.fit_transform(df_numeric_scaled)
-    
-    df_clustered['pca_x'] = components[:, 0]
-    df_clustered['pca_y'] = components[:, 1]
+
+    # Muestra fija de puntos para graficar; la proyección ya está calculada
+    n_filas = len(segmentos.etiquetas)
+    puntos = np.random.default_rng(0).choice(n_filas, min(n_filas, PUNTOS_GRAFICO), replace=False)
+    df_grafico = cartera.vista(['Saldo_total', 'Utilizacion', 'Score_pago'], puntos).assign(
+        Cluster=segmentos.etiquetas[puntos].astype(str),
+        pca_x=segmentos.xy[puntos, 0],
+        pca_y=segmentos.xy[puntos, 1],
+    )
 
     fig_cluster = px.scatter(
-        df_clustered,
+        df_grafico,
         x='pca_x',
         y='pca_y',
         color='Cluster',
@@ -107,15 +118,12 @@ if 'df_clustered' in st.session_state:
         hover_data=['Saldo_total', 'Utilizacion', 'Score_pago']
     )
     st.plotly_chart(fig_cluster, use_container_width=True)
-    
+    if n_filas > PUNTOS_GRAFICO:
+        st.caption(f"Se muestran {PUNTOS_GRAFICO:,} de {n_filas:,} clientes elegidos al azar.")
+
     # 5. Analizar los clústeres
     st.subheader("Análisis Comparativo por Clúster")
-    cluster_analysis = df_clustered.groupby('Cluster').agg(
-        Saldo_Total_Promedio=('Saldo_total', 'mean'),
-        Utilizacion_Promedio=('Utilizacion', 'mean'),
-        Score_Pago_Promedio=('Score_pago', 'mean'),
-        Numero_de_Clientes=('Socio', 'count')
-    ).reset_index()
+    cluster_analysis = segmentos.resumen
 
     st.dataframe(cluster_analysis.style.format({
         "Saldo_Total_Promedio": "${:,.2f}",
@@ -123,9 +131,14 @@ if 'df_clustered' in st.session_state:
         "Score_Pago_Promedio": "{:.1f}"
     }), use_container_width=True)
     
+    # Etiquetas del k elegido (las de la tabla), no una lista fija
+    etiquetas_k = ', '.join(str(c) for c in cluster_analysis['Cluster'])
     st.info(
         "**¿Cómo interpretar los clústeres?**\n\n"
-        "Cada clúster (0, 1, 2) representa un grupo de clientes con características financieras similares. "
+        f"Cada clúster ({etiquetas_k}) representa un grupo de clientes con características financieras similares. "
         "Analiza la tabla de arriba para entender el 'perfil' de cada grupo. Por ejemplo, un clúster podría "
         "agrupar a clientes de 'alto saldo y alta utilización', mientras que otro podría ser de 'bajo saldo y bajo riesgo'."
-    )
\ No newline at end of file
+    )
+
+# Mientras el clustering siga activo, la página se actualiza sola
+refrescar_si_pendiente(pendiente)
@@ -4,6 +4,14 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 
+from agregados import resumen_cartera
+from almacen_scores import obtener_almacen
+from buscador_clientes import selector_cliente
+from cartera_compartida import cartera_de_sesion
+from consulta_cohortes import COLUMNAS_AGRUPACION, Predicado, escribir_cohortes, motor_cohortes
+from ingesta import vista_legible
+from trabajos import enviar_trabajo, mostrar_trabajo, refrescar_si_pendiente
+
 # --- Configuración de la página ---
 st.set_page_config(page_title="Análisis de Cartera", layout="wide")
 st.title(" Análisis de Cartera de Clientes")
@@ -16,17 +24,21 @@ if 'df' not in st.session_state:
     st.warning("Por favor, carga tus datos en la página de 'Inicio' primero.")
     st.stop()
 
-# Usamos el dataframe original para el análisis
-df_original = st.session_state['df']
+# Cartera compartida entre sesiones: se lee sin copiarla ni modificarla
+cartera = cartera_de_sesion(st.session_state)
+df_original = cartera.df
 
 # --- Dashboard de Análisis de Portafolio ---
 st.header("Dashboard General del Portafolio")
 
+# Resúmenes calculados una vez por cartera; los reruns solo grafican tablas pequeñas
+resumen = resumen_cartera(cartera)
+
 # Métricas clave
 col1, col2, col3 = st.columns(3)
-total_clientes = len(df_original)
-saldo_total = df_original['Saldo_total'].sum()
-utilizacion_promedio = df_original['Utilizacion'].mean()
+total_clientes = resumen.total_clientes
+saldo_total = resumen.saldo_total
+utilizacion_promedio = resumen.utilizacion_promedio
 
 col1.metric("Número Total de Clientes", f"{total_clientes:,}")
 col2.metric("Saldo Total en Cartera", f"${saldo_total:,.2f} MXN")
@@ -39,7 +51,7 @@ col_viz1, col_viz2 = st.columns(2)
 
 with col_viz1:
     st.subheader("Distribución de Clientes por Socio")
-    socio_counts = df_original['Socio'].value_counts().reset_index()
+    socio_counts = resumen.por_socio[['Socio', 'Numero_de_Clientes']]
     socio_counts.columns = ['Socio', 'Número de Clientes']
     fig_socio = px.pie(
         socio_counts,
@@ -52,34 +64,110 @@ with col_viz1:
 
 with col_viz2:
     st.subheader("Distribución de Saldos en la Cartera")
-    fig_saldo = px.histogram(
-        df_original,
-        x='Saldo_total',
-        nbins=50,
+    # Histograma ya agrupado en 50 intervalos: se envían 50 barras, no una fila por cliente
+    fig_saldo = px.bar(
+        resumen.histograma_saldo,
+        x='Centro',
+        y='Clientes',
+        hover_data=['Desde', 'Hasta'],
         title='Frecuencia de Saldos Totales',
-        labels={'Saldo_total': 'Saldo Total (MXN)'}
+        labels={'Centro': 'Saldo Total (MXN)', 'Clientes': 'count'}
     )
+    fig_saldo.update_layout(bargap=0)
     st.plotly_chart(fig_saldo, use_container_width=True)
 
 st.divider()
 
+# --- Análisis de Cohortes ---
+st.header("Análisis de Cohortes")
+st.write(
+    "Filtra la cartera por socio, producto, utilización, atraso y score para ver los saldos y la mezcla de "
+    "riesgo de la cohorte. La consulta se resuelve sobre el archivo columnar: solo se leen los bloques y "
+    "columnas que pueden cumplir los filtros."
+)
+
+pendiente = False
+motor = motor_cohortes(cartera.huella, df_original)
+if motor is None:
+    # Copia ordenada de las columnas de cohorte; se escribe una vez por cartera
+    trabajo_cohortes = enviar_trabajo(
+        ('cohortes', cartera.huella), "Preparando el archivo de cohortes",
+        lambda trabajo, huella: escribir_cohortes(huella, progreso=trabajo.avanzar), cartera.huella)
+    pendiente = mostrar_trabajo(trabajo_cohortes, 'cohortes')
+    if not pendiente:
+        motor = motor_cohortes(cartera.huella, df_original)
+        if motor is None:
+            st.info("El análisis de cohortes necesita la caché Parquet de la cartera.")
+
+if motor is not None:
+    def opciones(columna):
+        valores = cartera.columna(columna)
+        if isinstance(valores, pd.Categorical):
+            return list(valores.categories)
+        return sorted(pd.unique(pd.Series(valores).dropna()))
+
+    col_socio, col_producto, col_agrupar = st.columns(3)
+    socios = col_socio.multiselect("Socio", resumen.por_socio['Socio'].tolist(), key='cohorte_socio')
+    productos = col_producto.multiselect("Producto", opciones('Producto'), key='cohorte_producto')
+    agrupar = col_agrupar.selectbox("Agrupar por", ['(sin agrupar)'] + [c for c in COLUMNAS_AGRUPACION
+                                                                        if c in motor.columnas], key='cohorte_agrupar')
+
+    col_utilizacion, col_atraso, col_score = st.columns(3)
+    utilizacion_minima = col_utilizacion.number_input("Utilización mayor a (%)", min_value=0.0, value=0.0,
+                                                      step=5.0, key='cohorte_utilizacion')
+    atraso_minimo = col_atraso.number_input("Ciclos de atraso M1 (mínimo)", min_value=0, value=0, step=1,
+                                            key='cohorte_atraso')
+    score = col_score.slider("Score de pago", min_value=0, max_value=12, value=(0, 12), key='cohorte_score')
+
+    predicados = []
+    if socios:
+        predicados.append(Predicado('Socio', 'en', socios))
+    if productos:
+        predicados.append(Predicado('Producto', 'en', productos))
+    if utilizacion_minima > 0:
+        predicados.append(Predicado('Utilizacion', '>', utilizacion_minima / 100))
+    if atraso_minimo > 0:
+        predicados.append(Predicado('Ciclo_atraso_M1', '>=', atraso_minimo))
+    if score != (0, 12):
+        predicados.append(Predicado('Score_pago', 'entre', score))
+
+    cohorte = motor.consultar(predicados, None if agrupar == '(sin agrupar)' else agrupar)
+    col_c1, col_c2, col_c3, col_c4 = st.columns(4)
+    col_c1.metric("Clientes en la Cohorte", f"{cohorte.resumen['Clientes']:,.0f}",
+                  f"{cohorte.resumen['Clientes'] / max(total_clientes, 1):.1%} de la cartera", delta_color="off")
+    col_c2.metric("Saldo Total", f"${cohorte.resumen['Saldo_Total']:,.2f} MXN")
+    col_c3.metric("Saldo Promedio", f"${cohorte.resumen['Saldo_Promedio']:,.2f} MXN"
+                  if cohorte.resumen['Clientes'] else "-")
+    col_c4.metric("Utilización Promedio", f"{cohorte.resumen['Utilizacion_Promedio']:.2%}"
+                  if cohorte.resumen['Clientes'] else "-")
+
+    if cohorte.resumen['Clientes']:
+        col_riesgo, col_tabla = st.columns(2)
+        with col_riesgo:
+            st.plotly_chart(px.pie(cohorte.por_riesgo, names='Nivel_de_Riesgo', values='Clientes',
+                                   title='Mezcla de Riesgo de la Cohorte', hole=0.3), use_container_width=True)
+        with col_tabla:
+            st.dataframe(cohorte.por_riesgo, use_container_width=True, hide_index=True)
+        if cohorte.por_grupo is not None:
+            st.dataframe(cohorte.por_grupo, use_container_width=True, hide_index=True)
+    else:
+        st.info("Ningún cliente cumple los filtros de la cohorte.")
+    st.caption(f"Consulta en {cohorte.segundos * 1000:,.0f} ms: {cohorte.grupos_leidos} de "
+               f"{cohorte.grupos_totales} bloques leídos ({cohorte.filas_leidas:,} filas escaneadas).")
+
+st.divider()
+
 # --- Búsqueda de Clientes ---
 st.header("Búsqueda de Clientes Individuales")
 st.write("Busca un cliente por su número de índice (ID de Cliente) para ver su perfil completo.")
 
-# Crear un identificador único si no existe (usando el índice)
-if 'ID_Cliente' not in df_original.columns:
-    df_original.insert(0, 'ID_Cliente', range(1, len(df_original) + 1))
+# Búsqueda indexada (ID exacto, prefijo o rango y filtros); solo viaja la página visible
+cliente_id_seleccionado = selector_cliente(cartera, 'cartera')
 
-# Widget de búsqueda
-cliente_id_seleccionado = st.selectbox(
-    'Selecciona un ID de Cliente:',
-    df_original['ID_Cliente']
-)
-
-if cliente_id_seleccionado:
-    # Filtrar el dataframe para obtener los datos del cliente
-    datos_cliente = df_original[df_original['ID_Cliente'] == cliente_id_seleccionado].iloc[0]
+if cliente_id_seleccionado is not None:
+    # Obtener los datos del cliente con el índice hash por ID_Cliente
+    almacen = obtener_almacen(cartera.df, cartera.huella, cartera.ids)
+    datos_cliente = vista_legible(almacen.fila(cliente_id_seleccionado)).iloc[0]
     
     st.subheader(f"Perfil del Cliente: {cliente_id_seleccionado}")
     
@@ -113,4 +201,6 @@ if cliente_id_seleccionado:
                 st.json(datos, expanded=True)
     with col_perfil2:
         st.write(f"**Comportamiento de Pago**")
-        st.json(perfil["Comportamiento de Pago"], expanded=True)
\ No newline at end of file
+        st.json(perfil["Comportamiento de Pago"], expanded=True)
+
+refrescar_si_pendiente(pendiente)
@@ -1,20 +1,22 @@
 # pages/4_🧠_Modelo_Predictivo.py
 
+from contextlib import nullcontext
+
 import streamlit as st
 import pandas as pd
-import joblib
-import sys
-
-# Importar las clases y funciones personalizadas del script de utilidades
-from pipeline_utils import Preprocesador, PCAWithTarget, limpieza_sin_categoricas
 
-# ------------------- INYECCIÓN DE DEPENDENCIAS (FIX) -------------------
-# Se inyectan los objetos personalizados en el espacio de nombres de __main__
-# para que joblib/pickle pueda encontrarlos al cargar el pipeline.
-sys.modules['__main__'].limpieza_sin_categoricas = limpieza_sin_categoricas
-sys.modules['__main__'].Preprocesador = Preprocesador
-sys.modules['__main__'].PCAWithTarget = PCAWithTarget
-# -----------------------------------------------------------------
+# Carga de artefactos y transformación compartidas con el scoring en lote
+from paquete_modelo import cargar_modelo, paquete_disponible
+from actualizacion_incremental import huella_modelo
+from bosque_compilado import BosqueCompilado, compilar_bosque
+from almacen_scores import obtener_almacen
+from buscador_clientes import selector_cliente
+from cartera_compartida import cartera_de_sesion
+from clientes_similares import actualizar_indice_similares, obtener_indice
+from instrumentacion import perfilar
+from resultados_lote import ResultadosLote, grilla_resultados, tabla_resultados
+from scoring import MODEL_PATH, PIPELINE_PATH
+from trabajos import TERMINADO, enviar_trabajo, mostrar_trabajo, obtener_trabajo, refrescar_si_pendiente
 
 st.set_page_config(page_title="Modelo Predictivo", layout="wide")
 st.title("Modelo Predictivo de Comportamiento")
@@ -27,42 +29,106 @@ if 'df' not in st.session_state:
 try:
     @st.cache_resource
     def load_artifacts():
-        pipeline = joblib.load('fitted_pipeline.pkl')
-        model = joblib.load('random_forest_model.pkl')
-        return pipeline, model
+        # Paquete versionado (modelo_paquete/) si existe; si no, los .pkl del notebook
+        return cargar_modelo(paquete_disponible())
     
+    @st.cache_resource
+    def load_bosque_compilado(_model):
+        # Versión en arreglos del random forest para clasificar un solo cliente
+        # (el paquete ya la trae, sobre arreglos con memory mapping)
+        return _model if isinstance(_model, BosqueCompilado) else compilar_bosque(_model)
+
+    @st.cache_resource
+    def load_huella_artefactos():
+        # Las features PCA_* (y el índice de similares) dependen de los archivos cargados
+        paquete = paquete_disponible()
+        return huella_modelo(paquete) if paquete else huella_modelo(PIPELINE_PATH, MODEL_PATH)
+
     pipeline, model = load_artifacts()
+    bosque = load_bosque_compilado(model)
+    huella_artefactos = load_huella_artefactos()
     st.success("Modelo predictivo y pipeline de procesamiento cargados exitosamente.")
 
 except Exception as e:
     st.error(f"Ocurrió un error al cargar los artefactos del modelo: {e}")
     st.stop()
 
+# Cartera compartida entre sesiones; los IDs de cliente se leen de cartera.ids
+cartera = cartera_de_sesion(st.session_state)
+
+# Scores por cliente de los datos cargados; se invalida al cambiar la huella del archivo
+almacen = obtener_almacen(cartera.df, cartera.huella, cartera.ids)
+almacen.configurar_modelo(pipeline, bosque)
+
 
 # --- Sección 1: Predicción para toda la Cartera ---
 st.header("1. Ejecutar Predicciones para toda la Cartera")
 st.write("Usa este botón para aplicar el modelo a todos los clientes del archivo que cumplen con los criterios de limpieza de datos.")
+# Medir con tracemalloc hace más lenta la ejecución, por eso es opcional
+perfilar_ejecucion = st.checkbox("Perfilar la ejecución (tiempo, memoria y filas por etapa)")
+
+# La predicción corre como trabajo en segundo plano: la sesión no se bloquea, un
+# cambio de página no la interrumpe y dos sesiones con la misma cartera comparten
+# el mismo trabajo y su resultado
+def predecir_cartera(trabajo, almacen, cartera, perfilar_ejecucion, huella_artefactos):
+    with (perfilar('modelo_predictivo') if perfilar_ejecucion else nullcontext()) as perfil:
+        # Las predicciones conservan el índice original de cada cliente y quedan
+        # guardadas en el almacén para las consultas individuales
+        predictions = almacen.puntuar_cartera(progreso=lambda hechos, total: trabajo.avanzar(
+            hechos, total, f"{hechos:,} de {total:,} clientes"))
+    trabajo.mensaje = "Guardando resultados"
+    # Los resultados se guardan del lado del servidor (Parquet con memory mapping);
+    # la grilla de abajo solo lee la página visible
+    resultados = ResultadosLote.guardar(tabla_resultados(cartera, predictions), cartera.huella)
+    # El índice de clientes similares se actualiza con las features PCA_* del lote
+    trabajo.mensaje = "Actualizando el índice de clientes similares"
+    reporte_indice = actualizar_indice_similares(almacen, cartera, huella_artefactos)
+    return resultados, perfil, reporte_indice
+
+
+def clave_prediccion(perfilado):
+    return ('prediccion_cartera', cartera.huella, perfilado)
+
 
 if st.button("Predecir para toda la Cartera", type="primary"):
-    with st.spinner("Procesando datos y generando predicciones..."):
-        df_predict = st.session_state['df'].copy()
-
-        if 'Variable_objetivo' not in df_predict.columns:
-            df_predict['Variable_objetivo'] = 0
-
-        try:
-            transformed_data = pipeline.transform(df_predict)
-            predictions = model.predict(transformed_data)
-            
-            df_results = st.session_state['df'].loc[transformed_data.index].copy()
-            df_results['Prediccion_Modelo'] = predictions
-            
-            st.subheader("Resultados de la Predicción en Lote")
-            st.write(f"El modelo se pudo ejecutar en {len(df_results)} de {len(st.session_state['df'])} clientes.")
-            st.dataframe(df_results[['Socio', 'Producto', 'Saldo_total', 'Score_pago', 'Prediccion_Modelo']])
-        
-        except Exception as e:
-            st.error(f"Ocurrió un error durante la predicción en lote: {e}")
+    enviar_trabajo(clave_prediccion(perfilar_ejecucion), "Predicción de la cartera", predecir_cartera,
+                   almacen, cartera, perfilar_ejecucion, huella_artefactos)
+    st.session_state['trabajo_prediccion'] = clave_prediccion(perfilar_ejecucion)
+
+# Trabajo de esta sesión o, si no hay, uno de otra sesión con la misma cartera
+trabajo = (obtener_trabajo(st.session_state.get('trabajo_prediccion'))
+           or obtener_trabajo(clave_prediccion(False)) or obtener_trabajo(clave_prediccion(True)))
+pendiente = False
+if trabajo is not None and trabajo.clave[1] == cartera.huella:
+    pendiente = mostrar_trabajo(trabajo, 'prediccion')
+    if trabajo.estado == TERMINADO:
+        resultados, perfil, reporte_indice = trabajo.resultado
+        st.subheader("Resultados de la Predicción en Lote")
+        st.write(f"El modelo se pudo ejecutar en {len(resultados)} de {len(cartera)} clientes "
+                 f"({trabajo.segundos:.1f} s).")
+        st.caption(f"Índice de clientes similares ({'exacto' if reporte_indice['exacto'] else 'aproximado'}): "
+                   f"{reporte_indice['nuevos']:,} nuevos, {reporte_indice['cambiados']:,} cambiados y "
+                   f"{reporte_indice['bajas']:,} bajas en {reporte_indice['segundos']:.1f} s.")
+        grilla_resultados(resultados, 'resultados')
+
+        if perfil is not None:
+            with st.expander("Perfil de la ejecución por etapa"):
+                etapas = pd.DataFrame(perfil.etapas)
+                st.dataframe(etapas.style.format({'segundos': '{:.3f}', 'memoria_pico_mb': '{:,.1f}'}, na_rep='n/d'),
+                             hide_index=True)
+                filtros = pd.DataFrame(perfil.filtros)
+                if not filtros.empty:
+                    st.write("Filas descartadas por los filtros de limpieza:")
+                    st.dataframe(filtros.groupby('filtro', sort=False)[
+                        ['filas_entrada', 'filas_salida', 'filas_descartadas']].sum().reset_index(),
+                        hide_index=True)
+                    nulos = {}
+                    for detalle in filtros.get('detalle', pd.Series(dtype=object)).dropna():
+                        for columna, filas in detalle.items():
+                            nulos[columna] = nulos.get(columna, 0) + filas
+                    if nulos:
+                        st.write("Columnas con nulos que provocan el descarte (dropna):")
+                        st.dataframe(pd.Series(nulos, name='Filas_con_nulo').sort_values(ascending=False))
 
 st.divider()
 
@@ -70,39 +136,24 @@ st.divider()
 st.header("2. Clasificar un Cliente Individual")
 st.write("Selecciona un cliente del archivo cargado para obtener una clasificación individual.")
 
-# Asegurarse de que la columna ID_Cliente exista para la selección
-df_main = st.session_state['df']
-if 'ID_Cliente' not in df_main.columns:
-    df_main.insert(0, 'ID_Cliente', range(1, len(df_main) + 1))
-
-# Widget para seleccionar el cliente
-cliente_id_seleccionado = st.selectbox(
-    'Selecciona un ID de Cliente:',
-    options=df_main['ID_Cliente'].unique(),
-    help="Elige un cliente del archivo que cargaste en la página de Inicio."
-)
+# Búsqueda indexada del cliente; solo se envía al navegador la página de resultados
+cliente_id_seleccionado = selector_cliente(cartera, 'modelo')
 
 if st.button("Clasificar Cliente Seleccionado"):
-    if cliente_id_seleccionado:
+    if cliente_id_seleccionado is not None:
         with st.spinner(f"Clasificando al cliente {cliente_id_seleccionado}..."):
-            # Obtener la fila de datos para el cliente seleccionado
-            datos_cliente = df_main[df_main['ID_Cliente'] == cliente_id_seleccionado].copy()
-
-            # Añadir la columna dummy de 'Variable_objetivo' si no existe
-            if 'Variable_objetivo' not in datos_cliente.columns:
-                datos_cliente['Variable_objetivo'] = 0
+            # Obtener la fila de datos para el cliente seleccionado (índice hash por ID)
+            datos_cliente = almacen.fila(cliente_id_seleccionado)
 
             try:
                 # El pipeline puede eliminar al cliente si no cumple los criterios.
-                # Debemos verificar si sobrevivió.
-                transformed_cliente = pipeline.transform(datos_cliente)
+                # El almacén responde desde el lote o calcula al cliente una sola vez.
+                score_cliente = almacen.consultar(cliente_id_seleccionado)
 
-                if transformed_cliente.empty:
+                if not score_cliente.procesable:
                     st.warning("El cliente seleccionado no cumple con los criterios de limpieza de datos y no puede ser procesado por el modelo.")
                 else:
-                    # Hacer la predicción
-                    prediccion = model.predict(transformed_cliente)
-                    resultado = prediccion[0]
+                    resultado = score_cliente.prediccion
 
                     # Mostrar el resultado de forma destacada
                     st.subheader(f"Resultado para el Cliente {cliente_id_seleccionado}")
@@ -117,5 +168,21 @@ if st.button("Clasificar Cliente Seleccionado"):
                     with st.expander("Ver datos clave del cliente utilizado para la predicción"):
                         st.dataframe(datos_cliente[['Socio', 'Producto', 'Saldo_total', 'Limite_credito', 'Utilizacion', 'Score_pago']])
 
+                    # Clientes más cercanos en el espacio PCA_* y cómo los clasificó el modelo
+                    st.subheader("Clientes Similares")
+                    indice = obtener_indice()
+                    if indice is None or not indice.pertenece(huella_artefactos, cartera.huella):
+                        st.info("Ejecuta la predicción para toda la cartera para construir el índice de clientes similares.")
+                    else:
+                        similares, segundos = indice.similares(score_cliente.features, excluir=cliente_id_seleccionado)
+                        st.dataframe(similares, use_container_width=True, hide_index=True)
+                        mezcla = similares['Prediccion_Modelo'].value_counts(normalize=True)
+                        st.caption(f"{len(similares)} clientes más cercanos en {segundos * 1000:.1f} ms "
+                                   f"({'índice exacto' if indice.exacto else 'índice aproximado'}). Clases: "
+                                   + ", ".join(f"Clase {clase}: {parte:.0%}" for clase, parte in mezcla.items()))
+
             except Exception as e:
-                st.error(f"No se pudo procesar al cliente. Error: {e}")
\ No newline at end of file
+                st.error(f"No se pudo procesar al cliente. Error: {e}")
+
+# Mientras la predicción en lote siga activa, la página se actualiza sola
+refrescar_si_pendiente(pendiente)
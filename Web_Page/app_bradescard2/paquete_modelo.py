@@ -0,0 +1,279 @@
+# paquete_modelo.py
+# Paquete de artefactos del modelo sin pickle. Los parámetros del pipeline
+# (categorías del OneHotEncoder, media/escala del StandardScaler, componentes del
+# PCA) y los arreglos del random forest compilado se guardan como bloques .npy
+# crudos, con un manifest.json versionado que describe el esquema. Al cargar, los
+# .npy se abren con memory mapping: los procesos que cargan el mismo paquete
+# comparten una sola copia de los árboles en la caché de páginas del sistema, y
+# no hace falta registrar clases en __main__ como con fitted_pipeline.pkl.
+#
+# Uso:
+#   python paquete_modelo.py --pipeline fitted_pipeline.pkl --modelo random_forest_model.pkl --salida modelo_paquete
+
+import argparse
+import datetime
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, StandardScaler
+
+from bosque_compilado import BosqueCompilado, compilar_bosque
+from pipeline_utils import PCAWithTarget, Preprocesador, limpieza_sin_categoricas
+from scoring import MODEL_PATH, PIPELINE_PATH, cargar_artefactos
+
+FORMATO = 'bradescard-modelo'
+VERSION_PAQUETE = 1
+PAQUETE_PATH = 'modelo_paquete'
+MANIFIESTO = 'manifest.json'
+
+# Arreglos del bosque compilado (BosqueCompilado.arreglos, sin los nombres de features)
+ARREGLOS_BOSQUE = ['feature', 'umbral', 'izquierdo', 'derecho', 'nan_izquierda', 'valores', 'raices', 'classes']
+
+
+class ErrorPaquete(ValueError):
+    """The bundle is missing, has another format/version or does not match its manifest."""
+
+
+def _json(valor):
+    """Plain JSON value for a category (NumPy scalars to Python, NaN to None)."""
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and np.isnan(valor):
+        return None
+    return valor
+
+
+def exportar_paquete(pipeline, model, directorio=PAQUETE_PATH):
+    """
+    Writes the fitted pipeline and model as a bundle directory. The directory is
+    written next to the target and renamed at the end, so readers never see a
+    half-written bundle.
+    """
+    prep = pipeline.named_steps['Preprocesamiento']
+    pca_target = pipeline.named_steps['PCAConY']
+    pca = pca_target.pca
+    bosque = model if isinstance(model, BosqueCompilado) else compilar_bosque(model)
+
+    arreglos = {
+        'scaler_mean': prep.scaler.mean_,
+        'scaler_scale': prep.scaler.scale_,
+        'scaler_var': prep.scaler.var_,
+        'pca_components': pca.components_,
+        'pca_mean': pca.mean_,
+        'pca_explained_variance': pca.explained_variance_,
+        'pca_explained_variance_ratio': pca.explained_variance_ratio_,
+        'pca_singular_values': pca.singular_values_,
+    }
+    arreglos_bosque = bosque.arreglos()
+    arreglos.update({f'bosque_{nombre}': arreglos_bosque[nombre] for nombre in ARREGLOS_BOSQUE})
+
+    temporal = f'{directorio}.{os.getpid()}.tmp'
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(temporal)
+    descripcion = {}
+    for nombre, arreglo in arreglos.items():
+        if arreglo is None:
+            continue
+        arreglo = np.ascontiguousarray(arreglo)
+        if arreglo.dtype.hasobject:
+            raise ErrorPaquete(f"'{nombre}' contiene objetos de Python y no se puede guardar sin pickle.")
+        np.save(os.path.join(temporal, f'{nombre}.npy'), arreglo, allow_pickle=False)
+        descripcion[nombre] = {'archivo': f'{nombre}.npy', 'dtype': arreglo.dtype.str, 'shape': list(arreglo.shape)}
+
+    manifiesto = {
+        'formato': FORMATO,
+        'version': VERSION_PAQUETE,
+        'creado': datetime.datetime.now().isoformat(timespec='seconds'),
+        'versiones': {'numpy': np.__version__, 'pandas': pd.__version__, 'scikit-learn': sklearn.__version__},
+        'pipeline': {
+            'numeric_cols': list(prep.numeric_cols),
+            'categorical_cols': list(prep.categorical_cols),
+            'categorias': [[_json(v) for v in cats] for cats in prep.ohe.categories_],
+            'target_column': pca_target.target_column,
+            'n_components': int(pca.n_components_),
+            'whiten': bool(pca.whiten),
+            'n_samples': int(getattr(pca, 'n_samples_', 0)),
+            'noise_variance': float(pca.noise_variance_),
+            'pca_feature_names': [str(c) for c in getattr(pca, 'feature_names_in_', [])],
+        },
+        'bosque': {
+            'profundidad': bosque.profundidad,
+            'n_estimators': bosque.n_estimators,
+            'feature_names': None if bosque.feature_names_in_ is None else [str(c) for c in bosque.feature_names_in_],
+        },
+        'arreglos': descripcion,
+    }
+    with open(os.path.join(temporal, MANIFIESTO), 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+
+    # El paquete vigente se aparta antes del cambio y se restaura si el cambio falla
+    anterior = None
+    if os.path.isdir(directorio):
+        anterior = f'{directorio}.{os.getpid()}.anterior'
+        shutil.rmtree(anterior, ignore_errors=True)
+        os.replace(directorio, anterior)
+    try:
+        os.replace(temporal, directorio)
+    except OSError:
+        if anterior is not None:
+            os.replace(anterior, directorio)
+        raise
+    if anterior is not None:
+        shutil.rmtree(anterior, ignore_errors=True)
+    return manifiesto
+
+
+def leer_manifiesto(directorio):
+    """Manifest of a bundle, after checking its format and version."""
+    ruta = os.path.join(directorio, MANIFIESTO)
+    if not os.path.exists(ruta):
+        raise ErrorPaquete(f"No hay {MANIFIESTO} en '{directorio}'.")
+    with open(ruta, encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    if manifiesto.get('formato') != FORMATO:
+        raise ErrorPaquete(f"'{directorio}' no es un paquete {FORMATO}.")
+    if manifiesto.get('version') != VERSION_PAQUETE:
+        raise ErrorPaquete(f"Versión de paquete {manifiesto.get('version')} no soportada "
+                           f"(se esperaba {VERSION_PAQUETE}).")
+    return manifiesto
+
+
+def _cargar_arreglos(directorio, manifiesto, mmap):
+    """Opens every array (memory-mapped when mmap) and checks dtype and shape against the manifest."""
+    arreglos = {}
+    for nombre, info in manifiesto['arreglos'].items():
+        arreglo = np.load(os.path.join(directorio, info['archivo']), mmap_mode='r' if mmap else None,
+                          allow_pickle=False)
+        if arreglo.dtype.str != info['dtype'] or list(arreglo.shape) != info['shape']:
+            raise ErrorPaquete(f"'{info['archivo']}' no coincide con el manifest "
+                               f"({arreglo.dtype.str} {list(arreglo.shape)}).")
+        arreglos[nombre] = arreglo
+    return arreglos
+
+
+def _validar_esquema(manifiesto, arreglos):
+    """Consistency between the pipeline columns, the PCA input and the forest features."""
+    p = manifiesto['pipeline']
+    n_ohe = sum(len(c) - 1 for c in p['categorias'])  # drop='first'
+    n_entrada = len([c for c in p['numeric_cols'] if c != p['target_column']]) + n_ohe
+    if len(p['categorias']) != len(p['categorical_cols']):
+        raise ErrorPaquete("Las categorías no corresponden a las columnas categóricas.")
+    if arreglos['scaler_mean'].shape != (len(p['numeric_cols']),):
+        raise ErrorPaquete("Las estadísticas del escalador no corresponden a las columnas numéricas.")
+    if arreglos['pca_components'].shape != (p['n_components'], n_entrada):
+        raise ErrorPaquete(f"El PCA espera {arreglos['pca_components'].shape[1]} features y el "
+                           f"preprocesamiento produce {n_entrada}.")
+    nombres = manifiesto['bosque']['feature_names']
+    salida_pca = {f'PCA_{i+1}' for i in range(p['n_components'])} | {p['target_column']}
+    if nombres is not None and not set(nombres) <= salida_pca:
+        raise ErrorPaquete("Las features del bosque no son columnas de salida del PCA.")
+
+
+def _encoder(categorical_cols, categorias):
+    """OneHotEncoder fitted on a small frame that holds exactly the stored categories."""
+    largo = max((len(c) for c in categorias), default=1)
+    marco = pd.DataFrame({
+        col: [cats[i % len(cats)] if cats else np.nan for i in range(largo)]
+        for col, cats in zip(categorical_cols, categorias)
+    }, columns=categorical_cols)
+    return OneHotEncoder(drop='first', handle_unknown='ignore', sparse_output=False).fit(marco)
+
+
+def _pipeline(manifiesto, arreglos):
+    """Rebuilds the Limpieza -> Preprocesamiento -> PCAConY pipeline from the bundle."""
+    p = manifiesto['pipeline']
+    prep = Preprocesador()
+    prep.numeric_cols = p['numeric_cols']
+    prep.categorical_cols = p['categorical_cols']
+    prep.ohe = _encoder(prep.categorical_cols, p['categorias'])
+
+    scaler = StandardScaler()
+    scaler.mean_ = arreglos['scaler_mean']
+    scaler.scale_ = arreglos['scaler_scale']
+    scaler.var_ = arreglos.get('scaler_var')
+    scaler.n_features_in_ = len(prep.numeric_cols)
+    scaler.feature_names_in_ = np.asarray(prep.numeric_cols, dtype=object)
+    scaler.n_samples_seen_ = p['n_samples']
+    prep.scaler = scaler
+
+    pca_target = PCAWithTarget(target_column=p['target_column'], n_components=p['n_components'])
+    pca = pca_target.pca
+    pca.whiten = p['whiten']
+    pca.n_components_ = p['n_components']
+    pca.components_ = arreglos['pca_components']
+    pca.mean_ = arreglos['pca_mean']
+    pca.explained_variance_ = arreglos['pca_explained_variance']
+    pca.explained_variance_ratio_ = arreglos['pca_explained_variance_ratio']
+    pca.singular_values_ = arreglos['pca_singular_values']
+    pca.noise_variance_ = p['noise_variance']
+    pca.n_samples_ = p['n_samples']
+    pca.n_features_in_ = pca.components_.shape[1]
+    if p['pca_feature_names']:
+        pca.feature_names_in_ = np.asarray(p['pca_feature_names'], dtype=object)
+
+    limpieza = FunctionTransformer(limpieza_sin_categoricas)
+    limpieza.fit(pd.DataFrame())
+    return Pipeline([("Limpieza", limpieza), ("Preprocesamiento", prep), ("PCAConY", pca_target)])
+
+
+def _bosque(manifiesto, arreglos):
+    b = manifiesto['bosque']
+    nombres = b['feature_names']
+    return BosqueCompilado(
+        feature=arreglos['bosque_feature'], umbral=arreglos['bosque_umbral'],
+        izquierdo=arreglos['bosque_izquierdo'], derecho=arreglos['bosque_derecho'],
+        nan_izquierda=arreglos['bosque_nan_izquierda'], valores=arreglos['bosque_valores'],
+        raices=arreglos['bosque_raices'], profundidad=b['profundidad'], classes=arreglos['bosque_classes'],
+        feature_names=None if nombres is None else np.asarray(nombres, dtype=object),
+    )
+
+
+def cargar_paquete(directorio=PAQUETE_PATH, mmap=True):
+    """
+    Loads a bundle and returns (pipeline, bosque) with the same interface as
+    scoring.cargar_artefactos. The forest is a BosqueCompilado over the
+    memory-mapped arrays, with the same predictions as the original model.
+    """
+    manifiesto = leer_manifiesto(directorio)
+    arreglos = _cargar_arreglos(directorio, manifiesto, mmap)
+    _validar_esquema(manifiesto, arreglos)
+    return _pipeline(manifiesto, arreglos), _bosque(manifiesto, arreglos)
+
+
+def paquete_disponible(directorio=PAQUETE_PATH):
+    """directorio when it holds a bundle manifest, otherwise None."""
+    return directorio if os.path.exists(os.path.join(directorio, MANIFIESTO)) else None
+
+
+def cargar_modelo(paquete_path=None, pipeline_path=None, model_path=None):
+    """
+    Bundle at paquete_path when given (ErrorPaquete when it holds none),
+    otherwise the pickled artifacts through scoring.cargar_artefactos. Use
+    paquete_disponible() to load the default bundle only when it exists.
+    """
+    if paquete_path:
+        return cargar_paquete(paquete_path)
+    return cargar_artefactos(pipeline_path or PIPELINE_PATH, model_path or MODEL_PATH)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el pipeline y el modelo a un paquete sin pickle.")
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    parser.add_argument('--salida', default=PAQUETE_PATH)
+    args = parser.parse_args()
+
+    pipeline, model = cargar_artefactos(args.pipeline, args.modelo)
+    manifiesto = exportar_paquete(pipeline, model, args.salida)
+    total = sum(os.path.getsize(os.path.join(args.salida, i['archivo'])) for i in manifiesto['arreglos'].values())
+    print(f"Paquete v{VERSION_PAQUETE} en {args.salida}: {len(manifiesto['arreglos'])} arreglos, "
+          f"{total / 1024**2:,.1f} MB, {manifiesto['bosque']['n_estimators']} árboles")
+
+
+if __name__ == '__main__':
+    main()
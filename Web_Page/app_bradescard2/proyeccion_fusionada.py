@@ -0,0 +1,168 @@
+# proyeccion_fusionada.py
+# Ruta de inferencia que combina Preprocesador (StandardScaler + OneHotEncoder)
+# y PCAWithTarget en una sola proyección afín. Como el escalado y el PCA son
+# lineales, sus parámetros se pliegan en una matriz y un vector precalculados:
+#
+#   PCA = ((x_num - mu) / s) @ W_num + W_cat[categorías] + b
+#
+# La estandarización (x - mu) / s se hace en float64 al copiar cada columna al
+# bloque; solo el producto con W_num corre en la precisión elegida. Plegar mu en
+# b obligaría a restar números grandes casi iguales (días desde la fecha base,
+# saldos) después del producto, y en float32 eso pierde precisión.
+#
+# Las categóricas no se expanden a one-hot: cada valor apunta directamente a su
+# fila de W_cat. El resultado se escribe en un buffer preasignado, bloque por
+# bloque, sin los DataFrames intermedios del pipeline original.
+#
+# Tolerancia: en float64 el resultado coincide con el pipeline original hasta
+# errores de redondeo (|diferencia| <= 1e-9 * max(1, |valor|)); en float32 la
+# diferencia relativa medida es del orden de 1e-6. Un valor justo en un umbral de un
+# árbol puede cambiar de rama, así que la ruta exacta sigue siendo el pipeline.
+# Variable_objetivo pasa por el StandardScaler del Preprocesador antes de llegar
+# al modelo, así que se vuelve a adjuntar escalada con las mismas estadísticas.
+
+import numpy as np
+import pandas as pd
+
+TOLERANCIA_FLOAT64 = 1e-9
+TOLERANCIA_FLOAT32 = 1e-5
+FILAS_POR_BLOQUE = 65_536
+
+
+class ProyeccionFusionada:
+    """
+    Fused equivalent of Preprocesador.transform followed by PCAWithTarget.transform.
+    Build it with desde_pipeline(pipeline) from the fitted pipeline; with
+    dtype=np.float32 the matrices, the buffer and the product are single precision.
+    """
+    def __init__(self, numeric_cols, categorical_cols, media, escala, W_num, W_cat, categorias, filas_cat, b,
+                 target_column, n_components, dtype=np.float64, target_media=0.0, target_escala=1.0):
+        self.dtype = np.dtype(dtype)
+        self.numeric_cols = numeric_cols
+        self.categorical_cols = categorical_cols
+        # Estandarización de las numéricas, siempre en float64
+        self.media = np.asarray(media, dtype=np.float64)
+        self.escala = np.asarray(escala, dtype=np.float64)
+        self.W_num = W_num.astype(self.dtype)
+        self.W_cat = W_cat.astype(self.dtype)
+        self.categorias = categorias
+        self.filas_cat = filas_cat
+        self.b = b.astype(self.dtype)
+        self.target_column = target_column
+        self.target_media = target_media
+        self.target_escala = target_escala
+        self.n_components = n_components
+        self.columnas = [f'PCA_{i+1}' for i in range(n_components)]
+
+    @classmethod
+    def desde_pipeline(cls, pipeline, dtype=np.float64):
+        """Folds the fitted Preprocesamiento and PCAConY steps into one projection."""
+        prep = pipeline.named_steps['Preprocesamiento']
+        pca_target = pipeline.named_steps['PCAConY']
+        pca = pca_target.pca
+        target = pca_target.target_column
+
+        nombres = list(prep.numeric_cols) + list(prep.ohe.get_feature_names_out(prep.categorical_cols))
+        componentes = pca.components_
+        if pca.whiten:
+            componentes = componentes / np.sqrt(pca.explained_variance_)[:, None]
+        # Columna de cada nombre en la entrada del PCA (el target se descarta)
+        entrada_pca = [n for n in nombres if n != target]
+        posicion = {n: k for k, n in enumerate(entrada_pca)}
+
+        # Parte numérica: ((x - mu) / s) @ C.T; mu y s se aplican al llenar el bloque
+        numeric_cols = [c for c in prep.numeric_cols if c != target]
+        idx_num = [list(prep.numeric_cols).index(c) for c in numeric_cols]
+        mu = prep.scaler.mean_[idx_num] if prep.scaler.mean_ is not None else np.zeros(len(idx_num))
+        s = prep.scaler.scale_[idx_num] if prep.scaler.scale_ is not None else np.ones(len(idx_num))
+        C_num = componentes[:, [posicion[c] for c in numeric_cols]]
+        W_num = np.ascontiguousarray(C_num.T)
+        b = -pca.mean_ @ componentes.T
+
+        # El target no entra al PCA pero sí al modelo, escalado como columna numérica
+        target_media, target_escala = 0.0, 1.0
+        if target in list(prep.numeric_cols):
+            t = list(prep.numeric_cols).index(target)
+            if prep.scaler.mean_ is not None:
+                target_media = float(prep.scaler.mean_[t])
+            if prep.scaler.scale_ is not None:
+                target_escala = float(prep.scaler.scale_[t])
+
+        # Parte categórica: una fila de W_cat por categoría codificada y una fila
+        # de ceros compartida por la categoría eliminada (drop='first') y las
+        # desconocidas (handle_unknown='ignore')
+        nombres_ohe = list(prep.ohe.get_feature_names_out(prep.categorical_cols))
+        W_cat = [componentes[:, [posicion[n] for n in nombres_ohe]].T, np.zeros((1, len(b)))]
+        fila_cero = len(nombres_ohe)
+        categorias, filas_cat = [], []
+        inicio = 0
+        drop_idx = prep.ohe.drop_idx_
+        for k, cats in enumerate(prep.ohe.categories_):
+            descartada = None if drop_idx is None else drop_idx[k]
+            filas = np.full(len(cats) + 1, fila_cero, dtype=np.int64)  # último: desconocida
+            siguiente = inicio
+            for j in range(len(cats)):
+                if descartada is not None and j == descartada:
+                    continue
+                filas[j] = siguiente
+                siguiente += 1
+            categorias.append(cats)
+            filas_cat.append(filas)
+            inicio = siguiente
+
+        return cls(numeric_cols, list(prep.categorical_cols), mu, s, W_num, np.concatenate(W_cat),
+                   categorias, filas_cat, b, target, pca.n_components_, dtype, target_media, target_escala)
+
+    def _codigos(self, valores, k):
+        """Position of each value in categories_[k]; len(categories_[k]) for unknown values."""
+        cats = self.categorias[k]
+        nulos_cat = pd.isna(cats)
+        codigos = pd.Categorical(valores, categories=cats[~nulos_cat]).codes.astype(np.int64)
+        # Categorical numera sin el NaN; se traduce a la posición en categories_
+        posiciones = np.flatnonzero(~nulos_cat)
+        codigos = np.where(codigos >= 0, posiciones[np.maximum(codigos, 0)], len(cats))
+        if nulos_cat.any():
+            codigos[pd.isna(valores)] = np.flatnonzero(nulos_cat)[0]
+        return codigos
+
+    def transformar_arreglo(self, X, out=None):
+        """
+        Writes the n_components PCA features of the cleaned frame X into out
+        (allocated when None) and returns it. Rows are processed in blocks so
+        the only full-size allocation is the output buffer. Numeric columns are
+        standardized in float64 before they are cast to the buffer dtype.
+        """
+        W_num, W_cat, b = self.W_num, self.W_cat, self.b
+        n = len(X)
+        if out is None:
+            out = np.empty((n, self.n_components), dtype=self.dtype)
+
+        numericas = [X[c].to_numpy() for c in self.numeric_cols]
+        filas_cat = [self.filas_cat[k][self._codigos(X[c].to_numpy(), k)]
+                     for k, c in enumerate(self.categorical_cols)]
+
+        bloque = np.empty((min(n, FILAS_POR_BLOQUE), len(numericas)), dtype=self.dtype)
+        for inicio in range(0, n, FILAS_POR_BLOQUE):
+            fin = min(inicio + FILAS_POR_BLOQUE, n)
+            x = bloque[:fin - inicio]
+            for j, columna in enumerate(numericas):
+                x[:, j] = (columna[inicio:fin].astype(np.float64) - self.media[j]) / self.escala[j]
+            destino = out[inicio:fin]
+            np.matmul(x, W_num, out=destino)
+            destino += b
+            for filas in filas_cat:
+                destino += W_cat[filas[inicio:fin]]
+        return out
+
+    def transform(self, X):
+        """
+        Same output as PCAWithTarget.transform(Preprocesador.transform(X)) (within
+        the tolerance above), but keeping the index of X. The target column is
+        standardized with the fitted scaler statistics, like in the pipeline.
+        """
+        df_pca = pd.DataFrame(self.transformar_arreglo(X), columns=self.columnas, index=X.index,
+                              copy=False)
+        if self.target_column in X.columns:
+            objetivo = X[self.target_column].to_numpy(dtype=np.float64)
+            df_pca[self.target_column] = (objetivo - self.target_media) / self.target_escala
+        return df_pca
@@ -0,0 +1,247 @@
+# resultados_lote.py
+# Resultados de la predicción en lote guardados del lado del servidor. La tabla
+# (ID_Cliente, Socio, Producto, Saldo_total, Score_pago, Prediccion_Modelo) se
+# escribe una vez en Parquet y se lee con memory mapping; la página muestra una
+# grilla paginada, ordenable y filtrable que solo materializa la página visible,
+# y la descarga se escribe por bloques a un archivo en disco (CSV o Parquet) que
+# el botón de descarga solo lee cuando el usuario hace clic.
+# Sin pyarrow la tabla se queda en memoria y solo se exporta CSV.
+
+import os
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from buscador_clientes import pagina
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Sin pyarrow la tabla vive en memoria
+    pa = None
+    pq = None
+
+COLUMNAS_RESULTADO = ['ID_Cliente', 'Socio', 'Producto', 'Saldo_total', 'Score_pago', 'Prediccion_Modelo']
+COLUMNAS_FILTRO = ['Socio', 'Producto', 'Prediccion_Modelo']
+RESULTADOS_DIR = os.path.join('data', 'cache', 'resultados')
+TAMANO_PAGINA = 100
+FILAS_POR_BLOQUE = 100_000
+# Consultas (orden + filtros) recordadas por tabla; cambiar de página no recalcula
+MAX_CONSULTAS = 16
+PREFIJO_EXPORTACION = 'exportacion_'
+# Exportaciones más viejas que esto (segundos) se borran: su sesión ya terminó
+MAX_EDAD_EXPORTACION = 6 * 3600
+
+
+def tabla_resultados(cartera, predicciones):
+    """Result rows of the scored clients, built from the shared portfolio and the predictions."""
+    filas = cartera.df.index.get_indexer(predicciones.index)
+    tabla = cartera.vista([c for c in COLUMNAS_RESULTADO[1:-1] if c in cartera.df.columns], filas)
+    tabla.insert(0, 'ID_Cliente', cartera.ids[filas])
+    tabla['Prediccion_Modelo'] = predicciones.to_numpy()
+    return tabla.reset_index(drop=True)
+
+
+class ResultadosLote:
+    """
+    Batch results of one run, stored as a memory-mapped Parquet table (or as a
+    frame without pyarrow). consultar returns the row positions of a sort and
+    filter combination; filas materializes only the requested positions.
+    """
+    def __init__(self, tabla=None, df=None, ruta=None):
+        self.tabla = tabla
+        self.df = df
+        self.ruta = ruta
+        self.columnas = tabla.column_names if tabla is not None else list(df.columns)
+        self._columnas = {}
+        self._consultas = OrderedDict()
+
+    @classmethod
+    def guardar(cls, df, huella, directorio=RESULTADOS_DIR):
+        """Writes the results of a run to Parquet (atomic rename) and opens them memory-mapped."""
+        if pq is None:
+            return cls(df=df)
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, f'{huella}.parquet')
+        temporal = f'{ruta}.{os.getpid()}.tmp'
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temporal, row_group_size=256_000)
+        os.replace(temporal, ruta)
+        return cls(tabla=pq.read_table(ruta, memory_map=True), ruta=ruta)
+
+    def __len__(self):
+        return self.tabla.num_rows if self.tabla is not None else len(self.df)
+
+    def columna(self, nombre):
+        """Whole column as a Series (read once, dictionary columns as categoricals)."""
+        if nombre not in self._columnas:
+            if self.tabla is not None:
+                self._columnas[nombre] = self.tabla.column(nombre).to_pandas()
+            else:
+                self._columnas[nombre] = self.df[nombre].reset_index(drop=True)
+        return self._columnas[nombre]
+
+    def opciones(self, nombre):
+        """Sorted non-null values of a column, for the filters."""
+        return sorted(pd.unique(self.columna(nombre).dropna()).tolist())
+
+    def consultar(self, orden=None, ascendente=True, filtros=None):
+        """
+        Row positions matching filtros {column: [values]}, sorted by orden
+        (nulls last in both directions; ties keep the stored order).
+        """
+        filtros = {c: tuple(v) for c, v in (filtros or {}).items() if v}
+        clave = (orden, ascendente, tuple(sorted(filtros.items())))
+        if clave in self._consultas:
+            self._consultas.move_to_end(clave)
+            return self._consultas[clave]
+
+        mascara = np.ones(len(self), dtype=bool)
+        for columna, valores in filtros.items():
+            mascara &= self.columna(columna).isin(valores).to_numpy()
+        posiciones = np.flatnonzero(mascara)
+
+        if orden is not None:
+            # Rangos densos de los valores (-1 para nulos): mismo criterio para números, texto y categorías
+            rangos, _ = pd.factorize(self.columna(orden), sort=True)
+            rangos = rangos[posiciones]
+            validos = rangos >= 0
+            if not ascendente:
+                rangos = np.where(validos, rangos.max(initial=0) - rangos, rangos)
+            rangos = np.where(validos, rangos, np.iinfo(rangos.dtype).max)
+            posiciones = posiciones[np.argsort(rangos, kind='stable')]
+
+        self._consultas[clave] = posiciones
+        if len(self._consultas) > MAX_CONSULTAS:
+            self._consultas.popitem(last=False)
+        return posiciones
+
+    def filas(self, posiciones):
+        """Frame with only the rows at posiciones, in that order."""
+        if self.tabla is not None:
+            return self.tabla.take(pa.array(posiciones, type=pa.int64())).to_pandas()
+        return self.df.iloc[posiciones].reset_index(drop=True)
+
+    def _bloques(self, posiciones, filas_por_bloque):
+        if posiciones is None:
+            for inicio in range(0, len(self), filas_por_bloque):
+                if self.tabla is not None:
+                    yield self.tabla.slice(inicio, filas_por_bloque)
+                else:
+                    yield self.df.iloc[inicio:inicio + filas_por_bloque]
+            return
+        for inicio in range(0, len(posiciones), filas_por_bloque):
+            seleccion = posiciones[inicio:inicio + filas_por_bloque]
+            if self.tabla is not None:
+                yield self.tabla.take(pa.array(seleccion, type=pa.int64()))
+            else:
+                yield self.df.iloc[seleccion]
+
+    def exportar(self, destino, formato='csv', posiciones=None, filas_por_bloque=FILAS_POR_BLOQUE):
+        """
+        Writes the rows at posiciones (all rows when None) to destino, one block
+        of filas_por_bloque rows at a time; only one block is in memory.
+        """
+        if formato == 'parquet':
+            if pq is None:
+                raise ValueError("La exportación a Parquet requiere pyarrow.")
+            with pq.ParquetWriter(destino, self.tabla.schema) as escritor:
+                for bloque in self._bloques(posiciones, filas_por_bloque):
+                    escritor.write_table(bloque)
+            return destino
+
+        with open(destino, 'w', encoding='utf-8', newline='') as f:
+            for numero, bloque in enumerate(self._bloques(posiciones, filas_por_bloque)):
+                if self.tabla is not None:
+                    bloque = bloque.to_pandas()
+                bloque.to_csv(f, header=(numero == 0), index=False)
+        return destino
+
+
+def limpiar_exportaciones(directorio=RESULTADOS_DIR, max_edad=MAX_EDAD_EXPORTACION, conservar=()):
+    """
+    Deletes the export files older than max_edad seconds. Streamlit does not
+    tell when a session ends, so exports of closed sessions are removed by age;
+    the paths in conservar are kept. Returns the number of files removed.
+    """
+    if not os.path.isdir(directorio):
+        return 0
+    limite = time.time() - max_edad
+    borrados = 0
+    for nombre in os.listdir(directorio):
+        ruta = os.path.join(directorio, nombre)
+        if not nombre.startswith(PREFIJO_EXPORTACION) or ruta in conservar:
+            continue
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+                borrados += 1
+        except OSError:  # Otra sesión la borró primero
+            continue
+    return borrados
+
+
+def _leer_exportacion(destino):
+    """Callable for the download button: the file is read only when the user clicks."""
+    def leer():
+        with open(destino, 'rb') as f:
+            return f.read()
+    return leer
+
+
+def grilla_resultados(resultados, clave):
+    """
+    Paginated, sortable and filterable view of the batch results plus the
+    export. Only the visible page is read from the table and sent to the browser.
+    """
+    columnas_filtro = [c for c in COLUMNAS_FILTRO if c in resultados.columnas]
+    filtros = {}
+    for col, columna in zip(st.columns(max(len(columnas_filtro), 1)), columnas_filtro):
+        filtros[columna] = col.multiselect(columna, resultados.opciones(columna), key=f'{clave}_{columna}')
+
+    col_orden, col_sentido = st.columns([3, 1])
+    orden = col_orden.selectbox("Ordenar por", ['(orden original)'] + resultados.columnas, key=f'{clave}_orden')
+    sentido = col_sentido.radio("Sentido", ["Ascendente", "Descendente"], key=f'{clave}_sentido')
+    orden = None if orden == '(orden original)' else orden
+
+    posiciones = resultados.consultar(orden, sentido == "Ascendente", filtros)
+    if len(posiciones) == 0:
+        st.info("Ningún resultado coincide con los filtros.")
+        return
+
+    _, paginas = pagina(posiciones, 1, TAMANO_PAGINA)
+    numero = st.number_input(f"Página (de {paginas:,}; {len(posiciones):,} clientes)", min_value=1,
+                             max_value=paginas, value=1, step=1, key=f'{clave}_pagina')
+    visibles, _ = pagina(posiciones, numero, TAMANO_PAGINA)
+    st.dataframe(resultados.filas(visibles), use_container_width=True, hide_index=True)
+
+    formatos = ["CSV", "Parquet"] if pq is not None else ["CSV"]
+    col_formato, col_boton = st.columns([1, 3])
+    formato = col_formato.radio("Formato", formatos, key=f'{clave}_formato', horizontal=True)
+    if col_boton.button("Preparar descarga de los resultados filtrados", key=f'{clave}_preparar'):
+        extension = formato.lower()
+        os.makedirs(RESULTADOS_DIR, exist_ok=True)
+        anterior = st.session_state.get(f'{clave}_exportacion')
+        limpiar_exportaciones(conservar=() if anterior is None else (anterior[0],))
+        descriptor, destino = tempfile.mkstemp(suffix=f'.{extension}', prefix=PREFIJO_EXPORTACION,
+                                               dir=RESULTADOS_DIR)
+        os.close(descriptor)
+        with st.spinner(f"Escribiendo {len(posiciones):,} filas por bloques..."):
+            seleccion = None if len(posiciones) == len(resultados) and orden is None else posiciones
+            resultados.exportar(destino, extension, seleccion)
+        # Solo se conserva la última exportación de la sesión
+        if anterior is not None and os.path.exists(anterior[0]):
+            os.remove(anterior[0])
+        st.session_state[f'{clave}_exportacion'] = (destino, extension)
+
+    exportacion = st.session_state.get(f'{clave}_exportacion')
+    if exportacion is not None and os.path.exists(exportacion[0]):
+        destino, extension = exportacion
+        # Con un callable el archivo no se lee en cada rerun, solo al hacer clic
+        st.download_button(f"Descargar {extension.upper()} ({os.path.getsize(destino) / 1024**2:,.1f} MB)",
+                           _leer_exportacion(destino), file_name=f'predicciones.{extension}',
+                           mime='text/csv' if extension == 'csv' else 'application/octet-stream',
+                           key=f'{clave}_descargar', on_click='ignore')
@@ -0,0 +1,124 @@
+# scoring.py
+# Funciones compartidas para cargar los artefactos del modelo y aplicar el
+# pipeline ajustado conservando el índice original de cada cliente.
+
+import sys
+
+import joblib
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from instrumentacion import etapa
+from monitor_deriva import observar_entrada, observar_predicciones, observar_transformado
+from pipeline_utils import (FECHAS_DIA_PRIMERO, Preprocesador, PCAWithTarget, es_fecha_compacta,
+                            limpieza_sin_categoricas)
+
+PIPELINE_PATH = 'fitted_pipeline.pkl'
+MODEL_PATH = 'random_forest_model.pkl'
+TARGET_COLUMN = 'Variable_objetivo'
+
+
+def registrar_clases_pipeline():
+    """
+    Injects the custom pipeline objects into __main__. The pipeline was pickled
+    from a notebook, so joblib looks for them there when unpickling.
+    """
+    sys.modules['__main__'].limpieza_sin_categoricas = limpieza_sin_categoricas
+    sys.modules['__main__'].Preprocesador = Preprocesador
+    sys.modules['__main__'].PCAWithTarget = PCAWithTarget
+
+
+def cargar_artefactos(pipeline_path=PIPELINE_PATH, model_path=MODEL_PATH):
+    """Loads the fitted pipeline and the random forest model."""
+    registrar_clases_pipeline()
+    pipeline = joblib.load(pipeline_path)
+    model = joblib.load(model_path)
+    return pipeline, model
+
+
+def _columnas_fecha(bloque):
+    """Date columns of a chunk still stored as text."""
+    return [col for col in bloque.columns
+            if (col.startswith('Fecha') or col.startswith('Prox'))
+            and not (bloque[col].dtype.kind == 'M' or es_fecha_compacta(bloque[col]))]  # Ya convertidas
+
+
+def adivinar_formatos_fechas(bloque, formatos, dayfirst=FECHAS_DIA_PRIMERO):
+    """
+    Guesses the format of every text date column of the chunk not yet in
+    formatos from its first non-null value. Call it on whole chunks before
+    parsing a subset of rows: a subset can start with an ambiguous date
+    (e.g. 01/02/2024) that the full file would not. An ambiguous first value
+    is read day-first by default (FECHAS_DIA_PRIMERO), like the portfolio file.
+    """
+    for col in _columnas_fecha(bloque):
+        if col not in formatos:
+            validos = bloque[col].dropna()
+            if not validos.empty:
+                formatos[col] = guess_datetime_format(str(validos.iloc[0]), dayfirst=dayfirst)
+    return formatos
+
+
+def fijar_formato_fechas(bloque, formatos, dayfirst=FECHAS_DIA_PRIMERO):
+    """
+    Parses the date columns of a chunk with a fixed format. pd.to_datetime infers
+    the format from the first value it sees, so without this every chunk could
+    get its own format. The format of each column is guessed once from its
+    first non-null value (ambiguous values day-first, see adivinar_formatos_fechas)
+    and reused for every following chunk.
+    """
+    adivinar_formatos_fechas(bloque, formatos, dayfirst)
+    for col in _columnas_fecha(bloque):
+        if col in formatos:
+            bloque[col] = pd.to_datetime(bloque[col], format=formatos[col], errors='coerce')
+    return bloque
+
+
+def transformar_conservando_indice(pipeline, df, proyeccion=None):
+    """
+    Applies the fitted pipeline step by step. PCAWithTarget resets the index,
+    so the index of the rows that survive the cleaning step is re-attached to
+    the PCA output. The dummy target column is added when it is missing.
+    When the cleaning step drops every row, an empty frame is returned.
+    With a ProyeccionFusionada, the Preprocesamiento and PCAConY steps are
+    replaced by its single affine projection. Every step is a stage of the
+    active instrumentacion profile, if any, and the raw rows and PCA_* output
+    are fed to the active drift monitor (monitor_deriva.py), if any.
+    """
+    if TARGET_COLUMN not in df.columns:
+        df = df.assign(**{TARGET_COLUMN: 0})
+    observar_entrada(df)
+
+    with etapa('Limpieza', df) as medicion:
+        datos = medicion.salida(pipeline.named_steps['Limpieza'].transform(df))
+    if datos.empty:
+        # Ninguna fila pasó la limpieza; OneHotEncoder y StandardScaler no aceptan 0 filas
+        return pd.DataFrame(index=datos.index)
+    if proyeccion is not None:
+        with etapa('ProyeccionFusionada', datos) as medicion:
+            datos = medicion.salida(proyeccion.transform(datos))
+        observar_transformado(datos)
+        return datos
+    indice = datos.index
+    for nombre, paso in pipeline.steps[1:]:
+        with etapa(nombre, datos) as medicion:
+            datos = medicion.salida(paso.transform(datos))
+
+    datos.index = indice
+    observar_transformado(datos)
+    return datos
+
+
+def predecir(pipeline, model, df, proyeccion=None):
+    """
+    Returns the model predictions as a Series indexed by the original index of
+    the rows that survived the cleaning step.
+    """
+    transformed = transformar_conservando_indice(pipeline, df, proyeccion)
+    if transformed.empty:
+        return pd.Series([], index=transformed.index, dtype='int64', name='Prediccion_Modelo')
+    with etapa('Prediccion', transformed) as medicion:
+        predicciones = medicion.salida(model.predict(transformed))
+    predicciones = pd.Series(predicciones, index=transformed.index, name='Prediccion_Modelo')
+    observar_predicciones(predicciones)
+    return predicciones
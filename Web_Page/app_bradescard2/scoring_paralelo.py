@@ -0,0 +1,123 @@
+# scoring_paralelo.py
+# Predicción en paralelo por fragmentos de filas. Cada proceso del pool carga el
+# pipeline y el modelo una sola vez al arrancar; las tareas solo envían las filas
+# de su fragmento y los resultados se unen en el orden original.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+import numpy as np
+import pandas as pd
+
+from instrumentacion import perfil_activo, perfilar
+from monitor_deriva import MonitorDeriva, monitor_activo, monitorear
+from paquete_modelo import cargar_modelo
+from proyeccion_fusionada import ProyeccionFusionada
+from scoring import MODEL_PATH, PIPELINE_PATH, fijar_formato_fechas, predecir
+
+# Fragmentos más pequeños no compensan el costo de enviar las filas al proceso
+FILAS_MINIMAS_FRAGMENTO = 5_000
+
+# Artefactos del proceso trabajador (se cargan en _iniciar_trabajador)
+_pipeline = None
+_model = None
+_proyeccion = None
+
+
+def _iniciar_trabajador(pipeline_path, model_path, dtype_fusionado, paquete_path=None):
+    """
+    Loads the fitted artifacts once per worker process. BLAS is limited to one
+    thread per worker so N workers do not oversubscribe the cores. With a
+    bundle (paquete_modelo.py) the trees are memory-mapped and shared by all
+    workers through the page cache.
+    """
+    global _pipeline, _model, _proyeccion
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+    _pipeline, _model = cargar_modelo(paquete_path, pipeline_path, model_path)
+    if dtype_fusionado is not None:
+        _proyeccion = ProyeccionFusionada.desde_pipeline(_pipeline, dtype=dtype_fusionado)
+
+
+def _predecir_fragmento(fragmento):
+    return predecir(_pipeline, _model, fragmento, _proyeccion)
+
+
+def _predecir_fragmento_medido(fragmento, memoria, parametros_deriva):
+    # El perfil y el monitor del proceso padre no cruzan al trabajador: se miden aquí y se devuelven
+    perfil = monitor = None
+    with ExitStack() as pila:
+        if memoria is not None:
+            perfil = pila.enter_context(perfilar('fragmento', memoria=memoria, emitir=False))
+        if parametros_deriva is not None:
+            monitor = pila.enter_context(monitorear(MonitorDeriva(**parametros_deriva)))
+        predicciones = predecir(_pipeline, _model, fragmento, _proyeccion)
+    return predicciones, perfil, monitor
+
+
+def dividir_en_fragmentos(df, n_fragmentos):
+    """Splits the frame into contiguous row shards, preserving order and index."""
+    n_fragmentos = max(1, min(n_fragmentos, len(df) // FILAS_MINIMAS_FRAGMENTO))
+    limites = np.linspace(0, len(df), n_fragmentos + 1).astype(int)
+    return [df.iloc[inicio:fin] for inicio, fin in zip(limites[:-1], limites[1:])]
+
+
+class PuntuadorParalelo:
+    """
+    Process pool that runs limpieza_sin_categoricas, Preprocesador, PCAWithTarget
+    and the random forest predict on row shards. Use it as a context manager so
+    the worker processes are shut down at the end.
+
+    The date formats are fixed on the full frame before splitting, so a shard
+    that starts with an ambiguous date is parsed exactly like the serial path.
+    With dtype_fusionado (np.float64 or np.float32) the workers use the fused
+    projection of proyeccion_fusionada.py instead of the pipeline steps.
+    """
+    def __init__(self, n_workers=None, pipeline_path=PIPELINE_PATH, model_path=MODEL_PATH,
+                 dtype_fusionado=None, paquete_path=None):
+        self.n_workers = n_workers or os.cpu_count()
+        self.formatos = {}
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            initializer=_iniciar_trabajador,
+            initargs=(pipeline_path, model_path, dtype_fusionado, paquete_path),
+        )
+
+    def predecir(self, df):
+        """
+        Same contract as scoring.predecir: a Series of predictions indexed by the
+        original index of the rows that survived the cleaning step.
+        """
+        df = fijar_formato_fechas(df.copy(deep=False), self.formatos)
+        fragmentos = dividir_en_fragmentos(df, self.n_workers)
+        perfil = perfil_activo()
+        monitor = monitor_activo()
+        if perfil is None and monitor is None:
+            resultados = list(self._pool.map(_predecir_fragmento, fragmentos))
+        else:
+            resultados = []
+            medidos = self._pool.map(_predecir_fragmento_medido, fragmentos,
+                                     [perfil.memoria if perfil is not None else None] * len(fragmentos),
+                                     [monitor.parametros() if monitor is not None else None] * len(fragmentos))
+            for numero, (parcial, perfil_fragmento, monitor_fragmento) in enumerate(medidos):
+                if perfil is not None:
+                    perfil.combinar(perfil_fragmento.etapas, perfil_fragmento.filtros, fragmento=numero)
+                if monitor is not None:
+                    monitor.combinar(monitor_fragmento)
+                resultados.append(parcial)
+        predicciones = pd.concat(resultados)
+        predicciones.name = 'Prediccion_Modelo'
+        return predicciones
+
+    def cerrar(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
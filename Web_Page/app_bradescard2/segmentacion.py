@@ -0,0 +1,194 @@
+# segmentacion.py
+# Segmentación de clientes para Analisis_de_Riesgo.py. Los modelos se ajustan
+# sobre una muestra (MiniBatchKMeans y PCA aleatorizado o incremental) y luego
+# se aplican a toda la cartera en bloques. Los resultados se guardan en caché
+# por huella de datos y parámetros, así que los reruns de la página no vuelven
+# a escalar, agrupar ni proyectar nada. El candado solo protege la caché: el
+# cálculo corre fuera de él y quien pide una clave en curso espera solo a esa.
+
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.metrics import silhouette_score
+
+from pipeline_utils import es_fecha_compacta
+
+# Columnas excluidas del clustering de comportamiento (mismas que la página)
+COLUMNAS_EXCLUIDAS = ['Variable_objetivo', 'ID_Cliente', 'Score_pago', 'Nivel_de_Riesgo']
+MUESTRA_AJUSTE = 200_000
+MUESTRA_EVALUACION = 20_000
+# Puntos de la silueta por k: su costo es cuadrático en el número de puntos
+MUESTRA_SILUETA = 5_000
+FILAS_POR_BLOQUE = 500_000
+MAX_RESULTADOS = 8
+
+ResultadoSegmentacion = namedtuple('ResultadoSegmentacion', ['etiquetas', 'xy', 'resumen', 'parametros'])
+
+_resultados = OrderedDict()
+# Clave -> Event de los cálculos en curso
+_en_curso = {}
+_candado = threading.Lock()
+
+
+def matriz_escalada(df):
+    """
+    Numeric behaviour columns with nulls as 0, standardized with the mean and
+    standard deviation of the full portfolio (float32, one pass per column).
+    Dates stay out, as text in the default schema and as day offsets in the
+    compact one.
+    """
+    columnas = [c for c in df.select_dtypes(include=['number']).columns
+                if c not in COLUMNAS_EXCLUIDAS and not es_fecha_compacta(df[c])]
+    X = np.empty((len(df), len(columnas)), dtype=np.float32)
+    for j, columna in enumerate(columnas):
+        valores = df[columna].to_numpy(dtype=np.float64, na_value=0.0)
+        desviacion = valores.std()
+        X[:, j] = (valores - valores.mean()) / (desviacion if desviacion > 0 else 1.0)
+    return X
+
+
+def _muestra(n, tamano, seed):
+    if n <= tamano:
+        return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, tamano, replace=False))
+
+
+def _por_bloques(funcion, X, progreso=None):
+    """
+    Applies funcion to X in row blocks to bound the temporary memory;
+    progreso(hechos, total) is called after each block.
+    """
+    partes = []
+    for i in range(0, len(X), FILAS_POR_BLOQUE):
+        partes.append(funcion(X[i:i + FILAS_POR_BLOQUE]))
+        if progreso is not None:
+            progreso(min(i + FILAS_POR_BLOQUE, len(X)), len(X))
+    return np.concatenate(partes)
+
+
+def ajustar_kmeans(X, k, metodo='minibatch', muestra=MUESTRA_AJUSTE, seed=42):
+    """
+    Fits k-means on a sample of X. 'minibatch' uses MiniBatchKMeans; 'completo'
+    uses KMeans (n_init=10) like the original page, still on the sample.
+    """
+    filas = X[_muestra(len(X), muestra, seed)]
+    if metodo == 'completo':
+        modelo = KMeans(n_clusters=k, n_init=10, random_state=seed)
+    else:
+        modelo = MiniBatchKMeans(n_clusters=k, n_init=3, batch_size=4096, random_state=seed)
+    return modelo.fit(filas)
+
+
+def proyectar_2d(X, metodo='aleatorizado', muestra=MUESTRA_AJUSTE, seed=42, progreso=None):
+    """2-D PCA for the scatter: randomized SVD on a sample, or IncrementalPCA over every row."""
+    if metodo == 'incremental':
+        pca = IncrementalPCA(n_components=2, batch_size=max(FILAS_POR_BLOQUE // 10, 1000))
+        for i in range(0, len(X), FILAS_POR_BLOQUE):
+            bloque = X[i:i + FILAS_POR_BLOQUE]
+            if len(bloque) >= 2:
+                pca.partial_fit(bloque)
+    else:
+        pca = PCA(n_components=2, svd_solver='randomized', random_state=seed)
+        pca.fit(X[_muestra(len(X), muestra, seed)])
+    return _por_bloques(pca.transform, X, progreso).astype(np.float32)
+
+
+def resumen_por_cluster(df, etiquetas):
+    """Comparative table shown under the scatter."""
+    return df[['Saldo_total', 'Utilizacion', 'Score_pago', 'Socio']].groupby(etiquetas).agg(
+        Saldo_Total_Promedio=('Saldo_total', 'mean'),
+        Utilizacion_Promedio=('Utilizacion', 'mean'),
+        Score_Pago_Promedio=('Score_pago', 'mean'),
+        Numero_de_Clientes=('Socio', 'count')
+    ).rename_axis('Cluster').reset_index()
+
+
+def _calcular_una_vez(parametros, calcular):
+    """
+    Cached result of parametros, computed with calcular() outside the lock.
+    Callers asking for a key that is being computed wait on that key only; if
+    the run fails (or is cancelled), the next waiting caller computes it.
+    """
+    while True:
+        with _candado:
+            if parametros in _resultados:
+                _resultados.move_to_end(parametros)
+                return _resultados[parametros]
+            evento = _en_curso.get(parametros)
+            propio = evento is None
+            if propio:
+                evento = _en_curso[parametros] = threading.Event()
+        if not propio:
+            evento.wait()
+            continue
+        try:
+            resultado = calcular()
+            with _candado:
+                _resultados[parametros] = resultado
+                while len(_resultados) > MAX_RESULTADOS:
+                    _resultados.popitem(last=False)
+            return resultado
+        finally:
+            with _candado:
+                del _en_curso[parametros]
+            evento.set()
+
+
+def _etapa(progreso, inicio, fin):
+    """Maps the (hechos, total) progress of one step onto [inicio, fin] of the whole run."""
+    if progreso is None:
+        return None
+    return lambda hechos, total: progreso(inicio + (fin - inicio) * hechos / max(total, 1), 1.0)
+
+
+def segmentar_cartera(df, huella, k=3, metodo='minibatch', metodo_pca='aleatorizado',
+                      muestra=MUESTRA_AJUSTE, seed=42, progreso=None):
+    """
+    Cluster labels, 2-D projection and summary table of the whole portfolio,
+    cached by (fingerprint, parameters). Concurrent sessions asking for the same
+    key compute it once. progreso(hechos, total) reports the fraction done
+    after each step and block; it may raise to cancel the run.
+    """
+    parametros = (huella if huella is not None else id(df), len(df), k, metodo, metodo_pca, muestra, seed)
+
+    def calcular():
+        X = matriz_escalada(df)
+        if progreso is not None:
+            progreso(0.1, 1.0)
+        modelo = ajustar_kmeans(X, k, metodo, muestra, seed)
+        if progreso is not None:
+            progreso(0.3, 1.0)
+        etiquetas = _por_bloques(modelo.predict, X, _etapa(progreso, 0.3, 0.6)).astype(np.int32)
+        xy = proyectar_2d(X, metodo_pca, muestra, seed, _etapa(progreso, 0.6, 0.95))
+        del X
+        return ResultadoSegmentacion(etiquetas, xy, resumen_por_cluster(df, etiquetas), parametros)
+
+    return _calcular_una_vez(parametros, calcular)
+
+
+def _evaluar_un_k(X, k, seed):
+    modelo = MiniBatchKMeans(n_clusters=k, n_init=3, batch_size=4096, random_state=seed).fit(X)
+    return k, modelo.inertia_, silhouette_score(X, modelo.labels_, sample_size=min(MUESTRA_SILUETA, len(X)),
+                                                random_state=seed)
+
+
+def evaluar_k(df, huella, valores_k=range(2, 9), muestra=MUESTRA_EVALUACION, n_jobs=-1, seed=42):
+    """
+    Elbow (inertia) and silhouette for each k, fitted on the same sample of the
+    portfolio (the silhouette on a seeded subsample of MUESTRA_SILUETA points);
+    every k is evaluated in parallel. Cached like segmentar_cartera.
+    """
+    parametros = ('evaluar_k', huella if huella is not None else id(df), len(df),
+                  tuple(valores_k), muestra, seed)
+
+    def calcular():
+        X = matriz_escalada(df.iloc[_muestra(len(df), muestra, seed)])
+        filas = Parallel(n_jobs=n_jobs, prefer='threads')(delayed(_evaluar_un_k)(X, k, seed) for k in valores_k)
+        return pd.DataFrame(filas, columns=['k', 'Inercia', 'Silueta'])
+
+    return _calcular_una_vez(parametros, calcular)
@@ -0,0 +1,410 @@
+# servicio_scoring.py
+# Servicio HTTP de scoring para los sistemas de cobranza. Carga el pipeline y el
+# modelo una sola vez y agrupa las peticiones concurrentes en micro-lotes: las
+# que llegan dentro de una ventana corta (--max-espera-ms) se concatenan y pasan
+# juntas por un solo transform/predict. Solo usa la biblioteca estándar (asyncio)
+# para el servidor. Cada cliente se valida contra el esquema crudo que espera el
+# pipeline antes de entrar a la cola (400 si le faltan columnas o trae un número
+# mal formado), y si un micro-lote falla se vuelve a puntuar cada petición por
+# separado, así que una petición mala solo se falla a sí misma.
+#
+# Uso:
+#   python servicio_scoring.py --puerto 8000 --max-lote 256 --max-espera-ms 5
+#
+# Peticiones (esquema crudo de COLL_TEC_CONSOLIDADO, una clave por columna):
+#   POST /puntuar  {"cliente": {...}}        un cliente
+#   POST /puntuar  {"clientes": [{...}, ...]} varios clientes
+#   GET  /salud
+# Respuesta: {"resultados": [{"ID_Cliente": ..., "procesado": true, "prediccion": 1}, ...]}
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+import pandas as pd
+
+from bosque_compilado import BosqueCompilado, compilar_bosque
+from ingesta import COLUMNAS_TEXTO
+from instrumentacion import configurar_log, perfilar
+from paquete_modelo import cargar_modelo
+from proyeccion_fusionada import ProyeccionFusionada
+from scoring import MODEL_PATH, PIPELINE_PATH, TARGET_COLUMN, fijar_formato_fechas, predecir
+
+MAX_LOTE = 256
+MAX_ESPERA_MS = 5.0
+# Filas en cola antes de rechazar peticiones con 503 (backpressure); también el
+# máximo de clientes de una sola petición (413)
+MAX_PENDIENTES = 10_000
+MAX_BYTES_CUERPO = 16 * 1024**2
+# Columnas crudas que limpieza_sin_categoricas lee siempre, aunque no lleguen al modelo
+COLUMNAS_LIMPIEZA = (
+    [f'{c}_M{i}' for c in ('Saldo_total', 'Ciclo_atraso', 'Utilizacion', 'Canal_Pago') for i in range(1, 7)]
+    + ['Saldo_Mes_M1', 'Pago_minimo_M1', 'Canal_Pago', 'Limite_credito']
+)
+# Columnas que crea la limpieza (no vienen en el archivo crudo)
+_PREFIJOS_DERIVADOS = ('Activo_M', 'Deuda_M')
+MAX_FALTANTES_MENSAJE = 5
+
+
+class ErrorPeticion(Exception):
+    """Invalid request; carries the HTTP status to answer with."""
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def esquema_crudo(pipeline):
+    """
+    Raw columns a client record must have: the ones the cleaning step always
+    reads plus the Preprocesamiento inputs that come straight from the file.
+    """
+    prep = pipeline.named_steps['Preprocesamiento']
+    columnas = list(COLUMNAS_LIMPIEZA)
+    for columna in list(prep.categorical_cols) + list(prep.numeric_cols):
+        if columna != TARGET_COLUMN and not columna.startswith(_PREFIJOS_DERIVADOS) and columna not in columnas:
+            columnas.append(columna)
+    return columnas
+
+
+def _nombre_cliente(registros, posicion):
+    """Position of a record in the request, with its ID_Cliente when it has one."""
+    id_cliente = registros[posicion].get('ID_Cliente')
+    return f"{posicion} (ID_Cliente {id_cliente})" if id_cliente is not None else str(posicion)
+
+
+def marco_desde_registros(registros, esquema=None):
+    """
+    DataFrame in the raw portfolio schema from JSON records. Text columns stay
+    text and every other non-date column is numeric, even when a batch only
+    has nulls in it (read_csv would infer float64 there as well). Records
+    missing any column of esquema are rejected with a 400 (a null value is
+    fine; the cleaning step handles it), and so are values of a numeric column
+    that are not numbers (an empty string counts as null, as in the file).
+    """
+    if not isinstance(registros, list) or not all(isinstance(r, dict) for r in registros):
+        raise ErrorPeticion(HTTPStatus.BAD_REQUEST, "Se esperaba una lista de clientes (objetos JSON).")
+    if esquema is not None:
+        for posicion, registro in enumerate(registros):
+            faltantes = [c for c in esquema if c not in registro]
+            if faltantes:
+                muestra = ', '.join(faltantes[:MAX_FALTANTES_MENSAJE])
+                if len(faltantes) > MAX_FALTANTES_MENSAJE:
+                    muestra += f' y {len(faltantes) - MAX_FALTANTES_MENSAJE} más'
+                raise ErrorPeticion(HTTPStatus.BAD_REQUEST,
+                                    f"Al cliente {_nombre_cliente(registros, posicion)} le faltan columnas: {muestra}.")
+    df = pd.DataFrame.from_records(registros)
+    for columna in df.columns:
+        if columna in COLUMNAS_TEXTO or columna.startswith('Fecha') or columna.startswith('Prox'):
+            continue
+        if not pd.api.types.is_numeric_dtype(df[columna]):
+            vacios = df[columna].map(lambda v: isinstance(v, str) and not v.strip()).astype(bool)
+            valores = df[columna].mask(vacios)
+            numeros = pd.to_numeric(valores, errors='coerce')
+            invalidos = np.flatnonzero(numeros.isna().to_numpy() & valores.notna().to_numpy())
+            if len(invalidos):
+                posicion = int(invalidos[0])
+                raise ErrorPeticion(HTTPStatus.BAD_REQUEST,
+                                    f"El cliente {_nombre_cliente(registros, posicion)} trae un valor no numérico "
+                                    f"en {columna}: {valores.iat[posicion]!r}.")
+            df[columna] = numeros
+    return df
+
+
+class Puntuador:
+    """
+    Fitted pipeline and model loaded once. puntuar runs one vectorized
+    transform/predict over a frame and returns the prediction of each row
+    (None for rows dropped by the cleaning step); esquema lists the raw columns
+    every request must carry. The date formats are fixed from the first values
+    seen, like in batch_scoring.py, reading ambiguous ones day-first. With perfil=True each micro-batch is logged
+    as per-stage JSON records (timings only; tracemalloc would slow every
+    request down).
+    """
+    def __init__(self, pipeline_path=PIPELINE_PATH, model_path=MODEL_PATH, dtype_fusionado=None,
+                 paquete_path=None, perfil=False):
+        self.pipeline, model = cargar_modelo(paquete_path, pipeline_path, model_path)
+        # El bosque compilado evita el costo fijo de predict en lotes chicos
+        self.model = model if isinstance(model, BosqueCompilado) else compilar_bosque(model)
+        self.proyeccion = None
+        if dtype_fusionado is not None:
+            self.proyeccion = ProyeccionFusionada.desde_pipeline(self.pipeline, dtype=dtype_fusionado)
+        self.esquema = esquema_crudo(self.pipeline)
+        self.formatos = {}
+        self.perfil = perfil
+
+    def puntuar(self, df):
+        # Una petición puede empezar con una fecha ambigua (01/02/2024); el archivo es día primero
+        df = fijar_formato_fechas(df.reset_index(drop=True), self.formatos)
+        if self.perfil:
+            with perfilar('micro_lote', memoria=False):
+                predicciones = predecir(self.pipeline, self.model, df, self.proyeccion)
+        else:
+            predicciones = predecir(self.pipeline, self.model, df, self.proyeccion)
+        resultado = [None] * len(df)
+        for posicion, valor in zip(predicciones.index, predicciones.to_numpy()):
+            resultado[posicion] = valor.item() if isinstance(valor, np.generic) else valor
+        return resultado
+
+
+class MicroLotes:
+    """
+    Collects concurrent requests into micro-batches. A batch is closed when it
+    reaches max_lote rows or max_espera_ms after its first request arrived, and
+    runs in a worker thread so the event loop keeps accepting requests. When
+    a batch of several requests fails, each one is scored again on its own and
+    only the failing ones get the error. When more than max_pendientes rows are
+    waiting, new requests are rejected with 503; a request larger than
+    max_pendientes on its own could never fit and gets 413 instead.
+    """
+    def __init__(self, puntuador, max_lote=MAX_LOTE, max_espera_ms=MAX_ESPERA_MS,
+                 max_pendientes=MAX_PENDIENTES):
+        self.puntuador = puntuador
+        self.max_lote = max_lote
+        self.max_espera = max_espera_ms / 1000
+        self.max_pendientes = max_pendientes
+        self.pendientes = 0
+        self.lotes = 0
+        self.filas = 0
+        self._cola = asyncio.Queue()
+        self._ejecutor = ThreadPoolExecutor(max_workers=1)
+        self._tarea = None
+
+    def iniciar(self):
+        self._tarea = asyncio.get_running_loop().create_task(self._ciclo())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+        self._ejecutor.shutdown(wait=False)
+
+    async def puntuar(self, df):
+        """Predictions of the rows of df, scored together with other concurrent requests."""
+        if len(df) > self.max_pendientes:
+            raise ErrorPeticion(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                f"La petición trae {len(df):,} clientes y el máximo por petición es "
+                                f"{self.max_pendientes:,}; divídela en varias.")
+        if self.pendientes + len(df) > self.max_pendientes:
+            raise ErrorPeticion(HTTPStatus.SERVICE_UNAVAILABLE,
+                                "Servicio saturado, vuelve a intentar en unos segundos.")
+        futuro = asyncio.get_running_loop().create_future()
+        self.pendientes += len(df)
+        await self._cola.put((df, futuro))
+        return await futuro
+
+    async def _ciclo(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self._cola.get()]
+            filas = len(lote[0][0])
+            limite = loop.time() + self.max_espera
+            while filas < self.max_lote:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    peticion = await asyncio.wait_for(self._cola.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+                lote.append(peticion)
+                filas += len(peticion[0])
+            await self._ejecutar(lote, filas)
+
+    async def _puntuar_en_ejecutor(self, df):
+        return await asyncio.get_running_loop().run_in_executor(self._ejecutor, self.puntuador.puntuar, df)
+
+    async def _ejecutar(self, lote, filas):
+        marcos = [df for df, _ in lote]
+        try:
+            conjunto = pd.concat(marcos, ignore_index=True, sort=False) if len(marcos) > 1 else marcos[0]
+            predicciones = await self._puntuar_en_ejecutor(conjunto)
+        except Exception as e:
+            if len(lote) == 1:
+                if not lote[0][1].done():
+                    lote[0][1].set_exception(e)
+            else:
+                await self._ejecutar_por_separado(lote)
+        else:
+            inicio = 0
+            for df, futuro in lote:
+                if not futuro.done():
+                    futuro.set_result(predicciones[inicio:inicio + len(df)])
+                inicio += len(df)
+        finally:
+            self.pendientes -= filas
+            self.lotes += 1
+            self.filas += filas
+
+    async def _ejecutar_por_separado(self, lote):
+        """Scores each request of a failed batch alone, so an error only reaches its own request."""
+        for df, futuro in lote:
+            if futuro.done():
+                continue
+            try:
+                predicciones = await self._puntuar_en_ejecutor(df)
+            except Exception as e:
+                futuro.set_exception(e)
+            else:
+                futuro.set_result(predicciones)
+
+
+def _ids(df):
+    if 'ID_Cliente' in df.columns:
+        return [v.item() if isinstance(v, np.generic) else v for v in df['ID_Cliente'].to_numpy()]
+    return list(range(1, len(df) + 1))
+
+
+async def _leer_peticion(lector):
+    """Reads one HTTP/1.1 request. Returns (method, path, headers, body) or None on EOF."""
+    linea = await lector.readline()
+    if not linea:
+        return None
+    try:
+        metodo, ruta, _ = linea.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise ErrorPeticion(HTTPStatus.BAD_REQUEST, "Línea de petición inválida.")
+    encabezados = {}
+    while True:
+        linea = await lector.readline()
+        if linea in (b'\r\n', b'\n', b''):
+            break
+        nombre, _, valor = linea.decode('latin-1').partition(':')
+        encabezados[nombre.strip().lower()] = valor.strip()
+    largo = int(encabezados.get('content-length', 0) or 0)
+    if largo > MAX_BYTES_CUERPO:
+        raise ErrorPeticion(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Cuerpo demasiado grande.")
+    cuerpo = await lector.readexactly(largo) if largo else b''
+    return metodo, ruta, encabezados, cuerpo
+
+
+def _respuesta(estado, contenido, mantener=True):
+    cuerpo = json.dumps(contenido, ensure_ascii=False).encode('utf-8')
+    encabezados = [
+        f'HTTP/1.1 {estado.value} {estado.phrase}',
+        'Content-Type: application/json; charset=utf-8',
+        f'Content-Length: {len(cuerpo)}',
+        f"Connection: {'keep-alive' if mantener else 'close'}",
+    ]
+    if estado == HTTPStatus.SERVICE_UNAVAILABLE:
+        encabezados.append('Retry-After: 1')
+    return ('\r\n'.join(encabezados) + '\r\n\r\n').encode('latin-1') + cuerpo
+
+
+class ServicioScoring:
+    """HTTP front end (keep-alive, JSON) over MicroLotes."""
+    def __init__(self, lotes):
+        self.lotes = lotes
+        self.inicio = time.time()
+
+    async def atender(self, lector, escritor):
+        try:
+            while True:
+                try:
+                    peticion = await _leer_peticion(lector)
+                except ErrorPeticion as e:
+                    # La petición no se leyó completa: se responde y se cierra la conexión
+                    escritor.write(_respuesta(e.estado, {'error': str(e)}, mantener=False))
+                    await escritor.drain()
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                    break
+                if peticion is None:
+                    break
+                metodo, ruta, encabezados, cuerpo = peticion
+                mantener = encabezados.get('connection', '').lower() != 'close'
+                try:
+                    estado, contenido = await self._despachar(metodo, ruta, cuerpo)
+                except ErrorPeticion as e:
+                    estado, contenido = e.estado, {'error': str(e)}
+                except Exception as e:
+                    estado, contenido = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+                escritor.write(_respuesta(estado, contenido, mantener))
+                await escritor.drain()
+                if not mantener:
+                    break
+        finally:
+            escritor.close()
+
+    async def _despachar(self, metodo, ruta, cuerpo):
+        ruta = ruta.split('?', 1)[0]
+        if ruta == '/salud' and metodo == 'GET':
+            return HTTPStatus.OK, {
+                'estado': 'ok', 'pendientes': self.lotes.pendientes, 'lotes': self.lotes.lotes,
+                'filas': self.lotes.filas, 'segundos_activo': round(time.time() - self.inicio, 1),
+            }
+        if ruta != '/puntuar':
+            raise ErrorPeticion(HTTPStatus.NOT_FOUND, f"Ruta desconocida: {ruta}")
+        if metodo != 'POST':
+            raise ErrorPeticion(HTTPStatus.METHOD_NOT_ALLOWED, "Usa POST.")
+
+        try:
+            datos = json.loads(cuerpo or b'{}')
+        except ValueError:
+            raise ErrorPeticion(HTTPStatus.BAD_REQUEST, "El cuerpo no es JSON válido.")
+        if isinstance(datos, dict) and 'cliente' in datos:
+            registros = [datos['cliente']]
+        elif isinstance(datos, dict) and 'clientes' in datos:
+            registros = datos['clientes']
+        else:
+            raise ErrorPeticion(HTTPStatus.BAD_REQUEST, "Se esperaba 'cliente' o 'clientes'.")
+        if not registros:
+            return HTTPStatus.OK, {'resultados': []}
+
+        df = marco_desde_registros(registros, self.lotes.puntuador.esquema)
+        predicciones = await self.lotes.puntuar(df)
+        return HTTPStatus.OK, {'resultados': [
+            {'ID_Cliente': id_cliente, 'procesado': prediccion is not None, 'prediccion': prediccion}
+            for id_cliente, prediccion in zip(_ids(df), predicciones)
+        ]}
+
+
+async def servir(host, puerto, puntuador, max_lote=MAX_LOTE, max_espera_ms=MAX_ESPERA_MS,
+                 max_pendientes=MAX_PENDIENTES):
+    """Runs the service until cancelled."""
+    lotes = MicroLotes(puntuador, max_lote, max_espera_ms, max_pendientes)
+    lotes.iniciar()
+    servicio = ServicioScoring(lotes)
+    servidor = await asyncio.start_server(servicio.atender, host, puerto)
+    print(f"Servicio de scoring en http://{host}:{puerto} (lote {max_lote} filas, espera {max_espera_ms} ms)")
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    finally:
+        await lotes.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP de scoring con micro-lotes.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8000)
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--modelo', default=MODEL_PATH)
+    parser.add_argument('--paquete', default=None,
+                        help="Paquete de paquete_modelo.py (memory-mapped) en lugar de los .pkl.")
+    parser.add_argument('--max-lote', type=int, default=MAX_LOTE, help="Filas máximas por micro-lote.")
+    parser.add_argument('--max-espera-ms', type=float, default=MAX_ESPERA_MS,
+                        help="Espera máxima para completar un micro-lote.")
+    parser.add_argument('--max-pendientes', type=int, default=MAX_PENDIENTES,
+                        help="Filas en cola antes de responder 503.")
+    parser.add_argument('--fusionado', action='store_true',
+                        help="Usa la proyección fusionada (escalado + PCA en una sola multiplicación).")
+    parser.add_argument('--perfil', nargs='?', const='', default=None, metavar='ARCHIVO',
+                        help="Registra tiempos por etapa de cada micro-lote en JSON (stderr o ARCHIVO).")
+    args = parser.parse_args()
+
+    if args.perfil is not None:
+        configurar_log(args.perfil or None)
+    puntuador = Puntuador(args.pipeline, args.modelo, np.float64 if args.fusionado else None, args.paquete,
+                          perfil=args.perfil is not None)
+    try:
+        asyncio.run(servir(args.host, args.puerto, puntuador, args.max_lote, args.max_espera_ms,
+                           args.max_pendientes))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+# trabajos.py
+# Trabajos en segundo plano para las operaciones largas de las páginas
+# (predicción de toda la cartera, clustering). Corren en un pool de hilos del
+# proceso de Streamlit, fuera del hilo del script: la sesión no se bloquea, un
+# cambio de página no los interrumpe y el resultado queda guardado para
+# cualquier sesión o página que pida el mismo trabajo.
+#
+# Cada trabajo se identifica por una clave (tipo, huella de datos, parámetros):
+# pedir una clave que ya está en cola, corriendo o terminada devuelve el mismo
+# trabajo en lugar de calcularlo otra vez. La cancelación es cooperativa: se
+# revisa en cada actualización de progreso (una por bloque de filas).
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+# Trabajos simultáneos; el resto espera en cola
+MAX_TRABAJADORES = 2
+# Trabajos terminados que se conservan por proceso (los activos nunca se descartan)
+MAX_TERMINADOS = 8
+INTERVALO_REFRESCO = 0.5
+
+EN_COLA = 'en_cola'
+EJECUTANDO = 'ejecutando'
+TERMINADO = 'terminado'
+CANCELADO = 'cancelado'
+ERROR = 'error'
+
+_trabajos = OrderedDict()
+_candado = threading.Lock()
+_ejecutor = ThreadPoolExecutor(max_workers=MAX_TRABAJADORES, thread_name_prefix='trabajo')
+
+
+class TrabajoCancelado(Exception):
+    """Raised inside a job at its next progress update after cancelar()."""
+
+
+class Trabajo:
+    """
+    One background job: its key, state, progress (0-1) with a short message,
+    and the result or error once finished. The job function receives the
+    Trabajo and reports progress with avanzar.
+    """
+    def __init__(self, clave, descripcion):
+        self.clave = clave
+        self.descripcion = descripcion
+        self.estado = EN_COLA
+        self.progreso = 0.0
+        self.mensaje = 'En cola'
+        self.resultado = None
+        self.error = None
+        self.creado = time.time()
+        self.inicio = None
+        self.fin = None
+        self._cancelar = threading.Event()
+        self._futuro = None
+
+    @property
+    def activo(self):
+        return self.estado in (EN_COLA, EJECUTANDO)
+
+    @property
+    def segundos(self):
+        if self.inicio is None:
+            return 0.0
+        return (self.fin or time.time()) - self.inicio
+
+    def avanzar(self, hechos, total, mensaje=None):
+        """Progress update from the job; raises TrabajoCancelado when cancellation was requested."""
+        if self._cancelar.is_set():
+            raise TrabajoCancelado()
+        self.progreso = min(max(hechos / total if total else 1.0, 0.0), 1.0)
+        if mensaje is not None:
+            self.mensaje = mensaje
+
+    def cancelar(self):
+        """Asks the job to stop; a job still in the queue never starts."""
+        self._cancelar.set()
+        if self._futuro is not None and self._futuro.cancel():
+            self._terminar(CANCELADO, 'Cancelado')
+
+    def _terminar(self, estado, mensaje):
+        self.estado = estado
+        self.mensaje = mensaje
+        self.fin = time.time()
+
+    def _ejecutar(self, funcion, args, kwargs):
+        if self._cancelar.is_set():
+            self._terminar(CANCELADO, 'Cancelado')
+            return
+        self.estado = EJECUTANDO
+        self.mensaje = 'Iniciando'
+        self.inicio = time.time()
+        try:
+            self.resultado = funcion(self, *args, **kwargs)
+        except TrabajoCancelado:
+            self._terminar(CANCELADO, 'Cancelado')
+        except Exception as e:
+            self.error = e
+            self._terminar(ERROR, f'Error: {e}')
+        else:
+            self.progreso = 1.0
+            self._terminar(TERMINADO, 'Terminado')
+        finally:
+            _descartar_terminados()
+
+
+def _descartar_terminados():
+    with _candado:
+        terminados = [clave for clave, trabajo in _trabajos.items() if not trabajo.activo]
+        for clave in terminados[:max(len(terminados) - MAX_TERMINADOS, 0)]:
+            del _trabajos[clave]
+
+
+def enviar_trabajo(clave, descripcion, funcion, *args, **kwargs):
+    """
+    Starts funcion(trabajo, *args, **kwargs) in the pool, or returns the job
+    already registered under clave when it is queued, running or finished.
+    Cancelled and failed jobs are replaced by a new run.
+    """
+    with _candado:
+        existente = _trabajos.get(clave)
+        if existente is not None and existente.estado not in (CANCELADO, ERROR):
+            _trabajos.move_to_end(clave)
+            return existente
+        trabajo = Trabajo(clave, descripcion)
+        _trabajos[clave] = trabajo
+        trabajo._futuro = _ejecutor.submit(trabajo._ejecutar, funcion, args, kwargs)
+    return trabajo
+
+
+def obtener_trabajo(clave):
+    """Job registered under clave, or None."""
+    if clave is None:
+        return None
+    with _candado:
+        return _trabajos.get(clave)
+
+
+def trabajos_activos():
+    """Queued and running jobs of the process, oldest first."""
+    with _candado:
+        return [trabajo for trabajo in _trabajos.values() if trabajo.activo]
+
+
+def mostrar_trabajo(trabajo, clave_widget):
+    """
+    Progress bar and cancel button of a job. Returns True while the job is
+    still active, so the page can call refrescar_si_pendiente at its end.
+    """
+    if trabajo.activo:
+        st.progress(trabajo.progreso, text=f"{trabajo.descripcion}: {trabajo.mensaje} "
+                                           f"({trabajo.progreso:.0%}, {trabajo.segundos:.0f} s)")
+        if st.button("Cancelar", key=f'{clave_widget}_cancelar'):
+            trabajo.cancelar()
+        return True
+    if trabajo.estado == CANCELADO:
+        st.warning(f"{trabajo.descripcion}: cancelado.")
+    elif trabajo.estado == ERROR:
+        st.error(f"{trabajo.descripcion}: ocurrió un error ({trabajo.error}).")
+    return False
+
+
+def refrescar_si_pendiente(pendiente, intervalo=INTERVALO_REFRESCO):
+    """Reruns the page after intervalo seconds while a job shown on it is active."""
+    if pendiente:
+        time.sleep(intervalo)
+        st.rerun()